@@ -0,0 +1,88 @@
+"""
+The benchmark of analytical queries.
+
+Compares the :class:`SQLAnalytics` with the :class:`ColumnarAnalytics` snapshot
+(with `numpy` when installed and with the `array` columns) on synthetic orders
+spread over one year, for the whole history and for one-week windows.
+
+Usage::
+
+    python benchmarks/bench_analytics.py [--orders 500000] [--windows 20]
+"""
+
+import argparse
+import random
+import sqlite3 as db
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from bench_range import START, YEAR, SCHEMA, populate
+from company.orders import ColumnarAnalytics, SQLAnalytics, create_schema
+from company.orders._analytics import HAS_NUMPY
+
+WEEK = 7 * 24 * 3600
+
+
+def measure(function, windows: list[tuple[int | None, int | None]]) -> float:
+    """
+    Return the median latency (in milliseconds) of the query over the windows.
+    """
+    latencies = []
+    for since, till in windows:
+        start = time.perf_counter()
+        function(since=since, till=till)
+        latencies.append((time.perf_counter() - start) * 1e3)
+    return statistics.median(latencies)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--orders", type=int, default=500_000)
+    parser.add_argument("--windows", type=int, default=20)
+    options = parser.parse_args()
+
+    random.seed(0)
+    weeks = []
+    for _ in range(options.windows):
+        since = START + random.randrange(YEAR - WEEK)
+        weeks.append((since, since + WEEK))
+
+    with tempfile.TemporaryDirectory() as directory:
+        connection = db.connect(Path(directory, "orders.sqlite"))
+        create_schema(connection, SCHEMA)
+        populate(connection, options.orders)
+
+        backends = {"sql": SQLAnalytics(connection)}
+        for name, use_numpy in [
+            ("columnar (numpy)", True),
+            ("columnar (array)", False),
+        ]:
+            if use_numpy and not HAS_NUMPY:
+                print(f"{name} is not available, skipped")
+                continue
+            start = time.perf_counter()
+            backends[name] = ColumnarAnalytics.from_connection(connection, use_numpy)
+            print(f"{name} snapshot loaded in {time.perf_counter() - start:.2f} s")
+
+        print(f"\n{'backend':<18} {'query':<20} {'all [ms]':>10} {'week p50 [ms]':>14}")
+        for name, analytics in backends.items():
+            queries = {
+                "top_users": lambda analytics=analytics, **_: analytics.top_users(
+                    10, **_
+                ),
+                "revenue_by_city": analytics.revenue_by_city,
+                "product_popularity": lambda analytics=analytics, **_: (
+                    analytics.product_popularity(10, **_)
+                ),
+            }
+            for query, function in queries.items():
+                everything = measure(function, [(None, None)] * 3)
+                week = measure(function, weeks)
+                print(f"{name:<18} {query:<20} {everything:>10.2f} {week:>14.2f}")
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+The benchmark of the asyncio facade at 1, 10 and 100 concurrent clients.
+
+Imports the synthetic orders (see `generate.py`) and runs the clients searching
+one-day windows by :class:`AsyncOrderService` and, for comparison, by calling
+:class:`OrderService` directly from the coroutines (blocking the event loop).
+Measures the throughput, the latencies and the maximal lag of the event loop
+seen by a ticker task, which is what the other requests of a web tier wait for.
+
+Usage::
+
+    python benchmarks/bench_async.py [--records 100000] [--clients 1,10,100]
+        [--searches 2000] [--workers 4]
+"""
+
+import argparse
+import asyncio
+import datetime
+import random
+import statistics
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+
+from generate import START, YEAR, generate
+from company.orders import (
+    AsyncOrderService,
+    AsyncRunner,
+    ConnectionPool,
+    OrderRepository,
+    OrderService,
+    ProductRepository,
+    UserRepository,
+    create_schema,
+    transaction,
+)
+
+ROOT = Path(__file__).resolve().parents[1]
+SCHEMA = Path(ROOT, "src", "company", "orders", "schema.sql").read_text(encoding="utf8")
+DAY = 24 * 3600
+
+
+async def search_async(service: AsyncOrderService, window: tuple) -> int:
+    return sum([1 async for _ in service.search_orders_by_date(*window)])
+
+
+async def search_blocking(service: OrderService, window: tuple) -> int:
+    return sum(1 for _ in service.search_orders_by_date(*window))
+
+
+async def run_clients(search, windows: list[tuple], clients: int) -> dict:
+    """
+    Run the searches by the concurrent clients and return the measurements.
+    """
+    latencies: list[float] = []
+    lag = 0.0
+    queue = iter(windows)
+    running = True
+
+    async def client() -> None:
+        for window in queue:
+            start = time.perf_counter()
+            await search(window)
+            latencies.append(time.perf_counter() - start)
+
+    async def ticker() -> None:
+        nonlocal lag
+        while running:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lag = max(lag, time.perf_counter() - start - 0.001)
+
+    tick = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    seconds = time.perf_counter() - start
+    running = False
+    await tick
+    return {
+        "searches_per_second": len(latencies) / seconds,
+        "p50_ms": statistics.median(latencies) * 1e3,
+        "p95_ms": statistics.quantiles(latencies, n=20)[-1] * 1e3,
+        "max_loop_lag_ms": lag * 1e3,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--clients", default="1,10,100")
+    parser.add_argument("--searches", type=int, default=2000)
+    parser.add_argument(
+        "--workers", type=int, default=4, help="the threads of the runner"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    options = parser.parse_args()
+
+    generator = random.Random(options.seed)
+    epoch = datetime.datetime(1970, 1, 1)
+    windows = []
+    for _ in range(options.searches):
+        since = epoch + datetime.timedelta(
+            seconds=START + generator.randrange(YEAR - DAY)
+        )
+        windows.append((since, since + datetime.timedelta(seconds=DAY)))
+
+    with tempfile.TemporaryDirectory() as directory:
+        data = Path(directory, "orders.jsonl")
+        generate(data, options.records, users=10_000, products=1000, seed=options.seed)
+        with ConnectionPool(Path(directory, "orders.sqlite"), "ingest") as connections:
+            create_schema(connections.connection, SCHEMA)
+            service = OrderService(
+                user_repository=UserRepository(connections),
+                product_repository=ProductRepository(connections),
+                order_repository=OrderRepository(connections),
+                unit_of_work=partial(transaction, connections),
+            )
+            service.bulk_insert_orders(data)
+            connections.use("serve")
+
+            print(
+                f"{'mode':<10} {'clients':>8} {'searches/s':>11} {'p50 [ms]':>9} "
+                f"{'p95 [ms]':>9} {'max loop lag [ms]':>18}"
+            )
+            with AsyncRunner(options.workers, connections=connections) as runner:
+                facade = AsyncOrderService(service, runner)
+                modes = {
+                    "blocking": partial(search_blocking, service),
+                    "async": partial(search_async, facade),
+                }
+                for clients in (int(_) for _ in options.clients.split(",")):
+                    for mode, search in modes.items():
+                        result = asyncio.run(run_clients(search, windows, clients))
+                        print(
+                            f"{mode:<10} {clients:>8} {result['searches_per_second']:>11.0f} "
+                            f"{result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+                            f"{result['max_loop_lag_ms']:>18.2f}"
+                        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+The benchmark of record decoding.
+
+Compares the installed JSON backends of :func:`record_decoder` (decoding with
+schema validation) with the bare :func:`json.loads`.
+
+Usage::
+
+    python benchmarks/bench_decode.py [--data orders.jsonl] [--repeat 5]
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from company.orders._records import BACKENDS, record_decoder
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def measure(decode, lines: list[bytes], repeat: int) -> float:
+    """
+    Return the best time of decoding all lines in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            decode(line)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--data", type=Path, default=Path(ROOT, "orders.jsonl"))
+    parser.add_argument("--repeat", type=int, default=5)
+    options = parser.parse_args()
+
+    lines = options.data.read_bytes().splitlines()
+    decoders = {"json.loads (no validation)": json.loads}
+    for backend in BACKENDS:
+        try:
+            decoders[backend] = record_decoder(backend)
+        except ValueError:
+            print(f"{backend} is not installed, skipped")
+
+    print(f"{'decoder':<28} {'best [s]':>10} {'records/s':>12} {'us/record':>10}")
+    for name, decode in decoders.items():
+        best = measure(decode, lines, options.repeat)
+        print(
+            f"{name:<28} {best:>10.4f} {len(lines) / best:>12.0f} "
+            f"{best / len(lines) * 1e6:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
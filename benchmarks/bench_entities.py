@@ -0,0 +1,73 @@
+"""
+The benchmark of entities' memory footprint.
+
+Measures the memory allocated per :class:`User`, :class:`Product` and :class:`Order`
+(with its order lines) by :mod:`tracemalloc`, and compares the order with
+the former layout having an instance dictionary and a `frozenset` of lines.
+
+Usage::
+
+    python benchmarks/bench_entities.py [--orders 1000000] [--lines 3]
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from company.orders import Order, Product, User
+from company.orders._domain import OrderLine
+
+
+class DictOrder:
+    """The former layout of :class:`Order` for comparison."""
+
+    def __init__(self, identifier, user_id, order_lines, created) -> None:
+        self._identifier = identifier
+        self._user_id = user_id
+        self._created = created
+        self._order_lines = frozenset(order_lines)
+
+
+def measure(factory, count: int) -> tuple[float, float]:
+    """
+    Return the allocated bytes per entity and the seconds of creating them.
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    entities = [factory(_) for _ in range(count)]
+    seconds = time.perf_counter() - start
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del entities
+    # The list of entities is not counted.
+    return (allocated - 8 * count) / count, seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--lines", type=int, default=3, help="order lines per order")
+    options = parser.parse_args()
+
+    # The lines are shared like when the products repeat, so only the orders are measured.
+    lines = [
+        OrderLine(product_id, 1 + product_id % 3) for product_id in range(options.lines)
+    ]
+    factories = {
+        "User": lambda _: User(_, "User A", "Prague"),
+        "Product": lambda _: Product(_, "Product A", 100),
+        "Order": lambda _: Order(_, _ % 1000, lines, 1542328144 + _),
+        "Order (dict, frozenset)": lambda _: DictOrder(
+            _, _ % 1000, lines, 1542328144 + _
+        ),
+    }
+    print(f"{'entity':<24} {'count':>9} {'bytes/entity':>13} {'create [s]':>11}")
+    for name, factory in factories.items():
+        per_entity, seconds = measure(factory, options.orders)
+        print(f"{name:<24} {options.orders:>9} {per_entity:>13.1f} {seconds:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
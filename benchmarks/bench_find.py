@@ -0,0 +1,94 @@
+"""
+The benchmark of loading aggregates by identifier.
+
+Compares the per-identifier :meth:`find` lookups with the bulk :meth:`find_many`
+of each repository on the database imported from a JSON-line file.
+
+Usage::
+
+    python benchmarks/bench_find.py [--data orders.jsonl] [--batch 500] [--repeat 5]
+"""
+
+import argparse
+import random
+import sqlite3 as db
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+
+from company.orders import (
+    OrderRepository,
+    OrderService,
+    ProductRepository,
+    UserRepository,
+    create_schema,
+    transaction,
+)
+
+ROOT = Path(__file__).resolve().parents[1]
+SCHEMA = Path(ROOT, "src", "company", "orders", "schema.sql").read_text(encoding="utf8")
+
+
+def measure(function, repeat: int) -> float:
+    """
+    Return the best time of the function call in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--data", type=Path, default=Path(ROOT, "orders.jsonl"))
+    parser.add_argument(
+        "--batch", type=int, default=500, help="identifiers per request"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        connection = db.connect(Path(directory, "orders.sqlite"))
+        create_schema(connection, SCHEMA)
+        repositories = {
+            "users": UserRepository(connection),
+            "products": ProductRepository(connection),
+            "orders": OrderRepository(connection),
+        }
+        OrderService(
+            user_repository=repositories["users"],
+            product_repository=repositories["products"],
+            order_repository=repositories["orders"],
+            unit_of_work=partial(transaction, connection),
+        ).bulk_insert_orders(options.data)
+
+        print(
+            f"{'repository':<10} {'ids':>6} {'find [ms]':>10} {'find_many [ms]':>15} {'speedup':>8}"
+        )
+        random.seed(0)
+        for table, repository in repositories.items():
+            ids = [row[0] for row in connection.execute(f"select id from {table}")]
+            ids = random.sample(ids, min(options.batch, len(ids)))
+            single = measure(
+                lambda repository=repository, ids=ids: [
+                    repository.find(_) for _ in ids
+                ],
+                options.repeat,
+            )
+            bulk = measure(
+                lambda repository=repository, ids=ids: repository.find_many(ids),
+                options.repeat,
+            )
+            print(
+                f"{table:<10} {len(ids):>6} {single * 1e3:>10.2f} "
+                f"{bulk * 1e3:>15.2f} {single / bulk:>8.1f}"
+            )
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+The throughput benchmark of order imports.
+
+Compares the per-record :meth:`OrderService.batch_insert_orders` with the
+set-based :meth:`OrderService.bulk_insert_orders` (sequential and parallel)
+on a JSON-line file.
+
+Usage::
+
+    python benchmarks/bench_ingest.py [--data orders.jsonl] [--repeat 3] [--workers 4]
+"""
+
+import argparse
+import sqlite3 as db
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+
+from company.orders import (
+    OrderRepository,
+    OrderService,
+    ProductRepository,
+    UserRepository,
+    create_schema,
+    transaction,
+)
+
+ROOT = Path(__file__).resolve().parents[1]
+SCHEMA = Path(ROOT, "src", "company", "orders", "schema.sql").read_text(encoding="utf8")
+
+
+def count_records(path: Path) -> int:
+    with open(path, "rb") as file:
+        return sum(1 for line in file if line.strip())
+
+
+def run(path: Path, method: str, **options) -> float:
+    """
+    Import the file into a fresh database file and return the elapsed seconds.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        connection = db.connect(Path(directory, "orders.sqlite"))
+        try:
+            create_schema(connection, SCHEMA)
+            service = OrderService(
+                user_repository=UserRepository(connection),
+                order_repository=OrderRepository(connection),
+                product_repository=ProductRepository(connection),
+                unit_of_work=partial(transaction, connection),
+            )
+            start = time.perf_counter()
+            getattr(service, method)(path, **options)
+            return time.perf_counter() - start
+        finally:
+            connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--data", type=Path, default=Path(ROOT, "orders.jsonl"))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=4)
+    options = parser.parse_args()
+
+    cases = [
+        ("batch_insert_orders", {}),
+        ("bulk_insert_orders", {}),
+        ("bulk_insert_orders", {"memory_map": True}),
+        ("bulk_insert_orders", {"workers": options.workers}),
+    ]
+    records = count_records(options.data)
+    print(f"{'method':<32} {'best [s]':>10} {'records/s':>12}")
+    for method, kwargs in cases:
+        best = min(run(options.data, method, **kwargs) for _ in range(options.repeat))
+        name = method + "".join(f" {k}={v}" for k, v in kwargs.items())
+        print(f"{name:<32} {best:>10.3f} {records / best:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+The benchmark of the storage profiles.
+
+Imports the synthetic orders (see `generate.py`) into a fresh database with each
+ingest profile and measures the import throughput, then runs the one-day window
+searches from many threads with each serve profile and measures the query
+throughput.
+
+Usage::
+
+    python benchmarks/bench_profiles.py [--records 200000] [--import batch]
+        [--threads 4] [--searches 2000]
+"""
+
+import argparse
+import datetime
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from pathlib import Path
+
+from generate import START, YEAR, generate
+from company.orders import (
+    ConnectionPool,
+    OrderRepository,
+    OrderService,
+    ProductRepository,
+    UserRepository,
+    create_schema,
+    deferred_indexes,
+    transaction,
+)
+
+ROOT = Path(__file__).resolve().parents[1]
+SCHEMA = Path(ROOT, "src", "company", "orders", "schema.sql").read_text(encoding="utf8")
+DAY = 24 * 3600
+
+
+def service_of(connections: ConnectionPool) -> OrderService:
+    return OrderService(
+        user_repository=UserRepository(connections),
+        product_repository=ProductRepository(connections),
+        order_repository=OrderRepository(connections),
+        unit_of_work=partial(transaction, connections),
+    )
+
+
+def ingest(database: Path, data: Path, profile: str, method: str) -> float:
+    """
+    Return the seconds of importing the file into the fresh database.
+    """
+    with ConnectionPool(database, profile) as connections:
+        create_schema(connections.connection, SCHEMA)
+        service = service_of(connections)
+        start = time.perf_counter()
+        with (
+            deferred_indexes(connections)
+            if connections.profile.defer_indexes
+            else nullcontext()
+        ):
+            if method == "batch":
+                service.batch_insert_orders(data)
+            else:
+                service.bulk_insert_orders(data)
+        return time.perf_counter() - start
+
+
+def serve(database: Path, profile: str, windows: list[tuple], threads: int) -> float:
+    """
+    Return the seconds of running the searches by the threads.
+    """
+    with ConnectionPool(database, profile) as connections:
+        service = service_of(connections)
+
+        def search(window) -> int:
+            return sum(1 for _ in service.search_orders_by_date(*window))
+
+        with ThreadPoolExecutor(threads) as executor:
+            # Open the connections (and warm the caches) before measuring.
+            list(executor.map(search, windows[:threads]))
+            start = time.perf_counter()
+            list(executor.map(search, windows))
+            return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument(
+        "--import", dest="method", choices=["batch", "bulk"], default="batch"
+    )
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--searches", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    options = parser.parse_args()
+
+    generator = random.Random(options.seed)
+    epoch = datetime.datetime(1970, 1, 1)
+    windows = []
+    for _ in range(options.searches):
+        since = epoch + datetime.timedelta(
+            seconds=START + generator.randrange(YEAR - DAY)
+        )
+        windows.append((since, since + datetime.timedelta(seconds=DAY)))
+
+    with tempfile.TemporaryDirectory() as directory:
+        data = Path(directory, "orders.jsonl")
+        generate(data, options.records, users=10_000, products=1000, seed=options.seed)
+
+        print(f"{'ingest profile':<16} {'import [s]':>11} {'records/s':>10}")
+        for profile in ("default", "ingest"):
+            database = Path(directory, f"{profile}.sqlite")
+            seconds = ingest(database, data, profile, options.method)
+            print(f"{profile:<16} {seconds:>11.2f} {options.records / seconds:>10.0f}")
+
+        print(f"\n{'serve profile':<16} {'search [s]':>11} {'searches/s':>10}")
+        for profile in ("default", "serve"):
+            seconds = serve(
+                Path(directory, "ingest.sqlite"), profile, windows, options.threads
+            )
+            print(f"{profile:<16} {seconds:>11.2f} {options.searches / seconds:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
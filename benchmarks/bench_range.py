@@ -0,0 +1,104 @@
+"""
+The benchmark of date range searches at growing data scales.
+
+Fills databases with synthetic orders (spread over one year) and measures the
+latency of :meth:`OrderRepository.find_between` for one-hour windows with the
+indexed statement and with the original full-scan statement.
+
+Usage::
+
+    python benchmarks/bench_range.py [--scales 5000,50000,500000,10000000] [--windows 50]
+"""
+
+import argparse
+import random
+import sqlite3 as db
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from company.orders import OrderRepository, create_schema
+
+ROOT = Path(__file__).resolve().parents[1]
+SCHEMA = Path(ROOT, "src", "company", "orders", "schema.sql").read_text(encoding="utf8")
+
+START = 1514764800  # 2018-01-01
+YEAR = 365 * 24 * 3600
+WINDOW = 3600
+
+FULL_SCAN = """
+    select o.id, o.created, o.user_id, l.product_id, l.quantity
+    from orders o not indexed join order_lines l on o.id = l.order_id
+    where o.created between ? and ? order by o.id"""
+"""The statement without indexes on `orders`, as it was before the indexes were added."""
+
+
+def populate(connection, orders: int, users: int = 1000, products: int = 100) -> None:
+    """
+    Insert the synthetic users, products and orders with 1-3 order lines.
+    """
+    connection.executescript(
+        f"""
+        begin;
+        with recursive n(i) as (select 0 union all select i + 1 from n where i + 1 < {users})
+        insert into users (id, name, city) select i, 'User ' || i, 'City ' || (i % 50) from n;
+        with recursive n(i) as (select 0 union all select i + 1 from n where i + 1 < {products})
+        insert into products (id, name, price) select i, 'Product ' || i, 10 + i from n;
+        with recursive n(i) as (select 0 union all select i + 1 from n where i + 1 < {orders})
+        insert into orders (id, created, user_id)
+            select i, {START} + abs(random()) % {YEAR}, i % {users} from n;
+        insert into order_lines (order_id, product_id, quantity)
+            select o.id, (o.id * 7 + k.value) % {products}, 1 + k.value % 2
+            from orders o join json_each('[1, 2, 3]') k on k.value <= 1 + o.id % 3;
+        commit;
+        analyze;
+        """
+    )
+
+
+def measure(connection, statement: str | None, windows: list[int]) -> list[float]:
+    """
+    Return the latencies (in milliseconds) of searching all orders in the windows.
+    """
+    repository = OrderRepository(connection)
+    latencies = []
+    for since in windows:
+        start = time.perf_counter()
+        if statement is None:
+            list(repository.find_between(since, since + WINDOW))
+        else:
+            connection.execute(statement, (since, since + WINDOW)).fetchall()
+        latencies.append((time.perf_counter() - start) * 1e3)
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--scales", default="5000,50000,500000")
+    parser.add_argument("--windows", type=int, default=50)
+    options = parser.parse_args()
+
+    random.seed(0)
+    windows = [START + random.randrange(YEAR - WINDOW) for _ in range(options.windows)]
+    print(
+        f"{'orders':>10} {'find_between p50 [ms]':>22} {'p95 [ms]':>9} "
+        f"{'full scan p50 [ms]':>19}"
+    )
+    for scale in (int(_) for _ in options.scales.split(",")):
+        with tempfile.TemporaryDirectory() as directory:
+            connection = db.connect(Path(directory, "orders.sqlite"))
+            create_schema(connection, SCHEMA)
+            populate(connection, scale)
+            indexed = measure(connection, None, windows)
+            full_scan = measure(connection, FULL_SCAN, windows[:5])
+            connection.close()
+        print(
+            f"{scale:>10} {statistics.median(indexed):>22.3f} "
+            f"{statistics.quantiles(indexed, n=20)[-1]:>9.3f} "
+            f"{statistics.median(full_scan):>19.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
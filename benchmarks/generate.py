@@ -0,0 +1,133 @@
+"""
+The generator of synthetic JSON-line order files.
+
+The records have the same shape as `orders.jsonl`: an order with 1..N products
+of one user. The users and products are drawn with the Zipf-like skew (the
+popularity of the k-th one is proportional to `1 / k**skew`, 0 is uniform) and
+the orders are created within one year in random order.
+
+Usage::
+
+    python benchmarks/generate.py orders-1m.jsonl [--records 1000000] [--users 10000]
+        [--products 1000] [--skew 1.1] [--max-lines 5] [--seed 0]
+"""
+
+import argparse
+import json
+import random
+import string
+from itertools import accumulate
+from pathlib import Path
+
+START = 1514764800  # 2018-01-01
+YEAR = 365 * 24 * 3600
+CITIES = [
+    "Prague",
+    "Sydney",
+    "Jakarta",
+    "Hong Kong",
+    "Singapore",
+    "Melbourne",
+    "Tokyo",
+    "Lima",
+]
+
+
+def name(kind: str, index: int) -> str:
+    """
+    Return the name in the style of the sample file, e.g. `User A`, `User AB`.
+    """
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, len(string.ascii_uppercase))
+        letters = string.ascii_uppercase[remainder] + letters
+    return f"{kind} {letters}"
+
+
+def skewed(count: int, skew: float) -> list[float]:
+    """
+    Return the cumulative weights of the Zipf-like distribution over `count` items.
+    """
+    return list(accumulate(1 / (rank**skew) for rank in range(1, count + 1)))
+
+
+def generate(
+    path: Path,
+    records: int,
+    users: int = 1000,
+    products: int = 100,
+    skew: float = 1.0,
+    max_lines: int = 5,
+    seed: int = 0,
+) -> None:
+    """
+    Write the synthetic orders to the JSON-line file.
+
+    :param path: The output file.
+    :param records: The number of orders.
+    :param users: The number of distinct users.
+    :param products: The number of distinct products.
+    :param skew: The exponent of the users' and products' popularity, 0 is uniform.
+    :param max_lines: The maximum number of products in one order.
+    :param seed: The seed of the random generator, the same seed writes the same file.
+    """
+    generator = random.Random(seed)
+    # The popularity ranks are shuffled, so the popular ones are not the first ones.
+    user_ids = generator.sample(range(users), users)
+    product_ids = generator.sample(range(products), products)
+    user_weights = skewed(users, skew)
+    product_weights = skewed(products, skew)
+    # The objects are serialized once, the records are joined from the pieces.
+    user_json = [
+        json.dumps({"id": _, "name": name("User", _), "city": CITIES[_ % len(CITIES)]})
+        for _ in range(users)
+    ]
+    product_json = [
+        json.dumps({"id": _, "name": name("Product", _), "price": 10 * (1 + _ % 30)})
+        for _ in range(products)
+    ]
+    order_ids = generator.sample(range(records), records)
+    max_lines = min(max_lines, products)
+
+    with open(path, "w", encoding="utf8") as file:
+        for order_id in order_ids:
+            created = START + generator.randrange(YEAR)
+            (user,) = generator.choices(user_ids, cum_weights=user_weights)
+            lines = set(
+                generator.choices(
+                    product_ids,
+                    cum_weights=product_weights,
+                    k=generator.randint(1, max_lines),
+                )
+            )
+            products_json = ", ".join(product_json[_] for _ in lines)
+            file.write(
+                f'{{"id": {order_id}, "created": {created}, '
+                f'"products": [{products_json}], "user": {user_json[user]}}}\n'
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--records", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=100)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--max-lines", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    options = parser.parse_args()
+    generate(
+        options.path,
+        options.records,
+        users=options.users,
+        products=options.products,
+        skew=options.skew,
+        max_lines=options.max_lines,
+        seed=options.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+The load test of the HTTP server (`company-orders serve`).
+
+Each client thread keeps one connection alive and sends the requests in a loop
+for the given time: the one-day window searches (the streamed orders are read
+to the end) and the top users in the ratio of `--mix`. Reports the throughput
+and the latencies at each number of clients.
+
+Without `--url` a server is started on a fresh database in a temporary
+directory and the synthetic orders (see `generate.py`) are imported by
+`POST /orders` first.
+
+Usage::
+
+    python benchmarks/load_test.py [--url http://127.0.0.1:8080] [--clients 1,10,50]
+        [--seconds 10] [--mix 8:2] [--records 100000] [--threads 8]
+"""
+
+import argparse
+import datetime
+import http.client
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+from urllib.parse import urlsplit
+
+from generate import START, YEAR, generate
+
+ROOT = Path(__file__).resolve().parents[1]
+DAY = 24 * 3600
+
+
+def client(
+    address: tuple[str, int], deadline: float, mix: tuple[int, int], seed: int
+) -> dict:
+    """
+    Send the requests until the deadline and return the latencies by the endpoint.
+    """
+    generator = random.Random(seed)
+    connection = http.client.HTTPConnection(*address, timeout=60)
+    latencies: dict[str, list[float]] = {"search": [], "top": []}
+    errors = 0
+    epoch = datetime.datetime(1970, 1, 1)
+    while time.perf_counter() < deadline:
+        if generator.randrange(sum(mix)) < mix[0]:
+            endpoint = "search"
+            since = epoch + datetime.timedelta(
+                seconds=START + generator.randrange(YEAR - DAY)
+            )
+            till = since + datetime.timedelta(seconds=DAY)
+            url = f"/orders?since={since.isoformat()}&till={till.isoformat()}"
+        else:
+            endpoint, url = "top", "/users/top?limit=10"
+        start = time.perf_counter()
+        connection.request("GET", url)
+        response = connection.getresponse()
+        response.read()
+        latencies[endpoint].append(time.perf_counter() - start)
+        errors += response.status != 200
+    connection.close()
+    return {"latencies": latencies, "errors": errors}
+
+
+def run(
+    address: tuple[str, int], clients: int, seconds: float, mix: tuple[int, int]
+) -> dict:
+    results: list[dict] = []
+    deadline = time.perf_counter() + seconds
+    threads = [
+        threading.Thread(
+            target=lambda seed: results.append(client(address, deadline, mix, seed)),
+            args=(_,),
+        )
+        for _ in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    measured = {}
+    for endpoint in ("search", "top"):
+        latencies = [_ for result in results for _ in result["latencies"][endpoint]]
+        if len(latencies) > 1:
+            percentiles = statistics.quantiles(latencies, n=100)
+            measured[endpoint] = (
+                len(latencies) / seconds,
+                percentiles[49] * 1e3,
+                percentiles[94] * 1e3,
+                percentiles[98] * 1e3,
+            )
+    measured["errors"] = sum(_["errors"] for _ in results)
+    return measured
+
+
+@contextmanager
+def local_server(records: int, threads: int) -> Iterator[tuple[str, int]]:
+    """
+    Start the server on a fresh database and import the synthetic orders.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        data = Path(directory, "orders.jsonl")
+        generate(data, records, users=10_000, products=1000)
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        command = (
+            "import sys; from company.orders.__main__ import main; "
+            f"sys.argv = ['company-orders', 'serve', '--port', '{port}', '--threads', '{threads}']; main()"
+        )
+        server = subprocess.Popen(
+            [sys.executable, "-c", command],
+            cwd=directory,
+            env={"PYTHONPATH": str(ROOT / "src")},
+        )
+        try:
+            address = ("127.0.0.1", port)
+            for _ in range(100):
+                try:
+                    socket.create_connection(address).close()
+                    break
+                except OSError:
+                    time.sleep(0.1)
+            connection = http.client.HTTPConnection(*address, timeout=600)
+            start = time.perf_counter()
+            connection.request("POST", "/orders", body=data.read_bytes())
+            response = connection.getresponse()
+            print(
+                f"POST /orders: {response.status} {response.read().decode()} in {time.perf_counter() - start:.1f} s"
+            )
+            connection.close()
+            yield address
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--url", help="the running server, a local one by default")
+    parser.add_argument("--clients", default="1,10,50")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument(
+        "--mix", default="8:2", help="the ratio of searches and top users requests"
+    )
+    parser.add_argument(
+        "--records", type=int, default=100_000, help="the orders of the local server"
+    )
+    parser.add_argument(
+        "--threads", type=int, default=8, help="the threads of the local server"
+    )
+    options = parser.parse_args()
+    mix = tuple(int(_) for _ in options.mix.split(":"))
+
+    if options.url:
+        url = urlsplit(options.url)
+        server = contextmanager(lambda: iter([(url.hostname, url.port or 80)]))()
+    else:
+        server = local_server(options.records, options.threads)
+    with server as address:
+        print(
+            f"{'clients':>8} {'endpoint':<8} {'req/s':>8} {'p50 [ms]':>9} {'p95 [ms]':>9} "
+            f"{'p99 [ms]':>9} {'errors':>7}"
+        )
+        for clients in (int(_) for _ in options.clients.split(",")):
+            measured = run(address, clients, options.seconds, mix)
+            for endpoint in ("search", "top"):
+                if endpoint in measured:
+                    throughput, p50, p95, p99 = measured[endpoint]
+                    print(
+                        f"{clients:>8} {endpoint:<8} {throughput:>8.0f} {p50:>9.2f} {p95:>9.2f} "
+                        f"{p99:>9.2f} {measured['errors']:>7}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
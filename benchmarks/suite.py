@@ -0,0 +1,234 @@
+"""
+The benchmark suite of the service use cases at multiple data scales.
+
+For each scale generates the synthetic orders (see `generate.py`), imports them
+into a fresh database and measures the import throughput, the latencies of
+:meth:`OrderService.search_orders_by_date` (one-day windows) and
+:meth:`OrderService.search_users_with_most_products` and the peak RSS. Each scale
+runs in its own process, so the peak RSS is not shared. The results are written
+as JSON and can be compared with the results of another commit.
+
+Usage::
+
+    python benchmarks/suite.py [--scales 10000,1000000,10000000] [--import batch]
+        [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import sqlite3 as db
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+
+from generate import START, YEAR, generate
+from company.orders import (
+    OrderRepository,
+    OrderService,
+    ProductRepository,
+    UserRepository,
+    create_schema,
+    transaction,
+)
+
+ROOT = Path(__file__).resolve().parents[1]
+SCHEMA = Path(ROOT, "src", "company", "orders", "schema.sql").read_text(encoding="utf8")
+DAY = 24 * 3600
+
+# The metrics compared between runs, the higher value is better for throughput.
+COMPARED = {
+    "import_records_per_second": "higher",
+    "search_orders_by_date_p50_ms": "lower",
+    "search_orders_by_date_p95_ms": "lower",
+    "search_users_with_most_products_p50_ms": "lower",
+    "peak_rss_mb": "lower",
+}
+
+
+def latencies(function, arguments: list[tuple]) -> list[float]:
+    """
+    Return the latencies (in milliseconds) of consuming the results of the calls.
+    """
+    measured = []
+    for args in arguments:
+        start = time.perf_counter()
+        list(function(*args))
+        measured.append((time.perf_counter() - start) * 1e3)
+    return measured
+
+
+def percentiles(measured: list[float]) -> tuple[float, float]:
+    """
+    Return the 50th and 95th percentile.
+    """
+    if len(measured) < 2:
+        return measured[0], measured[0]
+    return statistics.median(measured), statistics.quantiles(measured, n=20)[-1]
+
+
+def run_scale(scale: int, options: dict) -> dict:
+    """
+    Benchmark one scale in a fresh directory, this runs in a child process.
+    """
+    generator = random.Random(options["seed"])
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory, "orders.jsonl")
+        start = time.perf_counter()
+        generate(
+            path,
+            scale,
+            users=options["users"],
+            products=options["products"],
+            skew=options["skew"],
+            seed=options["seed"],
+        )
+        generated = time.perf_counter() - start
+
+        connection = db.connect(Path(directory, "orders.sqlite"))
+        create_schema(connection, SCHEMA)
+        service = OrderService(
+            user_repository=UserRepository(connection),
+            product_repository=ProductRepository(connection),
+            order_repository=OrderRepository(connection),
+            unit_of_work=partial(transaction, connection),
+        )
+        start = time.perf_counter()
+        if options["import"] == "batch":
+            service.batch_insert_orders(path)
+        else:
+            service.bulk_insert_orders(path)
+        imported = time.perf_counter() - start
+
+        epoch = datetime.datetime(1970, 1, 1)
+        windows = []
+        for _ in range(options["windows"]):
+            since = epoch + datetime.timedelta(
+                seconds=START + generator.randrange(YEAR - DAY)
+            )
+            windows.append((since, since + datetime.timedelta(seconds=DAY)))
+        search = latencies(service.search_orders_by_date, windows)
+        top = latencies(
+            service.search_users_with_most_products,
+            [(connection, 10)] * options["windows"],
+        )
+        connection.close()
+
+    search_p50, search_p95 = percentiles(search)
+    top_p50, top_p95 = percentiles(top)
+    # The `ru_maxrss` is in kilobytes on Linux.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        "records": scale,
+        "generate_seconds": generated,
+        "import_seconds": imported,
+        "import_records_per_second": scale / imported,
+        "search_orders_by_date_p50_ms": search_p50,
+        "search_orders_by_date_p95_ms": search_p95,
+        "search_users_with_most_products_p50_ms": top_p50,
+        "search_users_with_most_products_p95_ms": top_p95,
+        "peak_rss_mb": peak_rss,
+    }
+
+
+def commit() -> str | None:
+    try:
+        found = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=False,  # Outside of a repository the commit is not known.
+        )
+    except OSError:
+        return None
+    return found.stdout.strip() or None
+
+
+def compare(results: dict, baseline: dict) -> None:
+    """
+    Print the relative change of the compared metrics against the baseline.
+    """
+    print(f"\nComparison with {baseline.get('commit')}:")
+    previous = {_["records"]: _ for _ in baseline["scales"]}
+    for scale in results["scales"]:
+        before = previous.get(scale["records"])
+        if before is None:
+            continue
+        for metric, better in COMPARED.items():
+            change = scale[metric] / before[metric] - 1 if before[metric] else 0.0
+            improved = change > 0 if better == "higher" else change < 0
+            print(
+                f"{scale['records']:>10} {metric:<40} {before[metric]:>12.2f} "
+                f"{scale[metric]:>12.2f} {change:>+8.1%} {'better' if improved else ''}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--scales", default="10000,1000000,10000000")
+    parser.add_argument(
+        "--import", dest="method", choices=["batch", "bulk"], default="batch"
+    )
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument(
+        "--windows", type=int, default=50, help="the number of searches"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=Path("benchmark-results.json"))
+    parser.add_argument("--compare", type=Path, help="the results of a previous run")
+    options = parser.parse_args()
+
+    settings = {
+        "import": options.method,
+        "users": options.users,
+        "products": options.products,
+        "skew": options.skew,
+        "windows": options.windows,
+        "seed": options.seed,
+    }
+    results = {
+        "commit": commit(),
+        "created": datetime.datetime.now(datetime.UTC).isoformat(),
+        "python": sys.version.split()[0],
+        "sqlite": db.sqlite_version,
+        "platform": platform.platform(),
+        "settings": settings,
+        "scales": [],
+    }
+    print(
+        f"{'records':>10} {'import [rec/s]':>15} {'search p50 [ms]':>16} "
+        f"{'search p95 [ms]':>16} {'top p50 [ms]':>13} {'peak RSS [MB]':>14}"
+    )
+    # A fresh process for each scale, so the peak RSS belongs to the scale only.
+    context = multiprocessing.get_context("spawn")
+    for scale in (int(_) for _ in options.scales.split(",")):
+        with context.Pool(1) as pool:
+            result = pool.apply(run_scale, (scale, settings))
+        results["scales"].append(result)
+        print(
+            f"{scale:>10} {result['import_records_per_second']:>15.0f} "
+            f"{result['search_orders_by_date_p50_ms']:>16.3f} "
+            f"{result['search_orders_by_date_p95_ms']:>16.3f} "
+            f"{result['search_users_with_most_products_p50_ms']:>13.3f} "
+            f"{result['peak_rss_mb']:>14.1f}"
+        )
+
+    options.output.write_text(json.dumps(results, indent=2), encoding="utf8")
+    print(f"\nThe results are written to {options.output}")
+    if options.compare:
+        compare(results, json.loads(options.compare.read_text(encoding="utf8")))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,14 @@ The order service module.
 
 __all__ = [
     "OrderService",
+    "AsyncOrderService",
+    "AsyncRepository",
+    "AsyncRunner",
+    "OrderServer",
+    "ChunkReport",
+    "Checkpoint",
+    "IngestMetrics",
+    "Profiler",
     "Order",
     "OrderID",
     "Product",
@@ -11,12 +19,29 @@ __all__ = [
     "User",
     "UserID",
     "OrderRepository",
+    "CheckpointRepository",
     "ProductRepository",
     "UserRepository",
     "JSONError",
+    "SchemaError",
     "ConflictError",
+    "CachedRepository",
+    "LRUCache",
+    "QueryCache",
+    "SQLAnalytics",
+    "ColumnarAnalytics",
+    "TimestampIndex",
+    "IndexedOrderRepository",
     "create_schema",
     "delete_schema",
+    "migrate_schema",
+    "transaction",
+    "ConnectionPool",
+    "StorageProfile",
+    "deferred_indexes",
+    "StagingLoader",
+    "rebuild_totals",
+    "check_totals",
 ]
 
 from company.orders._domain import (
@@ -28,16 +53,54 @@ from company.orders._domain import (
     OrderID as OrderID,
 )
 
-from company.orders._service import OrderService as OrderService
+from company.orders._service import (
+    OrderService as OrderService,
+    ChunkReport as ChunkReport,
+)
 
 from company.orders._storage import (
     UserRepository as UserRepository,
     ProductRepository as ProductRepository,
     OrderRepository as OrderRepository,
+    CheckpointRepository as CheckpointRepository,
     create_schema as create_schema,
     delete_schema as delete_schema,
+    migrate_schema as migrate_schema,
+    transaction as transaction,
+    ConnectionPool as ConnectionPool,
+    StorageProfile as StorageProfile,
+    deferred_indexes as deferred_indexes,
+    StagingLoader as StagingLoader,
+    rebuild_totals as rebuild_totals,
+    check_totals as check_totals,
     ConflictError as ConflictError,
 )
-from company.orders._common import JSONError as JSONError, DomainError as DomainError
+from company.orders._async import (
+    AsyncOrderService as AsyncOrderService,
+    AsyncRepository as AsyncRepository,
+    AsyncRunner as AsyncRunner,
+)
+from company.orders._http import OrderServer as OrderServer
+from company.orders._ingest import Checkpoint as Checkpoint
+from company.orders._analytics import (
+    SQLAnalytics as SQLAnalytics,
+    ColumnarAnalytics as ColumnarAnalytics,
+)
+from company.orders._metrics import IngestMetrics as IngestMetrics
+from company.orders._profiling import Profiler as Profiler
+from company.orders._index import (
+    TimestampIndex as TimestampIndex,
+    IndexedOrderRepository as IndexedOrderRepository,
+)
+from company.orders._cache import (
+    CachedRepository as CachedRepository,
+    LRUCache as LRUCache,
+    QueryCache as QueryCache,
+)
+from company.orders._common import (
+    JSONError as JSONError,
+    SchemaError as SchemaError,
+    DomainError as DomainError,
+)
 
 # ^^^^ Reimports: aliases are the trick to keep linters (Pylance) calm about unused imports.
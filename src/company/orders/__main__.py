@@ -1,28 +1,112 @@
 import argparse
+import json
 import sys
 from pathlib import Path
 import sqlite3 as db
 
 import datetime
 import logging
+from contextlib import nullcontext
+from functools import partial
 
 from company.orders import (
     UserRepository,
     ProductRepository,
     OrderRepository,
+    CheckpointRepository,
     OrderService,
     ConflictError,
     JSONError,
+    SchemaError,
     delete_schema,
     create_schema,
+    migrate_schema,
+    transaction,
+    ConnectionPool,
+    deferred_indexes,
+    StagingLoader,
+    rebuild_totals,
+    check_totals,
     DomainError,
+    CachedRepository,
+    IndexedOrderRepository,
+    TimestampIndex,
+    IngestMetrics,
+    Profiler,
+    QueryCache,
+    OrderServer,
 )
+from company.orders._records import BACKENDS
+from company.orders._storage import PROFILES
 
 
 DATABASE_FILE = "orders.sqlite"
 # This should be in some configuration file/object for production usage.
 
 
+def prepare_schema() -> None:
+    """
+    Create the schema of the database or migrate the existing one.
+    """
+    with db.connect(DATABASE_FILE) as connection:
+        if connection.execute(
+            "select 1 from sqlite_master where name = 'version'"
+        ).fetchone():
+            migrate_schema(connection)
+        else:
+            schema_path = Path(
+                Path(__file__).resolve().parents[1], "orders", "schema.sql"
+            )
+            create_schema(connection, schema_path.read_text(encoding="utf8"))
+    connection.close()
+
+
+def run_server(options) -> None:
+    """
+    Serve the database until interrupted, the schema is created or migrated first.
+    """
+    logger = logging.getLogger(__name__)
+    if options.verbose:
+        logger.setLevel(logging.DEBUG)
+    prepare_schema()
+
+    connections = ConnectionPool(DATABASE_FILE, options.storage_profile)
+    query_cache = (
+        None
+        if options.query_cache_ttl is None
+        else QueryCache(ttl=options.query_cache_ttl)
+    )
+    # The repositories are shared by the threads, so they are not wrapped by the in-memory caches.
+    service = OrderService(
+        user_repository=UserRepository(connections),
+        order_repository=OrderRepository(connections),
+        product_repository=ProductRepository(connections),
+        unit_of_work=partial(transaction, connections),
+        json_backend=options.json_backend,
+        query_cache=query_cache,
+    )
+    server = OrderServer(
+        (options.host, options.port),
+        service,
+        connections,
+        workers=options.threads,
+        query_cache=query_cache,
+        logger=logger if options.verbose else None,
+    )
+    host, port = server.socket.getsockname()[:2]
+    print(
+        f"Serving {DATABASE_FILE} on http://{host}:{port}/ (Ctrl+C to stop)",
+        file=sys.stderr,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        connections.close()
+
+
 def main():
     """
     The main function to demonstrate service functionality.
@@ -34,35 +118,199 @@ def main():
     # Define a simple command line interface.
     # -----------------------------------------------------------------------
     parser = argparse.ArgumentParser("company-orders", "Some company orders service")
-    parser.add_argument("--data", required=True)
+    parser.add_argument("--data", help="the JSON-line file to import")
     parser.add_argument("-v", "--verbose", action="store_true")
+    parser.add_argument(
+        "--bulk", action="store_true", help="use the set-based bulk import"
+    )
+    parser.add_argument(
+        "--bulk-load",
+        action="store_true",
+        help="load the data through staging tables in one transaction, build the indexes at the end",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="keep the database and import the records appended since the last import",
+    )
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        help="update the users and products whose attributes changed (implies --bulk)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=10_000,
+        help="the number of records committed at once by the bulk import",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="the number of processes parsing the file (implies --bulk)",
+    )
+    parser.add_argument(
+        "--mmap",
+        action="store_true",
+        help="read the memory-mapped file by the bulk import",
+    )
+    parser.add_argument(
+        "--json-backend",
+        choices=BACKENDS,
+        help="the JSON decoder, the fastest installed one by default",
+    )
+    parser.add_argument(
+        "--ingest-profile",
+        choices=PROFILES,
+        default="default",
+        help="the storage profile of the import, 'ingest' defers the indexes",
+    )
+    parser.add_argument(
+        "--serve-profile",
+        choices=PROFILES,
+        default="default",
+        help="the storage profile of the queries, 'serve' opens read-only connections",
+    )
+
+    parser.add_argument(
+        "--progress",
+        type=float,
+        metavar="SECONDS",
+        help="log the import progress in the interval and the phase timings",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print the latencies of the use cases, repository methods and SQL statements",
+    )
+    parser.add_argument(
+        "--profile-json",
+        type=Path,
+        metavar="PATH",
+        help="write the latency histograms as a JSON report (implies --profile)",
+    )
+    parser.add_argument(
+        "--rebuild-totals",
+        action="store_true",
+        help="rebuild the users' purchase totals of the existing database and exit",
+    )
+    parser.add_argument(
+        "--check-totals",
+        action="store_true",
+        help="check the users' purchase totals of the existing database and exit",
+    )
+
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+    serve = subparsers.add_parser(
+        "serve", help="serve the existing database over HTTP/JSON"
+    )
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8080)
+    serve.add_argument(
+        "--threads",
+        type=int,
+        default=8,
+        help="the number of threads serving the connections",
+    )
+    serve.add_argument(
+        "--storage-profile",
+        choices=PROFILES,
+        default="default",
+        help="the storage profile of connections, 'serve' rejects the imports",
+    )
+    serve.add_argument(
+        "--query-cache-ttl",
+        type=float,
+        metavar="SECONDS",
+        help="cache the search results for the time, no cache by default",
+    )
 
     options = parser.parse_args()
 
+    if options.command == "serve":
+        run_server(options)
+        sys.exit(0)
+
+    # -----------------------------------------------------------------------
+    # Maintain the existing database.
+    # -----------------------------------------------------------------------
+    if options.rebuild_totals or options.check_totals:
+        connection = db.connect(DATABASE_FILE)
+        migrate_schema(connection)
+        if options.rebuild_totals:
+            users = rebuild_totals(connection)
+            print(f"Rebuilt the purchase totals of {users} users", file=sys.stderr)
+        if options.check_totals:
+            inconsistent = check_totals(connection)
+            for user_id, stored, expected in inconsistent:
+                print(f"User {user_id}: stored total {stored}, expected {expected}")
+            if inconsistent:
+                print(
+                    f"\nFAILURE 7: {len(inconsistent)} inconsistent totals",
+                    file=sys.stderr,
+                )
+                sys.exit(7)
+            print("The purchase totals are consistent", file=sys.stderr)
+        connection.close()
+        sys.exit(0)
+
+    if options.data is None:
+        parser.error("the following arguments are required: --data")
+    if options.merge and options.bulk_load:
+        parser.error("argument --merge: not allowed with argument --bulk-load")
+
     LOGGER = None if not options.verbose else logging.getLogger(__name__)
 
     # -----------------------------------------------------------------------
     # Recreate database schema (this is only for showcase).
     # -----------------------------------------------------------------------
-    with db.connect(DATABASE_FILE) as connection:
-        schema_path = Path(Path(__file__).resolve().parents[1], "orders", "schema.sql")
-        with open(schema_path, encoding="utf8") as schema:
-            schema_script = schema.read()
-        delete_schema(connection)
-        create_schema(connection, schema_script)
-        connection.commit()
+    if options.incremental:
+        # The imported orders and the checkpoints are kept.
+        prepare_schema()
+    else:
+        with db.connect(DATABASE_FILE) as connection:
+            schema_path = Path(
+                Path(__file__).resolve().parents[1], "orders", "schema.sql"
+            )
+            with open(schema_path, encoding="utf8") as schema:
+                schema_script = schema.read()
+            delete_schema(connection)
+            create_schema(connection, schema_script)
+            connection.commit()
 
     # -----------------------------------------------------------------------
     # Showcase: the batch insert of data + use cases.
     # -----------------------------------------------------------------------
     # Configure the main application service.
-    connection = db.connect(DATABASE_FILE)
+    # The repositories use the connection of the calling thread,
+    # opened with the ingest profile until the import ends.
+    connections = ConnectionPool(DATABASE_FILE, options.ingest_profile)
+    connection = connections.connection
 
-    service = OrderService(
-        user_repository=UserRepository(connection),
-        order_repository=OrderRepository(connection),
-        product_repository=ProductRepository(connection),
-        logger=LOGGER,
+    # The profiled objects are wrapped only when the profiling is enabled.
+    profiler = Profiler() if options.profile or options.profile_json else None
+    profiled = (lambda _: _) if profiler is None else profiler.wrap
+    if profiler is not None:
+        profiler.trace(connection)
+
+    order_repository = IndexedOrderRepository(
+        profiled(OrderRepository(connections)),
+        TimestampIndex.from_connection(connection),
+    )
+    service = profiled(
+        OrderService(
+            user_repository=CachedRepository(profiled(UserRepository(connections))),
+            order_repository=order_repository,
+            product_repository=CachedRepository(
+                profiled(ProductRepository(connections))
+            ),
+            logger=LOGGER,
+            unit_of_work=partial(transaction, connections),
+            json_backend=options.json_backend,
+            staging_loader=partial(StagingLoader, connections),
+            checkpoint_repository=CheckpointRepository(connections),
+        )
     )
 
     # Exceute commands and handle errors.
@@ -74,7 +322,44 @@ def main():
         # ################################################################### #
         path = Path(options.data.strip())
         print(f"Import records from file '{path}'...", file=sys.stderr)
-        service.batch_insert_orders(path=path)
+        metrics = IngestMetrics(
+            logger=None if options.progress is None else logging.getLogger(__name__),
+            progress_interval=options.progress or 0.0,
+        )
+        # The bulk load builds the indexes at the end by itself.
+        deferred = connections.profile.defer_indexes and not options.bulk_load
+        with deferred_indexes(connections) if deferred else nullcontext():
+            if options.incremental:
+                service.incremental_insert_orders(
+                    path=path,
+                    chunk_size=options.chunk_size,
+                    merge=options.merge,
+                    metrics=metrics,
+                )
+            elif options.bulk_load:
+                service.bulk_load_orders(
+                    path=path,
+                    chunk_size=options.chunk_size,
+                    workers=options.workers,
+                    memory_map=options.mmap,
+                    metrics=metrics,
+                )
+            elif options.bulk or options.workers > 1 or options.merge:
+                service.bulk_insert_orders(
+                    path=path,
+                    chunk_size=options.chunk_size,
+                    workers=options.workers,
+                    memory_map=options.mmap,
+                    merge=options.merge,
+                    metrics=metrics,
+                )
+            else:
+                service.batch_insert_orders(path=path, metrics=metrics)
+        connections.use(options.serve_profile)
+        if options.bulk_load:
+            order_repository.reload(connections.connection)
+        if profiler is not None:
+            profiler.trace(connections.connection)
         print("\n===[DONE]===", file=sys.stderr)
 
         # ################################################################### #
@@ -82,7 +367,10 @@ def main():
         # ################################################################### #
         date1 = datetime.datetime(2018, 11, 16, 1, 29, 4)
         date2 = datetime.datetime(2018, 11, 16, 10, 45, 30)
-        print(f"Select orders between {date1} and {date2}...\n", file=sys.stderr)
+        count = service.count_orders_by_date(since=date1, till=date2)
+        print(
+            f"Select {count} orders between {date1} and {date2}...\n", file=sys.stderr
+        )
         orders = service.search_orders_by_date(since=date1, till=date2)
         for order in orders:
             print(
@@ -96,13 +384,15 @@ def main():
         # ################################################################### #
         limit = 5
         print(f"Select top {limit} users with most products...\n", file=sys.stderr)
-        top_users = service.search_users_with_most_products(connection, limit=limit)
+        top_users = service.search_users_with_most_products(connections, limit=limit)
         for user in top_users:
             print(user)
         print("\n===[DONE]===", file=sys.stderr)
 
     except FileNotFoundError:
         error_state = (1, f"Could not find file {path}")
+    except SchemaError as error:
+        error_state = (3, f"Could not parse record because of invalid schema {error}")
     except JSONError as error:
         error_state = (2, f"Could not parse record {error}")
     except KeyError as error:
@@ -116,6 +406,13 @@ def main():
 
     # TODO Catch other domain errors such as negative product price (ValueError/DomainError).
 
+    if profiler is not None:
+        print(f"\n{profiler.summary()}", file=sys.stderr)
+        if options.profile_json:
+            with open(options.profile_json, "w", encoding="utf8") as file:
+                json.dump(profiler.report(), file, indent=2)
+    connections.close()
+
     if error_state[0] == 0:
         print("\n--SUCCESS--")
     else:
@@ -0,0 +1,383 @@
+"""
+This module contains the read-only analytical queries over the orders, such as
+the top users, the revenue per city and the product popularity in a time window.
+
+There are two interchangeable backends: the :class:`SQLAnalytics` aggregating
+the tables on each query and the :class:`ColumnarAnalytics` holding an in-memory
+columnar snapshot loaded once. The snapshot uses `numpy` for the vectorized
+group-by when installed, the standard `array` columns with Python loops otherwise.
+"""
+
+__all__ = ["Analytics", "SQLAnalytics", "ColumnarAnalytics"]
+
+from array import array
+from bisect import bisect_left, bisect_right
+from heapq import nsmallest
+from typing import Iterable, Protocol, TypeAlias
+
+try:
+    import numpy
+
+    HAS_NUMPY = True
+except ImportError:  # The optional dependency.
+    HAS_NUMPY = False
+
+from company.orders._common import Timestamp
+from company.orders._domain import UserID, ProductID
+
+Sums: TypeAlias = "list[int] | numpy.ndarray"
+"""The sums grouped by the key codes, the `numpy` array when the snapshot uses it."""
+
+# The bounds of an open time window.
+_MIN_TIMESTAMP = -(2**63)
+_MAX_TIMESTAMP = 2**63 - 1
+
+
+class Analytics(Protocol):
+    """
+    The analytical queries over the orders created in the time window.
+
+    The ``None`` bounds of the window are not limited. The results are ordered
+    by the aggregated value in descending order, the ties by the key.
+    """
+
+    def top_users(
+        self, limit: int, since: Timestamp | None = None, till: Timestamp | None = None
+    ) -> list[tuple[UserID, int]]:
+        """
+        Find the users with the highest number of purchased products.
+
+        :param limit: The maximum number of users to return.
+        :returns: The `(user_id, quantity)` pairs.
+        """
+        return NotImplemented
+
+    def revenue_by_city(
+        self, since: Timestamp | None = None, till: Timestamp | None = None
+    ) -> list[tuple[str, int]]:
+        """
+        Sum the price of purchased products by the city of users.
+
+        :returns: The `(city, revenue)` pairs.
+        """
+        return NotImplemented
+
+    def product_popularity(
+        self, limit: int, since: Timestamp | None = None, till: Timestamp | None = None
+    ) -> list[tuple[ProductID, int]]:
+        """
+        Find the products purchased in the highest quantity.
+
+        :param limit: The maximum number of products to return.
+        :returns: The `(product_id, quantity)` pairs.
+        """
+        return NotImplemented
+
+
+def _window(
+    since: Timestamp | None, till: Timestamp | None
+) -> tuple[Timestamp, Timestamp]:
+    return (
+        _MIN_TIMESTAMP if since is None else since,
+        _MAX_TIMESTAMP if till is None else till,
+    )
+
+
+class SQLAnalytics:
+    """
+    The analytical queries aggregating the tables on each call.
+
+    :param connection: A database connection object.
+    """
+
+    def __init__(self, connection) -> None:
+        self.connection = connection
+
+    def top_users(
+        self, limit: int, since: Timestamp | None = None, till: Timestamp | None = None
+    ) -> list[tuple[UserID, int]]:
+        if since is None and till is None:
+            # The totals are maintained by the triggers (see `schema.sql`).
+            statement = """
+                select user_id, total from user_product_totals where total > 0
+                order by total desc, user_id limit ?"""
+            return self.connection.execute(statement, (limit,)).fetchall()
+        statement = """
+            select o.user_id, sum(l.quantity) as total
+            from orders o join order_lines l on l.order_id = o.id
+            where o.created between ? and ?
+            group by o.user_id order by total desc, o.user_id limit ?"""
+        return self.connection.execute(
+            statement, (*_window(since, till), limit)
+        ).fetchall()
+
+    def revenue_by_city(
+        self, since: Timestamp | None = None, till: Timestamp | None = None
+    ) -> list[tuple[str, int]]:
+        statement = """
+            select u.city, sum(l.quantity * p.price) as revenue
+            from orders o
+            join order_lines l on l.order_id = o.id
+            join products p on p.id = l.product_id
+            join users u on u.id = o.user_id
+            where o.created between ? and ?
+            group by u.city order by revenue desc, u.city"""
+        return self.connection.execute(statement, _window(since, till)).fetchall()
+
+    def product_popularity(
+        self, limit: int, since: Timestamp | None = None, till: Timestamp | None = None
+    ) -> list[tuple[ProductID, int]]:
+        statement = """
+            select l.product_id, sum(l.quantity) as total
+            from orders o join order_lines l on l.order_id = o.id
+            where o.created between ? and ?
+            group by l.product_id order by total desc, l.product_id limit ?"""
+        return self.connection.execute(
+            statement, (*_window(since, till), limit)
+        ).fetchall()
+
+
+class ColumnarAnalytics:
+    """
+    The analytical queries over an in-memory columnar snapshot of the orders.
+
+    The orders are sorted by the creation time and their lines are stored
+    contiguously, so a time window is found by two binary searches and the
+    group-by runs over a slice of the line columns. The users, products and
+    cities are referenced by their positions (codes) instead of identifiers.
+
+    The snapshot doesn't see the orders saved after it was loaded.
+
+    :param users: The `(id, name, city)` rows.
+    :param products: The `(id, name, price)` rows.
+    :param orders: The `(id, user_id, created)` rows.
+    :param order_lines: The `(order_id, product_id, quantity)` rows.
+    :param use_numpy: Use the vectorized `numpy` operations, when installed by default.
+    """
+
+    def __init__(
+        self,
+        users: Iterable[tuple[UserID, str, str]],
+        products: Iterable[tuple[ProductID, str, int]],
+        orders: Iterable[tuple[int, UserID, Timestamp]],
+        order_lines: Iterable[tuple[int, ProductID, int]],
+        use_numpy: bool | None = None,
+    ) -> None:
+        if use_numpy and not HAS_NUMPY:
+            raise ValueError("The numpy is not installed")
+        self.use_numpy = HAS_NUMPY if use_numpy is None else use_numpy
+
+        user_codes: dict[UserID, int] = {}
+        city_codes: dict[str, int] = {}
+        self.user_ids = array("q")
+        self.user_cities = array("q")
+        for user_id, _, city in users:
+            user_codes[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+            self.user_cities.append(city_codes.setdefault(city, len(city_codes)))
+        self.cities = list(city_codes)
+
+        product_codes: dict[ProductID, int] = {}
+        self.product_ids = array("q")
+        prices = array("q")
+        for product_id, _, price in products:
+            product_codes[product_id] = len(self.product_ids)
+            self.product_ids.append(product_id)
+            prices.append(price)
+        priced = len(self.product_ids)
+
+        # The unknown users and products (the foreign keys are not enforced) are
+        # added when referenced, they are not joined with a city or a price.
+        def user_code(user_id: UserID) -> int:
+            if user_id not in user_codes:
+                user_codes[user_id] = len(self.user_ids)
+                self.user_ids.append(user_id)
+                self.user_cities.append(len(self.cities))
+            return user_codes[user_id]
+
+        def product_code(product_id: ProductID) -> int:
+            if product_id not in product_codes:
+                product_codes[product_id] = len(self.product_ids)
+                self.product_ids.append(product_id)
+                prices.append(0)
+            return product_codes[product_id]
+
+        sorted_orders = sorted(orders, key=lambda _: (_[2], _[0]))
+        positions = {row[0]: position for position, row in enumerate(sorted_orders)}
+        order_users = [user_code(row[1]) for row in sorted_orders]
+        self.created = array("d", (row[2] for row in sorted_orders))
+
+        # The lines of unknown orders are skipped as by the joins.
+        lines = sorted(
+            (positions[order_id], product_id, quantity)
+            for order_id, product_id, quantity in order_lines
+            if order_id in positions
+        )
+        self.line_starts = array("q", bytes(8 * (len(sorted_orders) + 1)))
+        self.line_users = array("q")
+        self.line_products = array("q")
+        self.line_quantities = array("q")
+        self.line_revenues = array("q")
+        self.line_priced = array("q")  # The line is joined with a product.
+        for position, product_id, quantity in lines:
+            code = product_code(product_id)
+            self.line_starts[position + 1] += 1
+            self.line_users.append(order_users[position])
+            self.line_products.append(code)
+            self.line_quantities.append(quantity)
+            self.line_revenues.append(quantity * prices[code])
+            self.line_priced.append(code < priced)
+        for position in range(len(sorted_orders)):
+            self.line_starts[position + 1] += self.line_starts[position]
+
+        # The views share the memory with the columns, which can't grow any more.
+        self._numpy = {}
+        if self.use_numpy:
+            self._numpy = {
+                name: numpy.frombuffer(getattr(self, name), dtype=numpy.int64)
+                for name in (
+                    "user_ids",
+                    "user_cities",
+                    "product_ids",
+                    "line_users",
+                    "line_products",
+                    "line_quantities",
+                    "line_revenues",
+                    "line_priced",
+                )
+            }
+
+    @classmethod
+    def from_connection(
+        cls, connection, use_numpy: bool | None = None
+    ) -> "ColumnarAnalytics":
+        """
+        Load the snapshot of all stored orders.
+
+        :param connection: A database connection object.
+        :param use_numpy: See :class:`ColumnarAnalytics`.
+        """
+        # The rows are sorted by the storage, so sorting them again is cheap.
+        return cls(
+            connection.execute("select id, name, city from users"),
+            connection.execute("select id, name, price from products"),
+            connection.execute(
+                "select id, user_id, created from orders order by created, id"
+            ),
+            connection.execute(
+                "select l.order_id, l.product_id, l.quantity from order_lines l"
+                " join orders o on o.id = l.order_id order by o.created, o.id, l.product_id"
+            ),
+            use_numpy=use_numpy,
+        )
+
+    def __len__(self) -> int:
+        """The number of orders."""
+        return len(self.created)
+
+    def top_users(
+        self, limit: int, since: Timestamp | None = None, till: Timestamp | None = None
+    ) -> list[tuple[UserID, int]]:
+        start, end = self._lines(since, till)
+        size = len(self.user_ids)
+        quantities = self._sum_by("line_users", "line_quantities", start, end, size)
+        counts = self._sum_by("line_users", None, start, end, size)
+        return self._top("user_ids", quantities, counts, limit)
+
+    def revenue_by_city(
+        self, since: Timestamp | None = None, till: Timestamp | None = None
+    ) -> list[tuple[str, int]]:
+        start, end = self._lines(since, till)
+        size = len(self.user_ids)
+        revenues = self._sum_by("line_users", "line_revenues", start, end, size)
+        counts = self._sum_by("line_users", "line_priced", start, end, size)
+        # The last city collects the unknown users.
+        city_revenues = [0] * (len(self.cities) + 1)
+        city_counts = [0] * (len(self.cities) + 1)
+        if self.use_numpy:
+            cities = self._numpy["user_cities"]
+            city_revenues = _to_int(
+                numpy.bincount(cities, revenues, len(city_revenues))
+            )
+            city_counts = _to_int(numpy.bincount(cities, counts, len(city_counts)))
+        else:
+            for code, revenue, count in zip(self.user_cities, revenues, counts):
+                city_revenues[code] += revenue
+                city_counts[code] += count
+        found = [
+            (-int(revenue), city)
+            for city, revenue, count in zip(self.cities, city_revenues, city_counts)
+            if count
+        ]
+        return [(city, -revenue) for revenue, city in sorted(found)]
+
+    def product_popularity(
+        self, limit: int, since: Timestamp | None = None, till: Timestamp | None = None
+    ) -> list[tuple[ProductID, int]]:
+        start, end = self._lines(since, till)
+        size = len(self.product_ids)
+        quantities = self._sum_by("line_products", "line_quantities", start, end, size)
+        counts = self._sum_by("line_products", None, start, end, size)
+        return self._top("product_ids", quantities, counts, limit)
+
+    def _lines(
+        self, since: Timestamp | None, till: Timestamp | None
+    ) -> tuple[int, int]:
+        """
+        Return the slice of lines of the orders created in the window.
+        """
+        since, till = _window(since, till)
+        first = bisect_left(self.created, since)
+        last = bisect_right(self.created, till)
+        return self.line_starts[first], self.line_starts[max(first, last)]
+
+    def _sum_by(
+        self, keys: str, weights: str | None, start: int, end: int, size: int
+    ) -> Sums:
+        """
+        Sum the weights (or count the lines) of the slice grouped by the key codes.
+        """
+        if self.use_numpy:
+            codes = self._numpy[keys][start:end]
+            if weights is None:
+                return numpy.bincount(codes, minlength=size)
+            return _to_int(numpy.bincount(codes, self._numpy[weights][start:end], size))
+        sums = [0] * size
+        codes = getattr(self, keys)[start:end]
+        if weights is None:
+            for code in codes:
+                sums[code] += 1
+        else:
+            for code, weight in zip(codes, getattr(self, weights)[start:end]):
+                sums[code] += weight
+        return sums
+
+    def _top(
+        self, ids: str, sums: Sums, counts: Sums, limit: int
+    ) -> list[tuple[int, int]]:
+        """
+        Return the `(id, sum)` of the present codes with the highest sums, the ties by id.
+        """
+        if self.use_numpy:
+            present = numpy.flatnonzero(counts)
+            identifiers = self._numpy[ids][present]
+            totals = numpy.asarray(sums)[present]
+            chosen = numpy.lexsort((identifiers, -totals))[:limit]
+            return list(zip(identifiers[chosen].tolist(), totals[chosen].tolist()))
+        identifiers = getattr(self, ids)
+        found = nsmallest(
+            limit,
+            (
+                (-sums[code], identifiers[code])
+                for code in range(len(sums))
+                if counts[code]
+            ),
+        )
+        return [(identifier, -total) for total, identifier in found]
+
+
+def _to_int(sums):
+    """
+    Round the float sums of :func:`numpy.bincount` with weights to integers.
+    """
+    return numpy.rint(sums).astype(numpy.int64)
@@ -0,0 +1,323 @@
+"""
+This module contains the asyncio facades of the service and repositories.
+
+The blocking SQLite work runs on a bounded pool of threads, each with its own
+connection of a :class:`ConnectionPool`, so the event loop is not stalled
+by the queries.
+"""
+
+__all__ = ["AsyncRunner", "AsyncRepository", "AsyncOrderService", "AsyncResults"]
+
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Iterable, Self, TypeVar
+
+from company.orders._common import Entity, connection_of
+
+T = TypeVar("T")
+E = TypeVar("E", bound=Entity)
+
+
+class AsyncRunner:
+    """
+    The bounded pool of threads running the blocking calls for coroutines.
+
+    When a call is cancelled or times out, the statement running on the
+    connection of its thread is interrupted (see :meth:`sqlite3.Connection.interrupt`),
+    so the thread is released for other calls. The connections must be usable
+    from the pool's threads, e.g. the connections of :class:`ConnectionPool`.
+
+    :param max_workers: The maximum number of threads (and connections) used at once.
+    :param connections: The connection provider of the called objects, whose
+        statements are interrupted, nothing is interrupted by default.
+    :param timeout: The default timeout of calls in seconds, none by default.
+    :param batch_size: The number of items fetched by one call of :class:`AsyncResults`.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        connections=None,
+        timeout: float | None = None,
+        batch_size: int = 1000,
+    ) -> None:
+        self.executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="company-orders"
+        )
+        self.connections = connections
+        self.timeout = timeout
+        self.batch_size = batch_size
+
+    async def call(
+        self, function: Callable[..., T], *args, timeout: float | None = None, **kwargs
+    ) -> T:
+        """
+        Run the function in a thread of the pool and return its result.
+
+        :param timeout: The timeout of the call in seconds, the runner's one by default.
+        :raises:
+            :class:`TimeoutError`: when the call doesn't finish in time.
+        """
+        return await self._run(
+            _Call(self.connections, partial(function, *args, **kwargs)), timeout
+        )
+
+    def iterate(
+        self,
+        function: Callable[..., Iterable[E]],
+        *args,
+        timeout: float | None = None,
+        **kwargs,
+    ) -> "AsyncResults[E]":
+        """
+        Return the asynchronous iterator over the results of the keyset search,
+        e.g. :meth:`OrderRepository.find_between`, fetched in batches.
+
+        Each batch is a call of the function with the `after_id` of the last result
+        and the `limit` of the batch, the given `after_id` and `limit` bound the whole
+        iteration.
+
+        :param timeout: The timeout of the whole iteration in seconds, the runner's one by default.
+        """
+        after_id, limit = kwargs.pop("after_id", None), kwargs.pop("limit", None)
+        return AsyncResults(
+            self, partial(function, *args, **kwargs), timeout, after_id, limit
+        )
+
+    def collect(
+        self,
+        function: Callable[..., Iterable[E]],
+        *args,
+        timeout: float | None = None,
+        **kwargs,
+    ) -> "AsyncResults[E]":
+        """
+        Return the asynchronous iterator over the results of the function fetched by one call,
+        e.g. of the searches without a keyset whose results are bounded by their limit.
+
+        :param timeout: The timeout of the call in seconds, the runner's one by default.
+        """
+        return AsyncResults(
+            self, partial(function, *args, **kwargs), timeout, paged=False
+        )
+
+    async def _run(self, call: "_Call", timeout: float | None) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, call)
+        try:
+            return await asyncio.wait_for(
+                future, self.timeout if timeout is None else timeout
+            )
+        except (asyncio.CancelledError, TimeoutError):
+            call.interrupt()
+            raise
+
+    def close(self) -> None:
+        """
+        Wait for the running calls and stop the threads, the queued calls are cancelled.
+        """
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class _Call:
+    """
+    The blocking call remembering the connection of the thread running it.
+    """
+
+    def __init__(
+        self, connections, function: Callable[[], Any], connection=None
+    ) -> None:
+        self.connections = connections
+        self.function = function
+        self.connection = connection
+
+    def __call__(self) -> Any:
+        if self.connection is None and self.connections is not None:
+            self.connection = connection_of(self.connections)
+        try:
+            return self.function()
+        finally:
+            self.connection = None
+
+    def interrupt(self) -> None:
+        connection = self.connection
+        if connection is not None:
+            connection.interrupt()
+
+
+class AsyncResults(AsyncIterator[E]):
+    """
+    The asynchronous iterator fetching the results of a keyset search in batches.
+
+    Each batch is fetched by its own call in a thread of the pool, which continues
+    after the identifier of the previous batch's last result. So no cursor is kept
+    open between the batches, and the statement of a cancelled batch is interrupted
+    on the connection of the thread running it.
+
+    :param runner: The runner of the batches.
+    :param function: The search accepting the `after_id` and `limit` keyword arguments.
+    :param timeout: The timeout of the whole iteration in seconds, the runner's one by default.
+    :param after_id: Return only results after this identifier.
+    :param limit: The maximum number of results to return.
+    :param paged: Fetch the results in batches, otherwise all of them by one call.
+    """
+
+    def __init__(
+        self,
+        runner: AsyncRunner,
+        function: Callable[..., Iterable[E]],
+        timeout: float | None,
+        after_id: int | None = None,
+        limit: int | None = None,
+        paged: bool = True,
+    ) -> None:
+        self._runner = runner
+        self._function = function
+        self._after_id = after_id
+        self._remaining = limit
+        self._paged = paged
+        self._buffer: deque[E] = deque()
+        self._exhausted = False
+        timeout = runner.timeout if timeout is None else timeout
+        self._deadline = None if timeout is None else time.monotonic() + timeout
+
+    def __aiter__(self) -> "AsyncResults[E]":
+        return self
+
+    async def __anext__(self) -> E:
+        if not self._buffer and not self._exhausted:
+            self._buffer.extend(await self._fetch())
+        if not self._buffer:
+            raise StopAsyncIteration
+        return self._buffer.popleft()
+
+    async def _fetch(self) -> list[E]:
+        if not self._paged:
+            function = partial(_collect, self._function)
+            self._exhausted = True
+        else:
+            size = self._runner.batch_size
+            if self._remaining is not None:
+                size = min(size, self._remaining)
+            if size <= 0:
+                self._exhausted = True
+                return []
+            function = partial(
+                _collect, self._function, after_id=self._after_id, limit=size
+            )
+        timeout = (
+            None
+            if self._deadline is None
+            else max(self._deadline - time.monotonic(), 0)
+        )
+        try:
+            batch = await self._runner._run(
+                _Call(self._runner.connections, function), timeout
+            )
+        except BaseException:
+            self._exhausted = True
+            raise
+        if self._paged:
+            if self._remaining is not None:
+                self._remaining -= len(batch)
+            if len(batch) < size:
+                self._exhausted = True
+            elif batch:
+                self._after_id = batch[-1].identifier
+        return batch
+
+    async def aclose(self) -> None:
+        """
+        Stop the iteration, no batch is fetched any more.
+        """
+        self._exhausted = True
+        self._buffer.clear()
+
+
+def _collect(function: Callable[..., Iterable[Any]], **kwargs) -> list[Any]:
+    """
+    Call the function and collect its results in the thread running it.
+    """
+    return list(function(**kwargs))
+
+
+class _AsyncProxy:
+    """
+    The proxy running the public methods of the target by the runner, each method
+    accepts the `timeout` keyword argument. The :attr:`iterating` (keyset searches)
+    and the :attr:`collecting` methods return :class:`AsyncResults`, the others
+    are coroutines.
+    """
+
+    iterating: frozenset[str] = frozenset()
+    collecting: frozenset[str] = frozenset()
+
+    def __init__(self, target: Any, runner: AsyncRunner) -> None:
+        self._target = target
+        self._runner = runner
+
+    def __getattr__(self, attribute: str) -> Any:
+        value = getattr(self._target, attribute)
+        if attribute.startswith("_") or not callable(value):
+            return value
+        method: Callable[..., Any]
+        if attribute in self.iterating:
+            method = partial(self._runner.iterate, value)
+        elif attribute in self.collecting:
+            method = partial(self._runner.collect, value)
+        else:
+            method = partial(self._runner.call, value)
+        setattr(self, attribute, method)  # Wrapped only once.
+        return method
+
+
+class AsyncRepository(_AsyncProxy):
+    """
+    The asynchronous counterpart of a repository, e.g.
+    ``await AsyncRepository(UserRepository(connections), runner).find(1)``.
+
+    The searches of ranges return :class:`AsyncResults` to be iterated by ``async for``.
+
+    :param repository: The repository e.g. :class:`OrderRepository`.
+    :param runner: The runner of the blocking calls.
+    """
+
+    iterating = frozenset({"find_between"})
+
+    def __init__(self, repository: Any, runner: AsyncRunner) -> None:
+        super().__init__(repository, runner)
+
+
+class AsyncOrderService(_AsyncProxy):
+    """
+    The asynchronous facade of :class:`OrderService` for asyncio applications.
+
+    Each use case runs by the threads of the runner with the same arguments and
+    an optional `timeout` in seconds, e.g.::
+
+        async for order in service.search_orders_by_date(since, till, timeout=1.0):
+            ...
+        count = await service.count_orders_by_date(since, till)
+
+    The searches of orders and users return :class:`AsyncResults`, the other use
+    cases are coroutines. The service should use the repositories of the runner's
+    :class:`ConnectionPool`, so the threads don't share a connection.
+
+    :param service: The synchronous service.
+    :param runner: The runner of the blocking calls.
+    """
+
+    iterating = frozenset({"search_orders_by_date"})
+    collecting = frozenset({"search_users_with_most_products"})
+
+    def __init__(self, service: Any, runner: AsyncRunner) -> None:
+        super().__init__(service, runner)
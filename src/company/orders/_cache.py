@@ -0,0 +1,473 @@
+"""
+This module contains in-process caches such as the bounded LRU cache,
+the read-through identity map in front of a repository and the cache
+of query results.
+"""
+
+__all__ = [
+    "LRUCache",
+    "CacheStats",
+    "CachedRepository",
+    "QueryCache",
+    "InvalidatingOrderRepository",
+]
+
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import dataclass
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Generic,
+    Hashable,
+    Iterable,
+    Iterator,
+    TypeVar,
+)
+import threading
+import time
+
+from company.orders._common import Entity, Timestamp
+from company.orders._domain import Order, OrderID, OrderRepository
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+E = TypeVar("E", bound=Entity)
+
+
+@dataclass(frozen=True, slots=True)
+class CacheStats:
+    """
+    The value object with cache counters.
+    """
+
+    hits: int
+    misses: int
+    size: int
+    maxsize: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class LRUCache(Generic[K, V]):
+    """
+    The size-bounded cache evicting the least recently used items.
+
+    :param maxsize: The maximum number of items.
+    """
+
+    def __init__(self, maxsize: int = 10_000) -> None:
+        if maxsize < 1:
+            raise ValueError("Cache size must be greater then zero")
+        self._items: OrderedDict[K, V] = OrderedDict()
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: K) -> bool:
+        """Check the key without counting a lookup or touching the item."""
+        return key in self._items
+
+    def get(self, key: K, default: Any = None) -> V | Any:
+        """
+        Return the cached value and mark it as recently used.
+
+        :param key: The key of the item.
+        :param default: The value returned (and counted as miss) when the key is not cached.
+        """
+        try:
+            value = self._items[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: K, default: Any = None) -> V | Any:
+        """
+        Return the cached value and mark it as recently used, the lookup is not counted.
+        """
+        try:
+            value = self._items[key]
+        except KeyError:
+            return default
+        self._items.move_to_end(key)
+        return value
+
+    def put(self, key: K, value: V) -> None:
+        """
+        Cache the value, the least recently used item is evicted when the cache is full.
+        """
+        self._items[key] = value
+        self._items.move_to_end(key)
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def items(self) -> list[tuple[K, V]]:
+        """
+        Return the items from the least recently used one without touching them.
+        """
+        return list(self._items.items())
+
+    def invalidate(self, key: K | None = None) -> None:
+        """
+        Remove the item or all items when no key is given.
+        """
+        if key is None:
+            self._items.clear()
+        else:
+            self._items.pop(key, None)
+
+    def stats(self) -> CacheStats:
+        return CacheStats(self.hits, self.misses, len(self._items), self.maxsize)
+
+
+_KNOWN = object()
+"""The marker of a stored entity whose state is not cached."""
+
+
+class CachedRepository(Generic[E, K]):
+    """
+    The read-through identity map in front of a repository.
+
+    It remembers the identifiers known to be stored and the entities saved or
+    found through it, so the repeated :meth:`exists` and :meth:`find` calls don't
+    hit the storage. Only the positive answers are cached, because the other
+    writers may save the entity later. Other methods are delegated.
+
+    The cache doesn't know about transactions; when a unit of work is rolled back,
+    call :meth:`invalidate` to forget the entities saved in it.
+
+    :param repository: The cached repository e.g. :class:`UserRepository`.
+    :param maxsize: The maximum number of cached entities.
+    """
+
+    def __init__(self, repository: Any, maxsize: int = 10_000) -> None:
+        self.repository = repository
+        self.cache: LRUCache[K, Any] = LRUCache(maxsize)
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.repository, name)
+
+    def save(self, aggregate: E) -> None:
+        self.repository.save(aggregate)
+        self.cache.put(aggregate.identifier, aggregate)
+
+    def save_missing(self, aggregates: Iterable[E]) -> int:
+        # Some of the entities may be stored already in a different state.
+        aggregates = list(aggregates)
+        saved = self.repository.save_missing(aggregates)
+        for aggregate in aggregates:
+            if aggregate.identifier not in self.cache:
+                self.cache.put(aggregate.identifier, _KNOWN)
+        return saved
+
+    def merge(self, aggregates: Iterable[E]) -> int:
+        aggregates = list(aggregates)
+        merged = self.repository.merge(aggregates)
+        for aggregate in aggregates:
+            self.cache.put(aggregate.identifier, aggregate)
+        return merged
+
+    def find(self, aggregate_id: K) -> E | None:
+        cached = self.cache.peek(aggregate_id, _KNOWN)
+        if cached is not _KNOWN:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        found = self.repository.find(aggregate_id)
+        if found is not None:
+            self.cache.put(aggregate_id, found)
+        return found
+
+    def find_many(self, aggregate_ids: Iterable[K]) -> list[E]:
+        found: dict[K, E] = {}
+        missing: list[K] = []
+        for aggregate_id in dict.fromkeys(aggregate_ids):
+            cached = self.cache.peek(aggregate_id, _KNOWN)
+            if cached is _KNOWN:
+                missing.append(aggregate_id)
+            else:
+                found[aggregate_id] = cached
+        self.hits += len(found)
+        self.misses += len(missing)
+        for aggregate in self.repository.find_many(missing) if missing else []:
+            self.cache.put(aggregate.identifier, aggregate)
+            found[aggregate.identifier] = aggregate
+        return [found[_] for _ in sorted(found)]  # type: ignore[type-var]
+
+    def exists(self, aggregate_id: K) -> bool:
+        if self.cache.peek(aggregate_id) is not None:
+            self.hits += 1
+            return True
+        self.misses += 1
+        found = self.repository.exists(aggregate_id)
+        if found:
+            self.cache.put(aggregate_id, _KNOWN)
+        return found
+
+    def invalidate(self, aggregate_id: K | None = None) -> None:
+        """
+        Forget the entity or all entities when no identifier is given.
+        """
+        self.cache.invalidate(aggregate_id)
+
+    def stats(self) -> CacheStats:
+        return CacheStats(self.hits, self.misses, len(self.cache), self.cache.maxsize)
+
+
+_MISSING = object()
+
+
+class QueryCache:
+    """
+    The cache of query results with the size-bounded LRU and the time-to-live eviction.
+
+    Each result is cached with the range of order timestamps it depends on, so
+    :meth:`invalidate_orders` removes only the results of ranges containing the
+    new orders. The results without a range (e.g. the top users) depend on all
+    orders and are removed by any new order. The cache is safe to share by threads.
+
+    Each invalidation increments the :attr:`generation`; pass the generation read
+    before the query to :meth:`put`, so a result read while the orders were being
+    written is not cached.
+
+    :param maxsize: The maximum number of cached results.
+    :param ttl: The seconds a result is valid, e.g. for writes of other processes,
+        none for no expiration.
+    :param clock: The source of the current time in seconds.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1000,
+        ttl: float | None = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        # The values are `(expires, since, till, result)`.
+        self.cache: LRUCache[tuple, tuple] = LRUCache(maxsize)
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.generation = 0
+        self._methods: dict[str, list[int]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def get(self, key: tuple, default: Any = None) -> Any:
+        """
+        Return the valid cached result and count the lookup by its method (the first item of the key).
+
+        :param key: The key of the result e.g. `(method, limit)`.
+        :param default: The value returned when the result is not cached or expired.
+        """
+        with self._lock:
+            cached = self.cache.peek(key, _MISSING)
+            if (
+                cached is not _MISSING
+                and cached[0] is not None
+                and cached[0] <= self.clock()
+            ):
+                self.cache.invalidate(key)
+                cached = _MISSING
+            counters = self._methods.setdefault(key[0], [0, 0])
+            if cached is _MISSING:
+                self.misses += 1
+                counters[1] += 1
+                return default
+            self.hits += 1
+            counters[0] += 1
+            return cached[3]
+
+    def put(
+        self,
+        key: tuple,
+        result: Any,
+        since: Timestamp | None = None,
+        till: Timestamp | None = None,
+        generation: int | None = None,
+    ) -> bool:
+        """
+        Cache the result of the query.
+
+        :param key: The key of the result.
+        :param result: The immutable result e.g. a tuple of entities.
+        :param since: The start of the range of orders the result depends on (inclusive).
+        :param till: The end of the range of orders the result depends on (inclusive),
+            the result depends on all orders when the range is not given.
+        :param generation: The :attr:`generation` read before the query, the result
+            is not cached when the orders were invalidated since.
+        :returns: Whether the result was cached.
+        """
+        expires = None if self.ttl is None else self.clock() + self.ttl
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self.cache.put(key, (expires, since, till, result))
+        return True
+
+    def invalidate_orders(self, created: Iterable[Timestamp]) -> int:
+        """
+        Remove the results depending on the orders created at the timestamps.
+
+        :param created: The timestamps of new orders.
+        :returns: The number of removed results.
+        """
+        timestamps = sorted(created)
+        if not timestamps:
+            return 0
+        with self._lock:
+            self.generation += 1
+            stale = []
+            for key, (_, since, till, _) in self.cache.items():
+                if since is None:
+                    stale.append(key)
+                    continue
+                position = bisect_left(timestamps, since)
+                if position < len(timestamps) and timestamps[position] <= till:
+                    stale.append(key)
+            for key in stale:
+                self.cache.invalidate(key)
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def invalidate_unranged(self) -> int:
+        """
+        Remove the results without a range e.g. the top users, after the users
+        or products they return were changed.
+
+        :returns: The number of removed results.
+        """
+        with self._lock:
+            self.generation += 1
+            stale = [key for key, value in self.cache.items() if value[1] is None]
+            for key in stale:
+                self.cache.invalidate(key)
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def invalidate(self) -> None:
+        """
+        Remove all results e.g. after a bulk load.
+        """
+        with self._lock:
+            self.generation += 1
+            self.invalidations += len(self.cache)
+            self.cache.invalidate()
+
+    def stats(self, method: str | None = None) -> CacheStats:
+        """
+        Return the counters of all lookups or of the lookups of the method.
+        """
+        if method is None:
+            return CacheStats(
+                self.hits, self.misses, len(self.cache), self.cache.maxsize
+            )
+        hits, misses = self._methods.get(method, (0, 0))
+        size = sum(key[0] == method for key, _ in self.cache.items())
+        return CacheStats(hits, misses, size, self.cache.maxsize)
+
+
+class InvalidatingOrderRepository:
+    """
+    The order repository invalidating the cached query results depending on the
+    saved orders. Other methods are delegated.
+
+    The orders saved outside of a unit of work are committed by the repository,
+    so their results are invalidated at once. Wrap the unit of work with
+    :meth:`committing` to invalidate the results of the orders saved in it after
+    it exits, otherwise a result read by another thread before the commit would
+    be cached until its time-to-live expires.
+
+    :param repository: The order repository e.g. :class:`OrderRepository`.
+    :param cache: The cache of query results.
+    """
+
+    def __init__(self, repository: OrderRepository, cache: QueryCache) -> None:
+        self.repository = repository
+        self.cache = cache
+        # The timestamps of orders saved in the unit of work of the thread.
+        self._pending = threading.local()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.repository, name)
+
+    def save(self, *aggregates: Order) -> None:
+        self.repository.save(*aggregates)
+        pending: list[Timestamp] | None = getattr(self._pending, "created", None)
+        if pending is None:
+            self.cache.invalidate_orders(_.created for _ in aggregates)
+        else:
+            pending.extend(_.created for _ in aggregates)
+
+    def find(self, aggregate_id: OrderID) -> Order | None:
+        return self.repository.find(aggregate_id)
+
+    def find_many(self, aggregate_ids: Iterable[OrderID]) -> list[Order]:
+        return self.repository.find_many(aggregate_ids)
+
+    def exists(self, aggregate_id: OrderID) -> bool:
+        return self.repository.exists(aggregate_id)
+
+    def find_existing(self, aggregate_ids: Iterable[OrderID]) -> set[OrderID]:
+        return self.repository.find_existing(aggregate_ids)
+
+    def find_between(
+        self,
+        since: Timestamp,
+        till: Timestamp,
+        after_id: OrderID | None = None,
+        limit: int | None = None,
+    ) -> Iterator[Order]:
+        return self.repository.find_between(since, till, after_id, limit)
+
+    def find_ids_between(self, since: Timestamp, till: Timestamp) -> list[OrderID]:
+        return self.repository.find_ids_between(since, till)
+
+    def count_between(self, since: Timestamp, till: Timestamp) -> int:
+        return self.repository.count_between(since, till)
+
+    def committing(
+        self, unit_of_work: Callable[[], ContextManager[Any]]
+    ) -> Callable[[], ContextManager[Any]]:
+        """
+        Wrap the factory of units of work, so the results depending on the orders
+        saved in a unit of work are invalidated after it exits.
+
+        :param unit_of_work: The factory of units of work e.g.
+            ``partial(transaction, connection)``.
+        :returns: The factory of the wrapped units of work.
+        """
+
+        @contextmanager
+        def committing() -> Iterator[Any]:
+            outer = getattr(self._pending, "created", None)
+            created: list[Timestamp] = []
+            self._pending.created = created
+            try:
+                with unit_of_work() as context:
+                    yield context
+            finally:
+                # The rolled back orders invalidate the results needlessly but safely.
+                self._pending.created = outer
+                if outer is None:
+                    self.cache.invalidate_orders(created)
+                else:
+                    outer.extend(created)
+
+        return committing
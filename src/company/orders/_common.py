@@ -6,22 +6,42 @@ This can be reused between projects in the future.
 # Mypy is not smart enough to figure out that your decorator calls `abc.abstractmethod`
 
 from abc import ABC, abstractmethod
-from typing import TypeVar, Generic, Protocol, TypeAlias, Any, Hashable
+from typing import (
+    TypeVar,
+    Generic,
+    Protocol,
+    TypeAlias,
+    Any,
+    Callable,
+    Hashable,
+    Iterable,
+    Iterator,
+)
+from itertools import islice
 from dataclasses import dataclass
 from datetime import datetime
+from contextlib import nullcontext
+from functools import cache
+from operator import attrgetter
 import inspect
+import logging
 
 __all__ = [
     "Entity",
     "Repository",
     "AbstractRepository",
+    "ConnectionMixin",
+    "ConnectionProvider",
+    "connection_of",
     "Timestamp",
     "DateTimeRange",
     "Name",
     "Identifiable",
     "flatten",
+    "batched",
     "inform",
     "JSONError",
+    "SchemaError",
     "Event",
     "Command",
     "JSON",
@@ -30,13 +50,19 @@ __all__ = [
 JSON: TypeAlias = str
 
 
-def inform(logger, message) -> None:
+def inform(logger, message, *args, **kwargs) -> None:
     """Print the info message when the logger is provided, otherwise skip.
+
+    The message is formatted with the arguments (``%`` style) only when the logger
+    is enabled for the info level, so e.g. entities are not formatted in vain.
+
     :param: The logger instance.
     :param: The message to print.
+    :param: The message arguments.
+    :param: The keyword arguments of the logger e.g. `extra`.
     """
-    if logger is not None:
-        logger.info(message)
+    if logger is not None and logger.isEnabledFor(logging.INFO):
+        logger.info(message, *args, **kwargs)
 
 
 def flatten(xss: list[list[Any]]) -> list[Any]:
@@ -48,6 +74,22 @@ def flatten(xss: list[list[Any]]) -> list[Any]:
     return [x for xs in xss for x in xs]
 
 
+def batched(xs: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    """Split the given items into lists of the given size, the last one may be shorter.
+
+    The :func:`itertools.batched` is available since Python 3.12 and returns tuples.
+
+    :param xs: The items to split.
+    :param size: The maximum size of a batch.
+    :return: the iterator of batches.
+    """
+    if size < 1:
+        raise ValueError("Batch size must be greater then zero")
+    iterator = iter(xs)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
 class JSONError(ValueError):
     """
     The exception raised when parsing JSON from text.
@@ -65,6 +107,13 @@ class JSONError(ValueError):
     """
 
 
+class SchemaError(JSONError):
+    """
+    The exception raised when parsed JSON doesn't have the expected shape,
+    e.g. a key is missing or a value has a wrong type.
+    """
+
+
 @dataclass(frozen=True, slots=True)
 class DateTimeRange:
     """
@@ -127,9 +176,14 @@ class Entity(ABC, Generic[Identifier]):
     """
     An entity object in the terms of Doman-driven design.
 
+    The entities have no instance dictionary, each subclass declares the `__slots__`
+    for its attributes, since there are millions of them loaded at once.
+
     :param identifier:
     """
 
+    __slots__ = ("_identifier",)
+
     def __init__(self, identifier: Identifier):
         self._identifier: Identifier = identifier
 
@@ -144,13 +198,7 @@ class Entity(ABC, Generic[Identifier]):
         return hash((type(self), self.identifier))
 
     def __str__(self) -> str:
-        fields = inspect.getmembers(type(self), lambda a: not (inspect.isroutine(a)))
-        fields_filtered = [
-            f"{f[0]}={getattr(self, str(f[0]))}"
-            for f in fields
-            if (not f[0].startswith("_")) and (not f[0].startswith("__"))
-        ]
-        return f"{type(self).__name__}({','.join(fields_filtered)})"
+        return _formatter(type(self))(self)
 
     __repr__ = __str__  # Maybe prefer not to override this.
 
@@ -159,6 +207,22 @@ class Entity(ABC, Generic[Identifier]):
     # def to_json(self): return NotImplemented
 
 
+@cache
+def _formatter(cls: type) -> Callable[[Any], str]:
+    """
+    Create the function formatting the public fields (properties) of the entity class.
+
+    The fields are found only once per class, they are ordered by name.
+    """
+    fields = inspect.getmembers(cls, lambda a: not (inspect.isroutine(a)))
+    names = [_[0] for _ in fields if not _[0].startswith("_")]
+    template = f"{cls.__name__}({','.join(f'{_}={{}}' for _ in names)})".format
+    values = attrgetter(*names)
+    if len(names) == 1:
+        return lambda entity: template(values(entity))
+    return lambda entity: template(*values(entity))
+
+
 EntityType = TypeVar("EntityType", bound=Entity)
 
 #                                Persistence                                #
@@ -187,6 +251,14 @@ class Repository(Protocol, Generic[EntityType, Identifier]):  # type: ignore
         :returns: The found entity or `None`.
         """
 
+    def find_many(self, aggregate_ids: Iterable[Identifier]) -> list[EntityType]:
+        """
+        Find the entities with the given identifiers at once.
+
+        :param aggregate_ids: The entities to find.
+        :returns: The found entities ordered by identifier, missing ones are skipped.
+        """
+
     # def find_all(
     #     self, aggregate, predicate: Callable[[EntityType], bool]
     # ) -> Iterable[EntityType]:
@@ -201,20 +273,73 @@ class Repository(Protocol, Generic[EntityType, Identifier]):  # type: ignore
         """
 
 
-class AbstractRepository(ABC, Generic[EntityType, Identifier]):
+class ConnectionProvider(ABC):
+    """
+    The provider of database connections, e.g. one connection per thread.
+    """
+
+    @property
+    @abstractmethod
+    def connection(self) -> Any:
+        """The connection for the current caller."""
+
+
+def connection_of(connection) -> Any:
     """
-    The aggregate root entity repository abstract class based on ODBC.
+    Return the connection of the provider or the given connection.
+
+    :param connection: A database connection object or :class:`ConnectionProvider`.
+    """
+    if isinstance(connection, ConnectionProvider):
+        return connection.connection
+    return connection
+
+
+class ConnectionMixin:
+    """
+    The database access of the repositories working in the caller's transaction.
 
     The repository is not responsible for managing connection.
-    The connection pool is recommended. The implementation can
-    be modified e.g add context manager but wee keep it simple
-    now.
+    The connection pool is recommended, the repository given
+    a :class:`ConnectionProvider` uses the connection provided
+    for the calling thread.
 
-    :param connection: A database connection object.
+    :param connection: A database connection object or provider.
     """
 
     def __init__(self, connection) -> None:
-        self.connection = connection
+        self._connections = connection
+
+    @property
+    def connection(self) -> Any:
+        """The database connection used by the repository."""
+        return connection_of(self._connections)
+
+    @property
+    def connections(self) -> Any:
+        """The database connection or provider given to the repository."""
+        return self._connections
+
+    def _transaction(self):
+        """
+        Return a context manager for the repository work.
+
+        The work is committed on exit unless the connection is already in
+        a transaction, which is then owned (and committed) by the caller,
+        e.g. by a unit of work.
+        """
+        if self.connection.in_transaction:
+            return nullcontext(self.connection)
+        return self.connection
+
+
+class AbstractRepository(ConnectionMixin, ABC, Generic[EntityType, Identifier]):
+    """
+    The aggregate root entity repository abstract class based on ODBC,
+    see :class:`ConnectionMixin`.
+
+    :param connection: A database connection object or provider.
+    """
 
     @abstractmethod
     def save(self, aggregate) -> None:
@@ -238,6 +363,15 @@ class AbstractRepository(ABC, Generic[EntityType, Identifier]):
         :returns: The found entity or `None`.
         """
 
+    @abstractmethod
+    def find_many(self, aggregate_ids: Iterable[Identifier]) -> list[EntityType]:
+        """
+        Find the aggregate root entities with the given identifiers at once.
+
+        :param aggregate_ids: The entities to find.
+        :returns: The found entities ordered by identifier, missing ones are skipped.
+        """
+
     @abstractmethod
     def exists(self, aggregate_id: Identifier) -> bool:
         """
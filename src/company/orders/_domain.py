@@ -1,7 +1,7 @@
 """
-This module a domain layer related code. 
+This module a domain layer related code.
 
-“There are only two industries that refer to their customers as ‘users’, 
+“There are only two industries that refer to their customers as ‘users’,
 one is of course IT, the other is the illegal drugs trade…” — Edward Tufte
 """
 
@@ -20,7 +20,7 @@ __all__ = [
 
 
 from dataclasses import dataclass
-from typing import TypeAlias, Iterable, Self, Iterator
+from typing import Protocol, TypeAlias, Iterable, Self, Iterator
 from datetime import datetime
 
 from company.orders._common import Entity, Timestamp, Repository, Event, DomainError
@@ -36,6 +36,8 @@ class User(Entity[UserID]):
     The user aggregate entity.
     """
 
+    __slots__ = ("_city", "_name")
+
     def __init__(self, identifier: int, name: str, city: str) -> None:
         if identifier < 0:
             raise ValueError("An identifier cannot be a negative number.")
@@ -81,11 +83,29 @@ class User(Entity[UserID]):
         return type(self)(identifier=self.identifier, name=self.name, city=city)
 
 
-class UserRepository(Repository[User, UserID]):
+class UserRepository(Repository[User, UserID], Protocol):
     """
     The repository protocol for users.
     """
 
+    def save_missing(self, aggregates: Iterable[User]) -> int:
+        """
+        Save the users which are not stored yet, skip the others.
+
+        :param aggregates: The users to save.
+        :returns: The number of saved users.
+        """
+        return NotImplemented
+
+    def merge(self, aggregates: Iterable[User]) -> int:
+        """
+        Save the new users and update the changed ones, skip the unchanged ones.
+
+        :param aggregates: The users to merge.
+        :returns: The number of saved and updated users.
+        """
+        return NotImplemented
+
 
 # ########################################################################### #
 
@@ -100,6 +120,8 @@ class Product(Entity[ProductID]):
     Never ever use floats!
     """
 
+    __slots__ = ("_name", "_price")
+
     def __init__(
         self,
         identifier: ProductID,
@@ -127,11 +149,29 @@ class Product(Entity[ProductID]):
         return self._price
 
 
-class ProductRepository(Repository[Product, ProductID]):
+class ProductRepository(Repository[Product, ProductID], Protocol):
     """
     The repository protocol for products.
     """
 
+    def save_missing(self, aggregates: Iterable[Product]) -> int:
+        """
+        Save the products which are not stored yet, skip the others.
+
+        :param aggregates: The products to save.
+        :returns: The number of saved products.
+        """
+        return NotImplemented
+
+    def merge(self, aggregates: Iterable[Product]) -> int:
+        """
+        Save the new products and update the changed ones, skip the unchanged ones.
+
+        :param aggregates: The products to merge.
+        :returns: The number of saved and updated products.
+        """
+        return NotImplemented
+
 
 # ########################################################################### #
 
@@ -161,8 +201,13 @@ class Order(Entity[OrderID]):
     .. note: You can probably change products (insert, remove) or
     assign the order to a different user. You cannot change `id` and
     `created` attributes. Can the order have a 0 products?
+
+    The order lines are stored in a tuple without duplicates (in the given order),
+    so the :attr:`order_lines` doesn't allocate a new one on each access.
     """
 
+    __slots__ = ("_created", "_order_lines", "_product_ids", "_user_id")
+
     def __init__(
         self,
         identifier: OrderID,
@@ -177,7 +222,8 @@ class Order(Entity[OrderID]):
         self._created = (
             datetime.timestamp(created) if isinstance(created, datetime) else created
         )
-        self._order_lines = frozenset(order_lines)
+        self._order_lines = tuple(dict.fromkeys(order_lines))
+        self._product_ids: list[ProductID] | None = None
 
     @property
     def user_id(self) -> UserID:
@@ -188,12 +234,15 @@ class Order(Entity[OrderID]):
         return self._created
 
     @property
-    def order_lines(self) -> Iterable[OrderLine]:
-        return tuple(self._order_lines)
+    def order_lines(self) -> tuple[OrderLine, ...]:
+        return self._order_lines
 
     @property
     def _products(self) -> Iterable[ProductID]:
-        return sorted([_.product_id for _ in self.order_lines])
+        # The order lines are immutable, so the products are sorted only once.
+        if self._product_ids is None:
+            self._product_ids = sorted([_.product_id for _ in self._order_lines])
+        return self._product_ids
 
     def has_product(self, product_id: ProductID) -> bool:
         return product_id in self._products
@@ -202,7 +251,7 @@ class Order(Entity[OrderID]):
         return self._products == other._products
 
     @property
-    def total_cost(self) -> int: # Money/Decimal
+    def total_cost(self) -> int:  # Money/Decimal
         return NotImplemented
 
     @classmethod
@@ -228,18 +277,58 @@ class Order(Entity[OrderID]):
             return DomainError(f"{error}")
 
 
-class OrderRepository(Repository[Order, OrderID]):
+class OrderRepository(Repository[Order, OrderID], Protocol):
     """
     The repository protocol for orders.
     """
 
-    def find_between(self, since: Timestamp, till: Timestamp) -> Iterator[Order]:
+    def find_existing(self, aggregate_ids: Iterable[OrderID]) -> set[OrderID]:
+        """
+        Find which of the given orders are already stored.
+
+        :param aggregate_ids: The order identifiers to check.
+        :returns: The subset of identifiers found in the storage.
+        """
+        return NotImplemented
+
+    def find_between(
+        self,
+        since: Timestamp,
+        till: Timestamp,
+        after_id: OrderID | None = None,
+        limit: int | None = None,
+    ) -> Iterator[Order]:
+        """
+        Find orders in a specified range ordered by creation time and identifier.
+
+        :param since: The start of the range (inclusive).
+        :param till:  The end of the range (inclusive).
+        :param after_id: Return only orders after this one (the keyset pagination),
+            none when the order doesn't exist.
+        :param limit: The maximum number of orders to return.
+        :returns: The orders.
+        """
+        return NotImplemented
+
+    def find_ids_between(self, since: Timestamp, till: Timestamp) -> list[OrderID]:
+        """
+        Find identifiers of orders in a specified range, like :meth:`find_between`
+        only the orders with lines.
+
+        :param since: The start of the range (inclusive).
+        :param till:  The end of the range (inclusive).
+        :returns: The order identifiers in ascending order.
+        """
+        return NotImplemented
+
+    def count_between(self, since: Timestamp, till: Timestamp) -> int:
         """
-        Find orders in a specified range.
+        Count orders in a specified range, like :meth:`find_between` only the orders
+        with lines.
 
-        :param since: ...
-        :param till:  ...
-        :returns: ...
+        :param since: The start of the range (inclusive).
+        :param till:  The end of the range (inclusive).
+        :returns: The number of orders.
         """
         return NotImplemented
 
@@ -0,0 +1,339 @@
+"""
+This module contains the long-running HTTP/JSON interface of the service
+built on the standard library :mod:`http.server`.
+
+The endpoints::
+
+    POST /orders                              the JSON-line records to import
+    GET  /orders?since=...&till=...           the orders as JSON lines (streamed)
+         [&after_id=...][&limit=...]
+    GET  /users/top?limit=...                 the users with most products as JSON
+    GET  /metrics                             the latency histograms of endpoints as JSON
+"""
+
+__all__ = ["OrderServer", "OrderRequestHandler"]
+
+import datetime
+import io
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from itertools import islice
+from socketserver import ThreadingMixIn
+from typing import Any, Iterable, Iterator
+from urllib.parse import parse_qs, urlsplit
+
+from company.orders._cache import QueryCache
+from company.orders._common import DomainError, JSONError
+from company.orders._domain import Order, User
+from company.orders._profiling import Profiler
+from company.orders._storage import ConflictError
+
+STREAM_BATCH = 100
+"""The number of orders written in one chunk of the streamed response."""
+
+
+class OrderServer(ThreadingMixIn, HTTPServer):
+    """
+    The HTTP server handling the connections by a bounded pool of threads.
+
+    The connections are kept alive between requests (HTTP/1.1), each open
+    connection occupies one thread until it is closed by the client or it is
+    idle for `idle_timeout` seconds, so the number of threads bounds the number
+    of connections served at once. When other connections wait for a thread,
+    the kept-alive connection is closed after the response (`Connection: close`),
+    so the busy clients don't starve the waiting ones. The threads use their own
+    connections of the :class:`ConnectionPool` of the service.
+
+    :param address: The `(host, port)` to listen on, the port 0 picks a free one.
+    :param service: The order service, its repositories should use a :class:`ConnectionPool`.
+    :param connections: The connection provider of the top users search.
+    :param workers: The number of threads handling the connections.
+    :param idle_timeout: The seconds an idle kept-alive connection is kept open.
+    :param max_body: The maximal size of an imported request body in bytes.
+    :param query_cache: The query cache of the service whose stats are reported.
+    :param logger: The logger of requests, no logging by default.
+    """
+
+    allow_reuse_address = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        service: Any,
+        connections: Any,
+        workers: int = 8,
+        idle_timeout: float = 5.0,
+        max_body: int = 64 * 1024 * 1024,
+        query_cache: QueryCache | None = None,
+        logger=None,
+    ) -> None:
+        super().__init__(address, OrderRequestHandler)
+        self.service = service
+        self.connections = connections
+        self.idle_timeout = idle_timeout
+        self.max_body = max_body
+        self.query_cache = query_cache
+        self.logger = logger
+        self.profiler = Profiler()
+        self.executor = ThreadPoolExecutor(
+            workers, thread_name_prefix="company-orders-http"
+        )
+        self.waiting = 0
+        """The number of accepted connections waiting for a thread."""
+        self._lock = threading.Lock()
+
+    def process_request(self, request, client_address) -> None:
+        with self._lock:
+            self.waiting += 1
+        self.executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address) -> None:
+        with self._lock:
+            self.waiting -= 1
+        # It handles the errors and shuts the request down.
+        self.process_request_thread(request, client_address)
+
+    def record(self, endpoint: str, seconds: float) -> None:
+        """
+        Record the latency of the request, the recording is shared by the threads.
+        """
+        with self._lock:
+            self.profiler.record(endpoint, seconds)
+
+    def metrics(self) -> dict[str, Any]:
+        with self._lock:
+            metrics: dict[str, Any] = {"latencies": self.profiler.report()}
+        if self.query_cache is not None:
+            stats = self.query_cache.stats()
+            metrics["query_cache"] = {
+                "hits": stats.hits,
+                "misses": stats.misses,
+                "size": stats.size,
+                "hit_rate": stats.hit_rate,
+            }
+        return metrics
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class _HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class OrderRequestHandler(BaseHTTPRequestHandler):
+    """
+    The handler of the requests of one connection.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # The headers and the body are written separately, without it the small responses
+    # of kept-alive connections wait for the delayed acknowledgement of the client.
+    disable_nagle_algorithm = True
+    server: OrderServer
+
+    def setup(self) -> None:
+        super().setup()
+        # The idle kept-alive connection releases its thread after the timeout.
+        self.connection.settimeout(self.server.idle_timeout)
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        routes = {
+            "/orders": self._search_orders,
+            "/users/top": self._top_users,
+            "/metrics": self._metrics,
+        }
+        self._handle(f"GET {url.path}", routes.get(url.path), parse_qs(url.query))
+
+    def do_POST(self) -> None:
+        url = urlsplit(self.path)
+        routes = {"/orders": self._import_orders}
+        self._handle(f"POST {url.path}", routes.get(url.path), parse_qs(url.query))
+
+    def _handle(self, endpoint: str, route, query: dict[str, list[str]]) -> None:
+        start = time.perf_counter()
+        self._streaming = False
+        try:
+            if route is None:
+                raise _HTTPError(HTTPStatus.NOT_FOUND, f"Unknown resource {self.path}")
+            route(query)
+        except _HTTPError as error:
+            self._send_error(error.status, str(error))
+        except (JSONError, DomainError, ValueError, KeyError) as error:
+            self._send_error(HTTPStatus.BAD_REQUEST, str(error))
+        except ConflictError as error:
+            self._send_error(HTTPStatus.CONFLICT, str(error))
+        except sqlite3.OperationalError as error:
+            self._send_error(HTTPStatus.SERVICE_UNAVAILABLE, str(error))
+        finally:
+            # The unknown resources are recorded together.
+            endpoint = endpoint if route is not None else "unknown"
+            self.server.record(endpoint, time.perf_counter() - start)
+
+    # ############################# Endpoints ############################# #
+
+    def _search_orders(self, query: dict[str, list[str]]) -> None:
+        since = _parameter(query, "since", datetime.datetime.fromisoformat)
+        till = _parameter(query, "till", datetime.datetime.fromisoformat)
+        after_id = _parameter(query, "after_id", int, None)
+        limit = _parameter(query, "limit", _positive, None)
+        service = self.server.service
+        orders = service.search_orders_by_date(
+            since, till, after_id=after_id, limit=limit
+        )
+        self._send_stream(_order_lines(orders))
+
+    def _top_users(self, query: dict[str, list[str]]) -> None:
+        limit = _parameter(query, "limit", _positive, 3)
+        service = self.server.service
+        users = service.search_users_with_most_products(
+            self.server.connections, limit=limit
+        )
+        self._send_json([_user_to_dict(_) for _ in users])
+
+    def _metrics(self, query: dict[str, list[str]]) -> None:
+        self._send_json(self.server.metrics())
+
+    def _import_orders(self, query: dict[str, list[str]]) -> None:
+        # The body is not read when its length is not valid (e.g. a chunked body).
+        value = self.headers.get("Content-Length")
+        if value is None:
+            self.close_connection = True
+            message = "The body length is required"
+            raise _HTTPError(HTTPStatus.LENGTH_REQUIRED, message)
+        length = int(value) if value.strip().isdecimal() else -1
+        if length < 0:
+            self.close_connection = True
+            message = f"The body length '{value}' is invalid"
+            raise _HTTPError(HTTPStatus.BAD_REQUEST, message)
+        if length > self.server.max_body:
+            self.close_connection = True
+            message = f"The body exceeds {self.server.max_body} bytes"
+            raise _HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, message)
+        body = io.StringIO(self.rfile.read(length).decode("utf8"))
+        chunk_size = _parameter(query, "chunk_size", _positive, 10_000)
+        reports = self.server.service.bulk_insert_orders(body, chunk_size=chunk_size)
+        imported = {
+            "orders": sum(_.orders for _ in reports),
+            "order_lines": sum(_.order_lines for _ in reports),
+            "users": sum(_.users for _ in reports),
+            "products": sum(_.products for _ in reports),
+            "chunks": len(reports),
+        }
+        self._send_json(imported, HTTPStatus.CREATED)
+
+    # ############################# Responses ############################# #
+
+    def _send_json(self, value: Any, status: HTTPStatus = HTTPStatus.OK) -> None:
+        body = json.dumps(value).encode("utf8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self._end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: HTTPStatus, message: str) -> None:
+        if self._streaming:
+            # The streamed response can't be replaced, the client sees it incomplete.
+            self.close_connection = True
+            return
+        self._send_json({"error": status.phrase, "message": message}, status)
+
+    def _send_stream(self, chunks: Iterator[str]) -> None:
+        """
+        Send the chunks by the chunked transfer encoding as they are produced.
+        """
+        # The first chunk is produced before the headers, so the early errors have their status.
+        first = next(chunks, "")
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self._end_headers()
+        self._streaming = True
+        for chunk in _prepend(first, chunks):
+            if chunk:
+                data = chunk.encode("utf8")
+                self.wfile.write(b"%x\r\n%b\r\n" % (len(data), data))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _end_headers(self) -> None:
+        if self.server.waiting or self.close_connection:
+            # Release the thread for the waiting connections or skip the unread body.
+            self.send_header("Connection", "close")
+        self.end_headers()
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.logger is not None:
+            self.server.logger.debug("%s " + format, self.address_string(), *args)
+
+
+def _parameter(
+    query: dict[str, list[str]], name: str, parse, default: Any = ...
+) -> Any:
+    """
+    Return the parsed query parameter.
+
+    :raises:
+        :class:`_HTTPError`: when the required parameter is missing or invalid.
+    """
+    values = query.get(name)
+    if not values:
+        if default is ...:
+            raise _HTTPError(
+                HTTPStatus.BAD_REQUEST, f"The parameter '{name}' is required"
+            )
+        return default
+    try:
+        return parse(values[0])
+    except ValueError as error:
+        message = f"The parameter '{name}' is invalid: {error}"
+        raise _HTTPError(HTTPStatus.BAD_REQUEST, message) from error
+
+
+def _positive(value: str) -> int:
+    """
+    Parse the positive integer e.g. a limit, SQLite doesn't limit the negative ones.
+    """
+    number = int(value)
+    if number < 1:
+        raise ValueError(f"{number} is not positive")
+    return number
+
+
+def _prepend(first: str, chunks: Iterator[str]) -> Iterator[str]:
+    yield first
+    yield from chunks
+
+
+def _order_lines(orders: Iterable[Order]) -> Iterator[str]:
+    """
+    Serialize the orders as JSON lines in batches of :data:`STREAM_BATCH`.
+    """
+    orders = iter(orders)
+    while batch := list(islice(orders, STREAM_BATCH)):
+        yield "".join(json.dumps(_order_to_dict(_)) + "\n" for _ in batch)
+
+
+def _order_to_dict(order: Order) -> dict[str, Any]:
+    return {
+        "id": order.identifier,
+        "created": order.created,
+        "user_id": order.user_id,
+        "order_lines": [
+            {"product_id": _.product_id, "quantity": _.quantity}
+            for _ in order.order_lines
+        ],
+    }
+
+
+def _user_to_dict(user: User) -> dict[str, Any]:
+    return {"id": user.identifier, "name": user.name, "city": user.city}
@@ -0,0 +1,147 @@
+"""
+This module contains the in-process sorted index of orders' creation times,
+which answers the date range lookups of identifiers and counts by binary search
+without querying the storage.
+"""
+
+__all__ = ["TimestampIndex", "IndexedOrderRepository"]
+
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Iterable
+import threading
+
+from company.orders._common import Timestamp
+from company.orders._domain import Order, OrderID
+
+MERGE_THRESHOLD = 64
+"""The number of added orders merged at once instead of inserted one by one."""
+
+
+class TimestampIndex:
+    """
+    The sorted `(created, order_id)` pairs stored in two parallel arrays.
+
+    The orders are added mostly in the order of creation, so they are appended
+    to the end, the older ones are inserted or merged. The arrays are changed
+    and searched under the lock, so the readers never see them misaligned.
+
+    :param pairs: The `(created, order_id)` pairs in any order.
+    """
+
+    def __init__(self, pairs: Iterable[tuple[Timestamp, OrderID]] = ()) -> None:
+        self.created = array("d")
+        self.order_ids = array("q")
+        self._lock = threading.Lock()
+        self.add(pairs)
+
+    @classmethod
+    def from_connection(cls, connection) -> "TimestampIndex":
+        """
+        Load the index of the stored orders with lines, which the range searches find.
+
+        :param connection: A database connection object.
+        """
+        # The covering index returns the pairs sorted, so they are appended.
+        statement = """
+            select created, id from orders
+            where exists (select 1 from order_lines where order_id = orders.id)
+            order by created, id"""
+        return cls(connection.execute(statement))
+
+    def __len__(self) -> int:
+        return len(self.order_ids)
+
+    def add(self, pairs: Iterable[tuple[Timestamp, OrderID]]) -> None:
+        """
+        Add the orders keeping the index sorted.
+
+        :param pairs: The `(created, order_id)` pairs in any order.
+        """
+        pairs = sorted(pairs)
+        if not pairs:
+            return
+        with self._lock:
+            self._add(pairs)
+
+    def _add(self, pairs: list[tuple[Timestamp, OrderID]]) -> None:
+        if not self.created or pairs[0][0] >= self.created[-1]:
+            self.created.extend(_[0] for _ in pairs)
+            self.order_ids.extend(_[1] for _ in pairs)
+        elif len(pairs) < MERGE_THRESHOLD:
+            for created, order_id in pairs:
+                position = bisect_right(self.created, created)
+                self.created.insert(position, created)
+                self.order_ids.insert(position, order_id)
+        else:
+            merged = sorted([*zip(self.created, self.order_ids), *pairs])
+            self.created = array("d", (_[0] for _ in merged))
+            self.order_ids = array("q", (_[1] for _ in merged))
+
+    def find_between(self, since: Timestamp, till: Timestamp) -> list[OrderID]:
+        """
+        Find identifiers of orders in a specified range.
+
+        :param since: The start of the range (inclusive).
+        :param till:  The end of the range (inclusive).
+        :returns: The order identifiers in ascending order.
+        """
+        with self._lock:
+            first, last = self._positions(since, till)
+            found = self.order_ids[first:last]
+        return sorted(found)
+
+    def count_between(self, since: Timestamp, till: Timestamp) -> int:
+        """
+        Count orders in a specified range.
+
+        :param since: The start of the range (inclusive).
+        :param till:  The end of the range (inclusive).
+        """
+        with self._lock:
+            first, last = self._positions(since, till)
+        return last - first
+
+    def _positions(self, since: Timestamp, till: Timestamp) -> tuple[int, int]:
+        first = bisect_left(self.created, since)
+        return first, max(first, bisect_right(self.created, till))
+
+
+class IndexedOrderRepository:
+    """
+    The order repository answering the date range lookups of identifiers and
+    counts from the :class:`TimestampIndex`, which is updated by :meth:`save`.
+    Other methods are delegated.
+
+    The index doesn't know about transactions; when a unit of work is rolled back,
+    call :meth:`reload` to load the index from the storage again.
+
+    :param repository: The indexed repository e.g. :class:`OrderRepository`.
+    :param index: The index of stored orders e.g. :meth:`TimestampIndex.from_connection`.
+    """
+
+    def __init__(self, repository: Any, index: TimestampIndex) -> None:
+        self.repository = repository
+        self.index = index
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.repository, name)
+
+    def save(self, *aggregates: Order) -> None:
+        self.repository.save(*aggregates)
+        # The orders without lines are not found by the range searches.
+        self.index.add((_.created, _.identifier) for _ in aggregates if _.order_lines)
+
+    def find_ids_between(self, since: Timestamp, till: Timestamp) -> list[OrderID]:
+        return self.index.find_between(since, till)
+
+    def count_between(self, since: Timestamp, till: Timestamp) -> int:
+        return self.index.count_between(since, till)
+
+    def reload(self, connection) -> None:
+        """
+        Replace the index with the one loaded from the storage.
+
+        :param connection: A database connection object.
+        """
+        self.index = TimestampIndex.from_connection(connection)
@@ -0,0 +1,367 @@
+"""
+This module contains the import (ingest) pipeline related code such as
+conversion of parsed records to compact rows and parallel parsing of
+JSON-line files in worker processes.
+"""
+
+__all__ = [
+    "OrderRow",
+    "UserRow",
+    "ProductRow",
+    "to_row",
+    "create_entities",
+    "Checkpoint",
+    "fingerprint",
+    "read_lines",
+    "ChangeTracker",
+    "MappedFile",
+    "split_ranges",
+    "parse_range",
+    "parse_parallel",
+]
+
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Generic, Iterable, Iterator, TypeAlias, TypeVar, Self
+import hashlib
+import mmap
+import os
+
+from company.orders._common import (
+    DomainError,
+    Entity,
+    JSONError,
+    SchemaError,
+    Timestamp,
+)
+from company.orders._domain import Order, OrderLine, Product, User
+from company.orders._records import OrderRecord, record_decoder
+
+E = TypeVar("E", bound=Entity)
+
+UserRow: TypeAlias = tuple[int, str, str]
+"""The user's `(id, name, city)`."""
+
+ProductRow: TypeAlias = tuple[int, str, int]
+"""The product's `(id, name, price)`."""
+
+OrderRow: TypeAlias = tuple[int, Timestamp, UserRow, tuple[ProductRow, ...]]
+"""The order's `(id, created, user, products)`, products may repeat."""
+
+RANGE_SIZE = 4 * 1024 * 1024
+"""The default size of a file range parsed by one worker task in bytes."""
+
+FINGERPRINT_SIZE = 4096
+"""The number of leading bytes identifying the file of an incremental import."""
+
+
+def to_row(record: OrderRecord) -> OrderRow:
+    """
+    Convert the validated record to the compact row.
+
+    :param record: The validated record, see :func:`record_decoder`.
+    """
+    user = record["user"]
+    return (
+        record["id"],
+        record["created"],
+        (user["id"], user["name"], user["city"]),
+        tuple((_["id"], _["name"], _["price"]) for _ in record["products"]),
+    )
+
+
+def create_entities(row: OrderRow) -> tuple[User, list[Product], Order]:
+    """
+    Create the domain entities from the row.
+
+    :param row: The order row.
+    :returns: The user, the products (in the order of the record) and the order.
+    :raises :class:`DomainError`: when the order can't be created.
+    """
+    identifier, created, user_row, product_rows = row
+    user = User(*user_row)
+    products = [Product(*_) for _ in product_rows]
+    order_lines = [
+        OrderLine(product_id=product.identifier, quantity=quantity)
+        for product, quantity in Counter(products).items()
+    ]
+    result: Order | DomainError = Order.create(
+        identifier=identifier,
+        created=created,
+        user_id=user.identifier,
+        order_lines=order_lines,
+    )
+    if isinstance(result, DomainError):
+        raise result
+    return user, products, result
+
+
+# ########################################################################### #
+
+
+@dataclass(frozen=True, slots=True)
+class Checkpoint:
+    """
+    The value object describes the durable position of an incremental import.
+
+    The file is identified by its path and by the fingerprint of its leading bytes
+    and of the bytes before the offset, so the appended file is resumed at the offset,
+    while the replaced (e.g. rotated or rewritten) file is detected and imported
+    from the beginning.
+    """
+
+    source: str
+    """The resolved path of the file."""
+    fingerprint: str
+    """The fingerprint of the imported part of the file, see :func:`fingerprint`."""
+    offset: int
+    """The byte offset after the last imported line."""
+    last_order_id: int | None = None
+    """The identifier of the last imported order."""
+
+
+def fingerprint(path: Path, offset: int) -> str:
+    """
+    Return the fingerprint of the file imported up to the offset: the hash of its
+    first and of its last :data:`FINGERPRINT_SIZE` bytes before the offset.
+
+    The last bytes end with the last imported line, so the file changed before
+    the offset (e.g. with a longer record) doesn't resume in the middle of a line.
+
+    :param path: The JSON-line file.
+    :param offset: The offset of the imported part of the file.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        digest.update(file.read(min(offset, FINGERPRINT_SIZE)))
+        if offset > FINGERPRINT_SIZE:
+            file.seek(max(FINGERPRINT_SIZE, offset - FINGERPRINT_SIZE))
+            digest.update(file.read(offset - file.tell()))
+    return digest.hexdigest()
+
+
+def read_lines(path: Path, offset: int = 0) -> Iterator[tuple[bytes, int]]:
+    """
+    Iterate over the lines of the file from the offset.
+
+    :param path: The JSON-line file.
+    :param offset: The offset of the first line.
+    :returns: The lines (with newlines) and the offsets after them. Only the last
+        line may be without the newline, e.g. when it is still being appended.
+    """
+    with open(path, "rb") as file:
+        file.seek(offset)
+        for line in file:
+            offset += len(line)
+            yield line, offset
+
+
+class ChangeTracker(Generic[E]):
+    """
+    The in-memory hashes of the last seen attributes of the entities of one import,
+    so the merge writes only the new and the changed users or products.
+
+    The attributes of the entities unknown to the tracker are read from the storage
+    once, so the stored unchanged entity costs one read (in a batch), never a write.
+
+    :param attributes: The function returning the compared attributes of an entity.
+    """
+
+    def __init__(self, attributes: Callable[[E], tuple]) -> None:
+        self._attributes = attributes
+        self._hashes: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def changes(
+        self, entities: Iterable[E], find_many: Callable[[list[int]], list[E]]
+    ) -> tuple[list[E], list[E]]:
+        """
+        Split the entities into the new and the changed ones, skip the unchanged ones.
+
+        The entities are remembered as seen, so they must be written.
+
+        :param entities: The entities with distinct identifiers.
+        :param find_many: The repository's method finding the stored entities.
+        :returns: The new entities and the changed entities.
+        """
+        entities = list(entities)
+        hashes, attributes = self._hashes, self._attributes
+        unknown = [_.identifier for _ in entities if _.identifier not in hashes]
+        if unknown:
+            for stored in find_many(unknown):
+                hashes[stored.identifier] = hash(attributes(stored))
+        new: list[E] = []
+        changed: list[E] = []
+        for entity in entities:
+            seen = hashes.get(entity.identifier)
+            digest = hash(attributes(entity))
+            if seen is None:
+                new.append(entity)
+            elif seen != digest:
+                changed.append(entity)
+            hashes[entity.identifier] = digest
+        return new, changed
+
+
+class MappedFile:
+    """
+    The read-only memory-mapped JSON-line file.
+
+    The lines are found by scanning the raw bytes for newlines and returned as
+    `bytes` slices, they are never decoded to `str` (the JSON decoder accepts bytes).
+
+    :param path: The JSON-line file.
+    """
+
+    def __init__(self, path: Path) -> None:
+        # The map keeps its own descriptor of the file. An empty file can't be mapped.
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            self._map = (
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+            )
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+    def __len__(self) -> int:
+        return len(self._map)
+
+    def lines(self, start: int = 0, end: int | None = None) -> Iterator[bytes]:
+        """
+        Iterate over the lines (without newlines) of the byte range.
+
+        :param start: The offset of the first line.
+        :param end: The offset after the last line, the end of file by default.
+        """
+        data, find = self._map, self._map.find
+        end = len(data) if end is None else end
+        position = start
+        while position < end:
+            newline = find(b"\n", position, end)
+            stop = end if newline < 0 else newline
+            yield data[position:stop]
+            position = stop + 1
+
+
+def split_ranges(path: Path, size: int = RANGE_SIZE) -> Iterator[tuple[int, int]]:
+    """
+    Split the file into byte ranges of approximately the given size,
+    each range ends just after a newline (or at the end of file).
+
+    :param path: The JSON-line file.
+    :param size: The approximate size of a range in bytes.
+    :returns: The `(start, end)` offsets of the ranges.
+    """
+    end_of_file = os.path.getsize(path)
+    with open(path, "rb") as file:
+        start = 0
+        while start < end_of_file:
+            file.seek(min(start + size, end_of_file) - 1)
+            file.readline()  # Move behind the next newline.
+            end = min(file.tell(), end_of_file)
+            yield start, end
+            start = end
+
+
+@dataclass(frozen=True, slots=True)
+class RangeResult:
+    """
+    The rows parsed from one file range.
+
+    When a line can't be parsed, the rows contain the lines before it and the
+    error is stored, so the writer can raise it at the same place (and with the
+    same line index) as the sequential import would. The line is stored for
+    invalid JSON only.
+    """
+
+    rows: list[OrderRow]
+    error: Exception | None = None
+    line: bytes | None = None
+
+
+def parse_range(
+    path: Path, start: int, end: int, backend: str | None = None
+) -> RangeResult:
+    """
+    Parse and validate the lines of the file range into rows.
+
+    This is a worker process task.
+
+    :param path: The JSON-line file.
+    :param start: The offset of the first line.
+    :param end: The offset after the last line.
+    :param backend: The JSON decoder backend, see :func:`record_decoder`.
+    """
+    decode = record_decoder(backend)
+    rows: list[OrderRow] = []
+    with MappedFile(path) as file:
+        for line in file.lines(start, end):
+            try:
+                record = decode(line)
+            except SchemaError as error:
+                return RangeResult(rows, error)
+            except ValueError as error:
+                return RangeResult(rows, error, line)
+            try:
+                row = to_row(record)
+                # Validate the row, the writer creates its own entities.
+                create_entities(row)
+            except (DomainError, ValueError) as error:
+                # The entities raise the value errors of invalid attributes.
+                return RangeResult(rows, error)
+            rows.append(row)
+    return RangeResult(rows)
+
+
+def parse_parallel(
+    path: Path, workers: int, range_size: int | None = None, backend: str | None = None
+) -> Iterator[OrderRow]:
+    """
+    Parse the JSON-line file in the pool of worker processes.
+
+    The file is split into ranges aligned to newlines and the rows are yielded
+    in the order of the file. Only about two ranges per worker are in flight,
+    so the memory doesn't grow with the file size.
+
+    :param path: The JSON-line file.
+    :param workers: The number of worker processes.
+    :param range_size: The size of a range parsed by one task in bytes.
+    :param backend: The JSON decoder backend, see :func:`record_decoder`.
+    :raises:
+        :class:`JSONError`: when data can't be parsed as JSON.
+        :class:`SchemaError`: when a record doesn't have the expected shape.
+        :class:`DomainError`: when entity can't be created from data.
+    """
+    ranges = split_ranges(path, range_size or RANGE_SIZE)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: deque[Future[RangeResult]] = deque()
+        index = 0  # The index of the line after the yielded rows.
+        while True:
+            while len(pending) < 2 * workers and (bounds := next(ranges, None)):
+                pending.append(executor.submit(parse_range, path, *bounds, backend))
+            if not pending:
+                break
+            result = pending.popleft().result()
+            yield from result.rows
+            index += len(result.rows)
+            if result.error is not None:
+                for future in pending:
+                    future.cancel()
+                if isinstance(result.error, SchemaError):
+                    raise SchemaError(f"{index}: {result.error}") from result.error
+                if result.line is not None:
+                    line = result.line.decode("utf8", errors="replace")
+                    raise JSONError(f"{index}: {line}") from result.error
+                raise result.error
@@ -0,0 +1,148 @@
+"""
+This module contains the instrumentation of imports: the counters of records
+and written rows, the timings of the import phases and the periodic progress
+reports. Nothing is formatted unless the logger emits the report.
+"""
+
+__all__ = ["IngestMetrics", "PHASES"]
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, TypeVar
+
+from company.orders._common import inform
+
+T = TypeVar("T")
+
+PHASES = ("parse", "validate", "write", "commit")
+"""The import phases: decoding of records, creation of entities, repository calls
+and commits of the units of work."""
+
+
+class IngestMetrics:
+    """
+    The counters and phase timings of one import.
+
+    The counters are plain attributes updated by the import, the timings are
+    the seconds spent in each of :data:`PHASES`. The `skipped` counts the users
+    and products of records (and the orders of incremental imports) which were
+    not saved because they were already stored, the `changed` counts the users and
+    products updated by the merge.
+
+    :param logger: The logger of progress reports, no reports by default.
+    :param progress_interval: The minimal number of seconds between progress reports.
+    """
+
+    def __init__(self, logger=None, progress_interval: float = 5.0) -> None:
+        self.records = 0
+        self.users = 0
+        self.products = 0
+        self.orders = 0
+        self.order_lines = 0
+        self.skipped = 0
+        self.changed = 0
+        self.timings: dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.logger = logger
+        self.progress_interval = progress_interval
+        self.started = time.perf_counter()
+        self._reported = self.started
+
+    @property
+    def rows(self) -> int:
+        """The number of written rows."""
+        return (
+            self.orders + self.order_lines + self.users + self.products + self.changed
+        )
+
+    @property
+    def seconds(self) -> float:
+        """The seconds since the import started."""
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self) -> float:
+        seconds = self.seconds
+        return self.rows / seconds if seconds > 0 else float("inf")
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Measure the time spent in the block as the phase.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def timed(self, items: Iterable[T], name: str) -> Iterator[T]:
+        """
+        Iterate over the items measuring the time spent in producing them as the phase.
+        """
+        iterator = iter(items)
+        timings = self.timings
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                timings[name] += time.perf_counter() - start
+            yield item
+
+    def as_dict(self) -> dict[str, Any]:
+        """
+        Return the structured metrics e.g. for the `extra` of log records.
+        """
+        return {
+            "records": self.records,
+            "users": self.users,
+            "products": self.products,
+            "orders": self.orders,
+            "order_lines": self.order_lines,
+            "skipped": self.skipped,
+            "changed": self.changed,
+            "seconds": self.seconds,
+            "rows_per_second": self.rows_per_second,
+            "timings": dict(self.timings),
+        }
+
+    def progress(self, final: bool = False) -> None:
+        """
+        Log the progress report when the interval elapsed since the last one.
+
+        The final report is always logged and includes the phase timings.
+        The metrics are passed as `extra={"ingest": ...}` to the log record.
+
+        :param final: Log the final report of the import.
+        """
+        if self.logger is None:
+            return
+        now = time.perf_counter()
+        if not final and now - self._reported < self.progress_interval:
+            return
+        self._reported = now
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        metrics = self.as_dict()
+        inform(
+            self.logger,
+            "Imported %d records: %d orders, %d users, %d products, %d skipped, %d changed (%.0f rows/s)",
+            self.records,
+            self.orders,
+            self.users,
+            self.products,
+            self.skipped,
+            self.changed,
+            metrics["rows_per_second"],
+            extra={"ingest": metrics},
+        )
+        if final:
+            inform(
+                self.logger,
+                "Import phases: " + ", ".join(f"{_} %.2f s" for _ in PHASES),
+                *(self.timings[_] for _ in PHASES),
+                extra={"ingest": metrics},
+            )
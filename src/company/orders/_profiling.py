@@ -0,0 +1,224 @@
+"""
+This module contains the opt-in profiling of the service and repositories:
+latency histograms of method calls (spans) and of the SQL statements executed
+by a connection, exported as a summary table or a JSON report.
+"""
+
+__all__ = ["LatencyHistogram", "Profiler"]
+
+import inspect
+import re
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Iterator
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class LatencyHistogram:
+    """
+    The histogram of latencies with logarithmic buckets, the bucket `n`
+    counts the latencies below `2**n` microseconds.
+    """
+
+    def __init__(self) -> None:
+        self.buckets: list[int] = []
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        bucket = int(seconds * 1e6).bit_length()
+        if bucket >= len(self.buckets):
+            self.buckets.extend([0] * (bucket + 1 - len(self.buckets)))
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """
+        Return the upper bound of the bucket containing the percentile in seconds.
+        """
+        rank = percent / 100 * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(2**bucket / 1e6, self.max)
+        return self.max
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.mean,
+            "min": self.min if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+            "buckets": list(self.buckets),
+        }
+
+
+class Profiler:
+    """
+    The collector of named latency histograms.
+
+    The spans are recorded by :meth:`span`, by the method calls of objects wrapped
+    by :meth:`wrap` and by the statements of connections traced by :meth:`trace`.
+
+    The sqlite3 trace callback only reports the start of a statement, so its
+    latency is measured until the next statement starts or the enclosing span ends;
+    it is an upper bound including the processing of the results in Python.
+    """
+
+    def __init__(self) -> None:
+        self.histograms: dict[str, LatencyHistogram] = {}
+        self._statement: tuple[str, float] | None = None
+
+    def record(self, name: str, seconds: float) -> None:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.add(seconds)
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """
+        Record the latency of the block.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._end_span(name, time.perf_counter() - start)
+
+    def wrap(self, target: Any, name: str | None = None) -> Any:
+        """
+        Return the proxy recording the latency of each public method call,
+        the generators are measured until they are exhausted or closed.
+
+        :param target: The profiled object e.g. a repository or service.
+        :param name: The prefix of the spans, the class name by default.
+        """
+        return _Profiled(target, self, name or type(target).__name__)
+
+    def trace(self, connection) -> None:
+        """
+        Record the latencies of the statements executed by the connection,
+        the literals are replaced by `?` to group the same statements.
+        """
+        connection.set_trace_callback(self._trace)
+
+    def _end_span(self, name: str, seconds: float) -> None:
+        """
+        Record the span, the statement executed in it ends with it.
+        """
+        self._finish_statement()
+        self.record(name, seconds)
+
+    def _trace(self, statement: str) -> None:
+        now = time.perf_counter()
+        self._finish_statement(now)
+        normalized = _WHITESPACE.sub(" ", _LITERALS.sub("?", statement)).strip()
+        self._statement = (f"sql: {normalized}", now)
+
+    def _finish_statement(self, now: float | None = None) -> None:
+        if self._statement is not None:
+            name, start = self._statement
+            self._statement = None
+            self.record(name, (time.perf_counter() if now is None else now) - start)
+
+    def report(self) -> dict[str, dict[str, Any]]:
+        """
+        Return the JSON serializable histograms by the span name.
+        """
+        self._finish_statement()
+        return {name: _.as_dict() for name, _ in sorted(self.histograms.items())}
+
+    def summary(self, width: int = 60) -> str:
+        """
+        Return the table of spans ordered by the total time in descending order.
+
+        :param width: The maximum width of the name column.
+        """
+        self._finish_statement()
+        header = (
+            f"{'span':<{width}} {'count':>8} {'total [ms]':>11} {'mean [us]':>10} "
+            f"{'p50 [us]':>9} {'p95 [us]':>9} {'max [us]':>9}"
+        )
+        lines = [header]
+        ordered = sorted(self.histograms.items(), key=lambda _: -_[1].total)
+        for name, histogram in ordered:
+            name = name if len(name) <= width else name[: width - 3] + "..."
+            lines.append(
+                f"{name:<{width}} {histogram.count:>8} {histogram.total * 1e3:>11.2f} "
+                f"{histogram.mean * 1e6:>10.1f} {histogram.percentile(50) * 1e6:>9.0f} "
+                f"{histogram.percentile(95) * 1e6:>9.0f} {histogram.max * 1e6:>9.0f}"
+            )
+        return "\n".join(lines)
+
+
+class _Profiled:
+    """
+    The proxy recording the latencies of the target's public methods.
+    """
+
+    def __init__(self, target: Any, profiler: Profiler, name: str) -> None:
+        self._target = target
+        self._profiler = profiler
+        self._name = name
+
+    def __getattr__(self, attribute: str) -> Any:
+        value = getattr(self._target, attribute)
+        if attribute.startswith("_") or not callable(value):
+            return value
+        span = f"{self._name}.{attribute}"
+        profiler = self._profiler
+
+        @wraps(value)
+        def profiled(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = value(*args, **kwargs)
+            except BaseException:
+                profiler._end_span(span, time.perf_counter() - start)
+                raise
+            if inspect.isgenerator(result):
+                return _profiled_generator(
+                    result, profiler, span, time.perf_counter() - start
+                )
+            profiler._end_span(span, time.perf_counter() - start)
+            return result
+
+        setattr(self, attribute, profiled)  # Wrapped only once.
+        return profiled
+
+
+def _profiled_generator(generator, profiler: Profiler, span: str, elapsed: float):
+    """
+    Record the time spent in the generator (not in the consumer) as one span.
+    """
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(generator)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                elapsed += time.perf_counter() - start
+            yield item
+    finally:
+        generator.close()
+        profiler._end_span(span, elapsed)
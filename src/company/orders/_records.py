@@ -0,0 +1,163 @@
+"""
+This module contains the typed records of the JSON-line data and the record
+decoders, which parse a line and validate the record's shape at once.
+
+The decoder uses the fastest installed JSON backend: `msgspec` (decodes and
+validates the typed record in one step), `orjson` or the standard `json`.
+"""
+
+__all__ = [
+    "UserRecord",
+    "ProductRecord",
+    "OrderRecord",
+    "BACKENDS",
+    "record_decoder",
+    "validate_record",
+]
+
+from typing import Any, Callable, TypedDict, TypeAlias
+import json
+
+try:
+    import msgspec
+
+    HAS_MSGSPEC = True
+except ImportError:  # The optional dependency.
+    HAS_MSGSPEC = False
+
+try:
+    import orjson
+
+    HAS_ORJSON = True
+except ImportError:  # The optional dependency.
+    HAS_ORJSON = False
+
+from company.orders._common import SchemaError
+
+
+class UserRecord(TypedDict):
+    id: int
+    name: str
+    city: str
+
+
+class ProductRecord(TypedDict):
+    id: int
+    name: str
+    price: int
+
+
+class OrderRecord(TypedDict):
+    id: int
+    created: int | float
+    products: list[ProductRecord]
+    user: UserRecord
+
+
+RecordDecoder: TypeAlias = Callable[[bytes | str], OrderRecord]
+
+BACKENDS = ("msgspec", "orjson", "json")
+"""The supported JSON backends ordered by preference."""
+
+
+# The expected `(key, type)` of each record object.
+_USER_FIELDS = (("id", int), ("name", str), ("city", str))
+_PRODUCT_FIELDS = (("id", int), ("name", str), ("price", int))
+_ORDER_FIELDS = (
+    ("id", int),
+    ("created", (int, float)),
+    ("products", list),
+    ("user", dict),
+)
+
+
+def _check(value: Any, fields: tuple[tuple[str, Any], ...], path: str) -> None:
+    if not isinstance(value, dict):
+        raise SchemaError(f"Expected `object` - at `{path}`")
+    for key, kind in fields:
+        if key not in value:
+            raise SchemaError(f"Object missing required field `{key}` - at `{path}`")
+        field = value[key]
+        if not isinstance(field, kind) or isinstance(field, bool):
+            raise SchemaError(
+                f"Unexpected `{type(field).__name__}` - at `{path}.{key}`"
+            )
+
+
+def validate_record(record: Any) -> OrderRecord:
+    """
+    Check that the parsed JSON has the shape of :class:`OrderRecord`.
+
+    The unknown keys are allowed (and kept).
+
+    :param record: The parsed JSON value.
+    :returns: The same record.
+    :raises :class:`SchemaError`: when the record has an unexpected shape.
+    """
+    # The fast path for valid records, the slow one finds the reason of failure.
+    try:
+        user, products = record["user"], record["products"]
+        if (
+            type(record["id"]) is int
+            and type(record["created"]) in (int, float)
+            and type(user["id"]) is int
+            and type(user["name"]) is str
+            and type(user["city"]) is str
+            and type(products) is list
+            and all(
+                type(_["id"]) is int
+                and type(_["name"]) is str
+                and type(_["price"]) is int
+                for _ in products
+            )
+        ):
+            return record
+    except (KeyError, TypeError):
+        pass
+
+    _check(record, _ORDER_FIELDS, "$")
+    _check(record["user"], _USER_FIELDS, "$.user")
+    for index, product in enumerate(record["products"]):
+        _check(product, _PRODUCT_FIELDS, f"$.products[{index}]")
+    raise SchemaError(
+        "Unexpected value - at `$`"
+    )  # Not expected, the check finds the reason.
+
+
+def record_decoder(backend: str | None = None) -> RecordDecoder:
+    """
+    Create the decoder of JSON lines to validated records.
+
+    The decoder raises :class:`SchemaError` when the record has an unexpected shape
+    and :class:`ValueError` when the line is not a valid JSON.
+
+    :param backend: One of :data:`BACKENDS`, the first installed one by default.
+    :raises :class:`ValueError`: when the backend is not supported or installed.
+    """
+    if backend is None:
+        backend = "msgspec" if HAS_MSGSPEC else "orjson" if HAS_ORJSON else "json"
+
+    if backend == "msgspec" and HAS_MSGSPEC:
+        decode = msgspec.json.Decoder(OrderRecord).decode
+        validation_error = msgspec.ValidationError
+
+        def decode_msgspec(line: bytes | str) -> OrderRecord:
+            try:
+                return decode(line)
+            except validation_error as error:
+                raise SchemaError(f"{error}") from error
+
+        return decode_msgspec
+
+    loads: Callable[[bytes | str], Any]
+    if backend == "orjson" and HAS_ORJSON:
+        loads = orjson.loads
+    elif backend == "json":
+        loads = json.loads
+    else:
+        raise ValueError(f"JSON backend '{backend}' is not available")
+
+    def decode_record(line: bytes | str) -> OrderRecord:
+        return validate_record(loads(line))
+
+    return decode_record
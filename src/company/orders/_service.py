@@ -2,26 +2,93 @@
 This module contains a service layer related code.
 """
 
-__all__ = ["OrderService"]
+__all__ = ["OrderService", "ChunkReport"]
 
 
+from os import PathLike
 from pathlib import Path
-from typing import Iterable, Iterator
-from collections import Counter
+from typing import Iterable, Iterator, Callable, ContextManager, TypeVar
+from contextlib import nullcontext
+from dataclasses import dataclass
+from functools import partial
 import datetime
-import json
+import os
+import time
 
 from company.orders._domain import (
     User,
+    UserID,
     UserRepository,
     Order,
-    OrderLine,
+    OrderID,
     OrderRepository,
     Product,
+    ProductID,
     ProductRepository,
 )
-from company.orders._common import DateTimeRange, inform, JSONError, Any, DomainError
-from company.orders._storage import ConflictError
+from company.orders._common import (
+    DateTimeRange,
+    inform,
+    batched,
+    JSONError,
+    SchemaError,
+    Any,
+    connection_of,
+)
+from company.orders._storage import (
+    CheckpointRepository,
+    ConflictError,
+    StagingLoader,
+    transaction,
+)
+from company.orders._ingest import (
+    to_row,
+    create_entities,
+    parse_parallel,
+    MappedFile,
+    OrderRow,
+    Checkpoint,
+    ChangeTracker,
+    fingerprint,
+    read_lines,
+)
+from company.orders._records import OrderRecord, record_decoder
+from company.orders._analytics import Analytics
+from company.orders._metrics import IngestMetrics
+from company.orders._cache import QueryCache, InvalidatingOrderRepository
+
+T = TypeVar("T")
+
+_MISSING = object()
+
+
+@dataclass(frozen=True, slots=True)
+class ChunkReport:
+    """
+    The value object describes one committed chunk of an import.
+
+    The `users` and `products` are the saved new ones, the `changed` are
+    the updated users and products of the merge.
+    """
+
+    index: int
+    orders: int
+    order_lines: int
+    users: int
+    products: int
+    seconds: float
+    changed: int = 0
+
+    @property
+    def rows(self) -> int:
+        """The number of written rows."""
+        return (
+            self.orders + self.order_lines + self.users + self.products + self.changed
+        )
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else float("inf")
 
 
 class OrderService:
@@ -33,6 +100,20 @@ class OrderService:
     :param user_repository: The user repository instance.
     :param order_repository: The order repository instance.
     :param product_repository: The product repository instance.
+    :param unit_of_work: The factory of a context manager wrapping the repositories'
+        work in one transaction e.g. ``partial(transaction, connection)``. By default
+        the transaction of the order repository's connection, when it has one, so
+        the chunks of the bulk imports are atomic.
+    :param json_backend: The JSON decoder backend, see :func:`record_decoder`.
+    :param analytics: The backend of analytical queries e.g. :class:`SQLAnalytics`
+        or :class:`ColumnarAnalytics`.
+    :param staging_loader: The factory of the bulk loads e.g.
+        ``partial(StagingLoader, connection)``, see :meth:`bulk_load_orders`.
+    :param query_cache: The cache of the searches' results, it is invalidated by
+        the orders saved by the order repository and by the users and products
+        changed by the merging imports. The searches accept `cache=False` to bypass it.
+    :param checkpoint_repository: The checkpoints of the incremental imports sharing
+        the unit of work, see :meth:`incremental_insert_orders`.
 
     TODO Send events to message dispatcher (bus).
     """
@@ -43,134 +124,824 @@ class OrderService:
         order_repository: OrderRepository,
         product_repository: ProductRepository,
         logger=None,
+        unit_of_work: Callable[[], ContextManager[Any]] | None = None,
+        json_backend: str | None = None,
+        analytics: Analytics | None = None,
+        staging_loader: Callable[[], StagingLoader] | None = None,
+        query_cache: QueryCache | None = None,
+        checkpoint_repository: CheckpointRepository | None = None,
     ) -> None:
         self._user_repository = user_repository
+        invalidating = None
+        if query_cache is not None:
+            invalidating = InvalidatingOrderRepository(order_repository, query_cache)
+            order_repository = invalidating
         self._order_repository = order_repository
         self.product_repository = product_repository
         self.logger = logger
+        if unit_of_work is None:
+            # The SQLite repositories (and their wrappers) expose their connections.
+            connections = getattr(order_repository, "connections", None)
+            unit_of_work = (
+                nullcontext
+                if connections is None
+                else partial(transaction, connections)
+            )
+        if invalidating is not None:
+            # The cached results are invalidated after the orders are committed.
+            unit_of_work = invalidating.committing(unit_of_work)
+        self._unit_of_work = unit_of_work
+        self._json_backend = json_backend
+        self._decode_record = record_decoder(json_backend)
+        self._analytics = analytics
+        self._staging_loader = staging_loader
+        self._query_cache = query_cache
+        self._checkpoint_repository = checkpoint_repository
 
     # ############################## Queries ############################## #
 
     def search_orders_by_date(
-        self, since: datetime.datetime, till: datetime.datetime
+        self,
+        since: datetime.datetime,
+        till: datetime.datetime,
+        after_id: OrderID | None = None,
+        limit: int | None = None,
+        cache: bool = True,
     ) -> Iterator[Order]:
-        """TODO"""
+        """
+        Retrieve orders created in the given period ordered by creation time and identifier.
+
+        The orders are streamed from the storage. For the next page pass the
+        identifier of the last order as `after_id`. With the query cache the
+        orders are fetched at once and cached.
+
+        :param since: The start of the period (inclusive).
+        :param till: The end of the period (inclusive).
+        :param after_id: Return only orders after this one.
+        :param limit: The maximum number of orders to return.
+        :param cache: Use the query cache (if the service has one).
+        :returns: The orders created in the period.
+        """
+        date_time_range = DateTimeRange(since=since, till=till)
+        find = partial(
+            self._order_repository.find_between,
+            date_time_range.since_timestamp,
+            date_time_range.till_timestamp,
+            after_id=after_id,
+            limit=limit,
+        )
+        query_cache = self._query_cache
+        if query_cache is None or not cache:
+            yield from find()
+            return
+        key = ("search_orders_by_date", date_time_range, after_id, limit)
+        yield from self._cached(
+            query_cache, key, date_time_range, lambda: tuple(find())
+        )
+
+    def search_order_ids_by_date(
+        self, since: datetime.datetime, till: datetime.datetime, cache: bool = True
+    ) -> list[OrderID]:
+        """
+        Retrieve identifiers of orders created in the given period.
+
+        The :class:`IndexedOrderRepository` answers it without querying the storage.
+
+        :param since: The start of the period (inclusive).
+        :param till: The end of the period (inclusive).
+        :param cache: Use the query cache (if the service has one).
+        :returns: The order identifiers in ascending order.
+        """
+        date_time_range = DateTimeRange(since=since, till=till)
+        find = partial(
+            self._order_repository.find_ids_between,
+            date_time_range.since_timestamp,
+            date_time_range.till_timestamp,
+        )
+        query_cache = self._query_cache
+        if query_cache is None or not cache:
+            return find()
+        key = ("search_order_ids_by_date", date_time_range)
+        return list(
+            self._cached(query_cache, key, date_time_range, lambda: tuple(find()))
+        )
+
+    def count_orders_by_date(
+        self, since: datetime.datetime, till: datetime.datetime, cache: bool = True
+    ) -> int:
+        """
+        Count orders created in the given period.
+
+        The :class:`IndexedOrderRepository` answers it without querying the storage.
+
+        :param since: The start of the period (inclusive).
+        :param till: The end of the period (inclusive).
+        :param cache: Use the query cache (if the service has one).
+        :returns: The number of orders.
+        """
         date_time_range = DateTimeRange(since=since, till=till)
-        result = self._order_repository.find_between(
-            date_time_range.since_timestamp, date_time_range.till_timestamp
+        count = partial(
+            self._order_repository.count_between,
+            date_time_range.since_timestamp,
+            date_time_range.till_timestamp,
         )
-        yield from result
+        query_cache = self._query_cache
+        if query_cache is None or not cache:
+            return count()
+        key = ("count_orders_by_date", date_time_range)
+        return self._cached(query_cache, key, date_time_range, count)
 
-    def search_users_with_most_products(self, connection, limit=3) -> Iterable[User]:
+    def search_users_with_most_products(
+        self, connection, limit=3, cache: bool = True
+    ) -> Iterable[User]:
         # Use some `Provider`(protocol) instead of raw connection object.
-        # It separates this method from knowledge of specific connection/storage type. 
+        # It separates this method from knowledge of specific connection/storage type.
         """
         Retrieve users with the highest number of purchased products in descending order.
 
+        :param connection: A database connection object or provider.
         :param limit: The maximum of users to return.
+        :param cache: Use the query cache (if the service has one), the result
+            is invalidated by any new order.
         :returns: The users with the highest number of purchased products.
         """
+        query_cache = self._query_cache
+        if query_cache is not None and cache:
+            key = ("search_users_with_most_products", limit)
+            search = partial(
+                self.search_users_with_most_products, connection, limit, cache=False
+            )
+            yield from self._cached(query_cache, key, None, lambda: tuple(search()))
+            return
+
         # DISCUSSION: Is it right to use raw SQL here? Should we provide some other class
         # as a dependency (e.g. provider) instead of concrete ODBC connection? This query
         # doesn't fit to any repository and complicates our "perfect" domain driven design :D
         # STATUS: It works but should be investigated more.
-        with connection as cursor:
+        # The totals are maintained by the storage when orders are saved, so this is
+        # the index lookup instead of aggregating all orders (see `schema.sql`).
+        with connection_of(connection) as cursor:
             found = cursor.execute(
-                """       
-                select orders.user_id, users.name, users.city, sum(order_lines.quantity) 
-                from orders 
-                join order_lines on order_lines.order_id = orders.id 
-                join users on users.id = orders.user_id
-                group by orders.user_id 
-                order by sum(order_lines.quantity) 
-                desc 
+                """
+                select users.id, users.name, users.city
+                from user_product_totals totals
+                join users on users.id = totals.user_id
+                order by totals.total desc, totals.user_id
                 limit ?;
             """,
                 (limit,),
             ).fetchall()
             for item in found:
-                yield User(*item[:-1])
+                yield User(*item)
+
+    def top_users(
+        self,
+        limit: int = 3,
+        since: datetime.datetime | None = None,
+        till: datetime.datetime | None = None,
+    ) -> list[tuple[UserID, int]]:
+        """
+        Retrieve users with the highest number of products purchased in the period.
+
+        :param limit: The maximum of users to return.
+        :param since: The start of the period (inclusive), not limited by default.
+        :param till: The end of the period (inclusive), not limited by default.
+        :returns: The `(user_id, quantity)` pairs in descending order.
+        """
+        return self._require_analytics().top_users(limit, *self._period(since, till))
+
+    def revenue_by_city(
+        self,
+        since: datetime.datetime | None = None,
+        till: datetime.datetime | None = None,
+    ) -> list[tuple[str, int]]:
+        """
+        Retrieve the revenue of products purchased in the period by users' cities.
+
+        :param since: The start of the period (inclusive), not limited by default.
+        :param till: The end of the period (inclusive), not limited by default.
+        :returns: The `(city, revenue)` pairs in descending order.
+        """
+        return self._require_analytics().revenue_by_city(*self._period(since, till))
+
+    def product_popularity(
+        self,
+        limit: int = 10,
+        since: datetime.datetime | None = None,
+        till: datetime.datetime | None = None,
+    ) -> list[tuple[ProductID, int]]:
+        """
+        Retrieve products purchased in the highest quantity in the period.
+
+        :param limit: The maximum of products to return.
+        :param since: The start of the period (inclusive), not limited by default.
+        :param till: The end of the period (inclusive), not limited by default.
+        :returns: The `(product_id, quantity)` pairs in descending order.
+        """
+        return self._require_analytics().product_popularity(
+            limit, *self._period(since, till)
+        )
+
+    @staticmethod
+    def _cached(
+        cache: QueryCache,
+        key: tuple,
+        date_time_range: DateTimeRange | None,
+        query: Callable[[], T],
+    ) -> T:
+        """
+        Return the cached result of the query or cache the new one.
+
+        :param cache: The query cache.
+        :param key: The key of the result, the method name first.
+        :param date_time_range: The period of orders the result depends on, all orders by default.
+        :param query: The function returning the immutable result.
+        """
+        result = cache.get(key, _MISSING)
+        if result is _MISSING:
+            # The result read while the orders are being saved is not cached.
+            generation = cache.generation
+            result = query()
+            if date_time_range is None:
+                cache.put(key, result, generation=generation)
+            else:
+                cache.put(
+                    key,
+                    result,
+                    date_time_range.since_timestamp,
+                    date_time_range.till_timestamp,
+                    generation,
+                )
+        return result
+
+    @staticmethod
+    def _merge_entities(
+        repository, tracker: ChangeTracker, entities: Iterable
+    ) -> tuple[int, int]:
+        """
+        Save the new entities and update the changed ones, the unchanged are not written.
+
+        :returns: The numbers of the new and of the changed entities.
+        """
+        new, changed = tracker.changes(entities, repository.find_many)
+        if new or changed:
+            repository.merge(new + changed)
+        return len(new), len(changed)
+
+    def _invalidate_changed(self, changed: int) -> None:
+        """
+        Remove the cached results without a range (e.g. the top users) after the
+        merge committed the changed users or products.
+
+        :param changed: The number of changed users and products.
+        """
+        if changed and self._query_cache is not None:
+            self._query_cache.invalidate_unranged()
+
+    def _require_analytics(self) -> Analytics:
+        if self._analytics is None:
+            raise RuntimeError("The analytics backend is not configured")
+        return self._analytics
+
+    @staticmethod
+    def _period(
+        since: datetime.datetime | None, till: datetime.datetime | None
+    ) -> tuple[int | None, int | None]:
+        """
+        Convert the period boundaries to timestamps, ``None`` is not limited.
+        """
+        date_time_range = DateTimeRange(
+            since=since or datetime.datetime.min, till=till or datetime.datetime.max
+        )
+        return (
+            None if since is None else date_time_range.since_timestamp,
+            None if till is None else date_time_range.till_timestamp,
+        )
 
     # ############################## Commands ############################# #
 
-    def _parse_records(self, path) -> Iterator[Any]:  # better to use TypedDict for JSON
+    def _parse_records(self, path, memory_map: bool = False) -> Iterator[OrderRecord]:
         """
         The helper method to read and parse records from provided JSONLine data file.
         This method can be easily  mocked for unit testing.
 
-        :param path: A data file to be parsed.
-        :raises :class:`JSONError`: when data can't be parsed as JSON.
+        Each record is validated when it's decoded, so there are no :class:`KeyError`
+        errors later in the code.
+
+        :param path: A data file to be parsed or an open file object of JSON lines.
+        :param memory_map: Read the memory-mapped file as bytes instead of decoded text lines.
+        :raises:
+            :class:`JSONError`: when data can't be parsed as JSON.
+            :class:`SchemaError`: when a record doesn't have the expected shape.
+        """
+        if memory_map:
+            yield from self._parse_mapped_records(path)
+            return
+        if isinstance(path, (str, PathLike)):
+            with open(path, encoding="utf8") as file:
+                yield from self._parse_records(file)
+            return
+        # The open file objects (e.g. the body of a request) are read as they are.
+        for index, line in enumerate(path):
+            try:
+                record = self._decode_record(line)
+            except SchemaError as error:
+                raise SchemaError(f"{index}: {error}") from error
+            except ValueError as error:
+                raise JSONError(f"{index}: {line}") from error
+            yield record
+
+    def _parse_mapped_records(self, path) -> Iterator[OrderRecord]:
+        """
+        Parse the records from the memory-mapped file, see :class:`MappedFile`.
         """
-        with open(path, encoding="utf8") as file:
-            for index, line in enumerate(file):
+        with MappedFile(path) as file:
+            for index, line in enumerate(file.lines()):
                 try:
-                    data = json.loads(line)
-                    # TODO CHECK THAT JSON HAS PREDEFINED SCHEMA!
-                    # We do not want any :class:`KeyError` errors later in the code!
-                    yield data
+                    record = self._decode_record(line)
+                except SchemaError as error:
+                    raise SchemaError(f"{index}: {error}") from error
                 except ValueError as error:
-                    raise JSONError(f"{index}: {line}") from error
+                    text = line.decode("utf8", errors="replace")
+                    raise JSONError(f"{index}: {text}") from error
+                yield record
 
-    def batch_insert_orders(self, path: Path) -> None:
+    def _parse_appended_rows(
+        self, path, offset: int = 0
+    ) -> Iterator[tuple[OrderRow, int]]:
+        """
+        Parse the rows of records from the byte offset with the offsets after them.
+
+        The blank lines are skipped. The last line without the newline which is not
+        a valid JSON is not parsed, it is probably being appended. The errors report
+        the offset of the line instead of its index.
+        """
+        for line, end in read_lines(path, offset):
+            start, offset = offset, end
+            if line.isspace():
+                continue
+            try:
+                record = self._decode_record(line)
+            except SchemaError as error:
+                raise SchemaError(f"{start}: {error}") from error
+            except ValueError as error:
+                if not line.endswith(b"\n"):
+                    inform(
+                        self.logger,
+                        "The incomplete line at %d is left for the next import",
+                        start,
+                    )
+                    return
+                text = line.decode("utf8", errors="replace").rstrip("\n")
+                raise JSONError(f"{start}: {text}") from error
+            yield to_row(record), end
+
+    def _parse_rows(
+        self, path, workers: int = 1, memory_map: bool = False
+    ) -> Iterator[tuple]:
+        """
+        Parse the rows of records, by a pool of processes with more than one worker.
+        """
+        if workers > 1:
+            return parse_parallel(path, workers, backend=self._json_backend)
+        return map(to_row, self._parse_records(path, memory_map=memory_map))
+
+    def batch_insert_orders(
+        self, path: Path, metrics: IngestMetrics | None = None
+    ) -> None:
         """
         A batch insert from provided JSON-line dataset.
 
         :param path: A data file to be parsed.
+        :param metrics: The instrumentation of the import e.g. with progress reports.
         :raises:
             :class:`JSONError`: when data can't be parsed as JSON.
+            :class:`SchemaError`: when a record doesn't have the expected shape.
             :class:`DomainError`: when entity can't be created from data.
             :class:`ConflictError`: when an order already exists in database.
         """
         # Parse domain entities fro raw data.
         orders: list[Order] = []
+        metrics = IngestMetrics() if metrics is None else metrics
 
         # NOTE Database writes should be transactional with rollback if something goes wrong.
         # We can use a unit of work pattern / context manager but we keep it simple for now.
         # We trust that attributes such as price for products does not change over dataset.
         # It should be true for provided dataset, but don't trust the input!
-        for record in self._parse_records(path):
-            # [1] Extract and save a new user.
-            user = User(
-                identifier=int(record["user"]["id"]),
-                name=record["user"]["name"],
-                city=record["user"]["city"],
+        # The changing attributes are merged by `bulk_insert_orders(..., merge=True)`.
+        for record in metrics.timed(self._parse_records(path), "parse"):
+            with metrics.phase("validate"):
+                user, products, order = create_entities(to_row(record))
+            metrics.records += 1
+
+            with metrics.phase("write"):
+                # [1] Save a new user.
+                if not self._user_repository.exists(user.identifier):
+                    self._user_repository.save(user)
+                    metrics.users += 1
+                    inform(self.logger, "Saved %s", user)
+                else:
+                    metrics.skipped += 1
+
+                # [2] Save a new products.
+                for product in products:
+                    if not self.product_repository.exists(product.identifier):
+                        self.product_repository.save(product)
+                        metrics.products += 1
+                        inform(self.logger, "Saved %s", product)
+                    else:
+                        metrics.skipped += 1
+
+                # [3] Check a new order.
+                if self._order_repository.exists(order.identifier):
+                    raise ConflictError(f"Order {order.identifier} already exists")
+            orders.append(order)
+            # inform(self.logger, "Created %s", order)
+            metrics.progress()
+
+        # [4] Store the orders as batch.
+        with metrics.phase("write"):
+            self._order_repository.save(*orders)
+        metrics.orders += len(orders)
+        metrics.order_lines += sum(len(_.order_lines) for _ in orders)
+        metrics.progress(final=True)
+
+    def bulk_insert_orders(
+        self,
+        path: Path,
+        chunk_size: int = 10_000,
+        workers: int = 1,
+        memory_map: bool = False,
+        merge: bool = False,
+        metrics: IngestMetrics | None = None,
+    ) -> list[ChunkReport]:
+        """
+        A streaming set-based batch insert from provided JSON-line dataset.
+
+        Unlike :meth:`batch_insert_orders` it doesn't query the storage per record.
+        The records are read in chunks and each chunk is written in its own unit
+        of work: new users and products are saved with one statement, the order
+        conflicts are checked with one query and the orders are saved as batch.
+        Only the chunk and the identifiers of users and products saved by
+        this import are kept in memory, so the memory doesn't grow with the file.
+
+        When a chunk fails, it is rolled back but the previous chunks stay committed.
+
+        With more than one worker the file is parsed and validated by a pool of
+        processes (see :func:`parse_parallel`), this process only writes the rows
+        in the order of the file, so the result is the same as the sequential one.
+
+        The first seen version of a user or product is saved and the later ones are
+        ignored. With `merge` the last seen version is saved, the stored users and
+        products are updated when their attributes changed (see :class:`ChangeTracker`)
+        and the unchanged ones are not written.
+
+        :param path: A data file to be parsed or an open file object of JSON lines
+            (with one worker and without the memory map).
+        :param chunk_size: The number of records written in one transaction.
+        :param workers: The number of processes parsing the file.
+        :param memory_map: Read the memory-mapped file (the workers always do).
+        :param merge: Update the changed users and products.
+        :param metrics: The instrumentation of the import e.g. with progress reports,
+            the parse phase of workers is the time spent waiting for them.
+        :returns: The report for each committed chunk.
+        :raises:
+            :class:`JSONError`: when data can't be parsed as JSON.
+            :class:`SchemaError`: when a record doesn't have the expected shape.
+            :class:`DomainError`: when entity can't be created from data.
+            :class:`ConflictError`: when an order already exists in database or file.
+        """
+        saved_users: set[UserID] = set()
+        saved_products: set[ProductID] = set()
+        user_changes: ChangeTracker[User] = ChangeTracker(lambda _: (_.name, _.city))
+        product_changes: ChangeTracker[Product] = ChangeTracker(
+            lambda _: (_.name, _.price)
+        )
+        reports: list[ChunkReport] = []
+        metrics = IngestMetrics() if metrics is None else metrics
+        keep = dict.__setitem__ if merge else dict.setdefault
+
+        start = time.perf_counter()
+        rows = self._parse_rows(path, workers, memory_map)
+        for index, chunk in enumerate(
+            batched(metrics.timed(rows, "parse"), chunk_size)
+        ):
+            # [1] Create entities, the first seen user/product version wins as in `batch_insert_orders`
+            # and the last one with the merge.
+            users: dict[UserID, User] = {}
+            products: dict[ProductID, Product] = {}
+            orders: dict[OrderID, Order] = {}
+            references = 0  # The users and products of records.
+            with metrics.phase("validate"):
+                for row in chunk:
+                    user, order_products, order = create_entities(row)
+                    keep(users, user.identifier, user)
+                    for product in order_products:
+                        keep(products, product.identifier, product)
+                    references += 1 + len(order_products)
+                    if order.identifier in orders:
+                        raise ConflictError(f"Order {order.identifier} is duplicated")
+                    orders[order.identifier] = order
+
+            # [2] Save new users, products and orders in one transaction.
+            with self._unit_of_work():
+                with metrics.phase("write"):
+                    conflicts = self._order_repository.find_existing(orders.keys())
+                    if conflicts:
+                        raise ConflictError(f"Order {min(conflicts)} already exists")
+                    if merge:
+                        users_count, changed_users = self._merge_entities(
+                            self._user_repository, user_changes, users.values()
+                        )
+                        products_count, changed_products = self._merge_entities(
+                            self.product_repository, product_changes, products.values()
+                        )
+                    else:
+                        new_users = [
+                            _ for _ in users.values() if _.identifier not in saved_users
+                        ]
+                        users_count = self._user_repository.save_missing(new_users)
+                        new_products = [
+                            _
+                            for _ in products.values()
+                            if _.identifier not in saved_products
+                        ]
+                        products_count = self.product_repository.save_missing(
+                            new_products
+                        )
+                        saved_users.update(_.identifier for _ in new_users)
+                        saved_products.update(_.identifier for _ in new_products)
+                        changed_users = changed_products = 0
+                    self._order_repository.save(*orders.values())
+                committing = time.perf_counter()
+            metrics.timings["commit"] += time.perf_counter() - committing
+            self._invalidate_changed(changed_users + changed_products)
+
+            report = ChunkReport(
+                index=index,
+                orders=len(orders),
+                order_lines=sum(len(_.order_lines) for _ in orders.values()),
+                users=users_count,
+                products=products_count,
+                seconds=time.perf_counter() - start,
+                changed=changed_users + changed_products,
+            )
+            reports.append(report)
+            metrics.records += len(chunk)
+            metrics.orders += report.orders
+            metrics.order_lines += report.order_lines
+            metrics.users += report.users
+            metrics.products += report.products
+            metrics.changed += report.changed
+            metrics.skipped += (
+                references - report.users - report.products - report.changed
             )
-            if not self._user_repository.exists(user.identifier):
-                self._user_repository.save(user)
-                inform(self.logger, f"Saved {user}")
-
-            # [2] Extract and save a new products.
-            products = []
-            for product_record in record["products"]:
-                product = Product(
-                    identifier=int(product_record["id"]),
-                    name=product_record["name"],
-                    price=product_record["price"],
+            metrics.progress()
+            inform(
+                self.logger,
+                "Saved chunk %d: %d orders, %d users, %d products, %d changed (%.0f rows/s)",
+                index,
+                report.orders,
+                report.users,
+                report.products,
+                report.changed,
+                report.rows_per_second,
+            )
+            start = time.perf_counter()
+        metrics.progress(final=True)
+        return reports
+
+    def bulk_load_orders(
+        self,
+        path: Path,
+        chunk_size: int = 10_000,
+        workers: int = 1,
+        memory_map: bool = False,
+        metrics: IngestMetrics | None = None,
+    ) -> ChunkReport:
+        """
+        A load of large histories through the staging tables in one transaction.
+
+        The records are validated and staged in chunks like by :meth:`bulk_insert_orders`,
+        but nothing is stored until the whole file is staged. Then the staged entities
+        are moved into the stored tables at once, the indexes of orders are built and
+        the foreign keys are validated at the end (see :class:`StagingLoader`). When
+        anything fails, nothing is stored.
+
+        The order repository's in-memory structures (e.g. :class:`TimestampIndex`) are
+        not updated by the load, reload them afterwards. The query cache is cleared.
+
+        :param path: A data file to be parsed.
+        :param chunk_size: The number of records staged at once.
+        :param workers: The number of processes parsing the file.
+        :param memory_map: Read the memory-mapped file (the workers always do).
+        :param metrics: The instrumentation of the load, the write phase is the staging
+            and the commit phase is the load of the staged entities.
+        :returns: The report of the loaded rows.
+        :raises:
+            :class:`JSONError`: when data can't be parsed as JSON.
+            :class:`SchemaError`: when a record doesn't have the expected shape.
+            :class:`DomainError`: when entity can't be created from data.
+            :class:`ConflictError`: when an order already exists in database or file.
+            :class:`RuntimeError`: when the service has no staging loader.
+        """
+        if self._staging_loader is None:
+            raise RuntimeError("The service has no staging loader configured")
+        metrics = IngestMetrics() if metrics is None else metrics
+        references = 0  # The users and products of records.
+        start = time.perf_counter()
+
+        with self._staging_loader() as loader:
+            rows = self._parse_rows(path, workers, memory_map)
+            for chunk in batched(metrics.timed(rows, "parse"), chunk_size):
+                users: dict[UserID, User] = {}
+                products: dict[ProductID, Product] = {}
+                orders: dict[OrderID, Order] = {}
+                with metrics.phase("validate"):
+                    for row in chunk:
+                        user, order_products, order = create_entities(row)
+                        users.setdefault(user.identifier, user)
+                        for product in order_products:
+                            products.setdefault(product.identifier, product)
+                        references += 1 + len(order_products)
+                        if order.identifier in orders:
+                            raise ConflictError(
+                                f"Order {order.identifier} is duplicated"
+                            )
+                        orders[order.identifier] = order
+                with metrics.phase("write"):
+                    loader.stage(users.values(), products.values(), orders.values())
+                metrics.records += len(chunk)
+                metrics.progress()
+
+            with metrics.phase("commit"):
+                users_count, products_count, orders_count, lines_count = loader.load()
+        if self._query_cache is not None:
+            self._query_cache.invalidate()
+
+        report = ChunkReport(
+            index=0,
+            orders=orders_count,
+            order_lines=lines_count,
+            users=users_count,
+            products=products_count,
+            seconds=time.perf_counter() - start,
+        )
+        metrics.orders += report.orders
+        metrics.order_lines += report.order_lines
+        metrics.users += report.users
+        metrics.products += report.products
+        metrics.skipped += references - report.users - report.products
+        metrics.progress(final=True)
+        inform(
+            self.logger,
+            "Loaded %d orders, %d users, %d products (%.0f rows/s)",
+            report.orders,
+            report.users,
+            report.products,
+            report.rows_per_second,
+        )
+        return report
+
+    def incremental_insert_orders(
+        self,
+        path: Path,
+        chunk_size: int = 10_000,
+        merge: bool = False,
+        metrics: IngestMetrics | None = None,
+    ) -> list[ChunkReport]:
+        """
+        A resumable import of the file growing by appended records e.g. daily feeds.
+
+        The import continues from the checkpoint of the file, the byte offset after
+        the last imported record. The checkpoint is saved in the unit of work of each
+        chunk, so the crashed or interrupted import resumes after the last committed
+        chunk. The replaced file (its leading bytes or the bytes before the offset
+        differ from the imported ones or it is shorter than the offset) is imported
+        from the beginning. The orders
+        already stored are skipped instead of raising :class:`ConflictError`.
+        The users and products are saved as by :meth:`bulk_insert_orders`.
+
+        :param path: A data file to be parsed.
+        :param chunk_size: The number of records written in one transaction.
+        :param merge: Update the changed users and products.
+        :param metrics: The instrumentation of the import, the skipped orders are counted.
+        :returns: The report for each committed chunk, without the skipped orders.
+        :raises:
+            :class:`JSONError`: when data can't be parsed as JSON.
+            :class:`SchemaError`: when a record doesn't have the expected shape.
+            :class:`DomainError`: when entity can't be created from data.
+            :class:`ConflictError`: when an order is duplicated in one chunk.
+            :class:`RuntimeError`: when the service has no checkpoint repository.
+        """
+        if self._checkpoint_repository is None:
+            raise RuntimeError("The service has no checkpoint repository configured")
+        reports: list[ChunkReport] = []
+        metrics = IngestMetrics() if metrics is None else metrics
+        user_changes: ChangeTracker[User] = ChangeTracker(lambda _: (_.name, _.city))
+        product_changes: ChangeTracker[Product] = ChangeTracker(
+            lambda _: (_.name, _.price)
+        )
+        keep = dict.__setitem__ if merge else dict.setdefault
+
+        source = str(Path(path).resolve())
+        checkpoint = self._checkpoint_repository.find(source)
+        offset = 0
+        if checkpoint is not None:
+            if (
+                checkpoint.offset <= os.path.getsize(path)
+                and fingerprint(path, checkpoint.offset) == checkpoint.fingerprint
+            ):
+                offset = checkpoint.offset
+                inform(self.logger, "Resuming the import of %s at %d", source, offset)
+            else:
+                inform(
+                    self.logger,
+                    "The file %s was replaced, importing it from the beginning",
+                    source,
                 )
-                if not self.product_repository.exists(product.identifier):
-                    self.product_repository.save(product)
-                    inform(self.logger, f"Saved {product}")
-                products.append(product)
-
-            # [3] Extract and save a new order.
-            order_lines = [
-                OrderLine(product_id=product.identifier, quantity=quantity)
-                for product, quantity in Counter(products).items()
-            ]
-
-            result: Order | DomainError = Order.create(
-                identifier=int(record["id"]),
-                created=record["created"],
-                user_id=user.identifier,
-                order_lines=order_lines,
+
+        start = time.perf_counter()
+        rows = self._parse_appended_rows(path, offset)
+        for index, chunk in enumerate(
+            batched(metrics.timed(rows, "parse"), chunk_size)
+        ):
+            users: dict[UserID, User] = {}
+            products: dict[ProductID, Product] = {}
+            orders: dict[OrderID, Order] = {}
+            references = 0  # The users and products of records.
+            with metrics.phase("validate"):
+                for row, _ in chunk:
+                    user, order_products, order = create_entities(row)
+                    keep(users, user.identifier, user)
+                    for product in order_products:
+                        keep(products, product.identifier, product)
+                    references += 1 + len(order_products)
+                    if order.identifier in orders:
+                        raise ConflictError(f"Order {order.identifier} is duplicated")
+                    orders[order.identifier] = order
+            (last_order_id, *_), offset = chunk[-1]
+            checkpoint = Checkpoint(
+                source, fingerprint(path, offset), offset, last_order_id
             )
-            if isinstance(result, DomainError):
-                raise result
 
-            if self._order_repository.exists(result.identifier):
-                raise ConflictError(f"Order {result.identifier} already exists")
-            orders.append(result)
-            # inform(self.logger, f"Created {order}")
+            # Save the new entities and the position after them in one transaction.
+            with self._unit_of_work():
+                with metrics.phase("write"):
+                    stored = self._order_repository.find_existing(orders.keys())
+                    new_orders = [
+                        _ for _ in orders.values() if _.identifier not in stored
+                    ]
+                    if merge:
+                        users_count, changed_users = self._merge_entities(
+                            self._user_repository, user_changes, users.values()
+                        )
+                        products_count, changed_products = self._merge_entities(
+                            self.product_repository, product_changes, products.values()
+                        )
+                    else:
+                        users_count = self._user_repository.save_missing(users.values())
+                        products_count = self.product_repository.save_missing(
+                            products.values()
+                        )
+                        changed_users = changed_products = 0
+                    if new_orders:
+                        self._order_repository.save(*new_orders)
+                    self._checkpoint_repository.save(checkpoint)
+                committing = time.perf_counter()
+            metrics.timings["commit"] += time.perf_counter() - committing
+            self._invalidate_changed(changed_users + changed_products)
 
-        # [4] Store the orders as batch.
-        self._order_repository.save(*orders)
+            report = ChunkReport(
+                index=index,
+                orders=len(new_orders),
+                order_lines=sum(len(_.order_lines) for _ in new_orders),
+                users=users_count,
+                products=products_count,
+                seconds=time.perf_counter() - start,
+                changed=changed_users + changed_products,
+            )
+            reports.append(report)
+            metrics.records += len(chunk)
+            metrics.orders += report.orders
+            metrics.order_lines += report.order_lines
+            metrics.users += report.users
+            metrics.products += report.products
+            metrics.changed += report.changed
+            skipped = references - report.users - report.products - report.changed
+            metrics.skipped += skipped + len(stored)
+            metrics.progress()
+            inform(
+                self.logger,
+                "Saved chunk %d: %d orders (%d skipped), %d users, %d products, %d changed, checkpoint %d",
+                index,
+                report.orders,
+                len(stored),
+                report.users,
+                report.products,
+                report.changed,
+                offset,
+            )
+            start = time.perf_counter()
+        metrics.progress(final=True)
+        return reports
@@ -1,9 +1,15 @@
 """
-This module contains database related code such as implementation 
+This module contains database related code such as implementation
 of repositories for each aggregate. This is a infrastructure (persistence) layer.
 """
 
-from typing import Iterator
+from typing import Iterator, Iterable, Any, ContextManager, Self
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from itertools import groupby
+import json
+import sqlite3
+import threading
 
 from company.orders._domain import (
     User,
@@ -14,15 +20,34 @@ from company.orders._domain import (
     ProductID,
     OrderID,
 )
-from company.orders._common import AbstractRepository, flatten, Timestamp
+from company.orders._common import (
+    AbstractRepository,
+    ConnectionMixin,
+    ConnectionProvider,
+    Timestamp,
+    connection_of,
+)
+from company.orders._ingest import Checkpoint
 
 
 __all__ = [
     "UserRepository",
     "ProductRepository",
     "OrderRepository",
+    "CheckpointRepository",
     "create_schema",
     "delete_schema",
+    "migrate_schema",
+    "schema_version",
+    "transaction",
+    "ConnectionPool",
+    "StorageProfile",
+    "PROFILES",
+    "PRAGMAS",
+    "deferred_indexes",
+    "StagingLoader",
+    "rebuild_totals",
+    "check_totals",
     "ConflictError",
 ]
 
@@ -33,9 +58,118 @@ def create_schema(connection, schema_script: str) -> None:
     connection.commit()
 
 
+Version = tuple[int, int, int]
+
+MIGRATIONS: list[tuple[Version, str]] = [
+    (
+        (0, 2, 0),
+        """
+        create index if not exists orders_created_index on orders (created, id, user_id);
+        create index if not exists orders_user_id_index on orders (user_id);
+        create index if not exists order_lines_order_id_index
+            on order_lines (order_id, product_id, quantity);
+        """,
+    ),
+    (
+        (0, 3, 0),
+        """
+        create table if not exists user_product_totals (
+            user_id integer primary key not null,
+            total integer not null default 0
+        );
+        create index if not exists user_product_totals_total_index
+            on user_product_totals (total desc, user_id);
+        create trigger if not exists order_lines_insert_totals after insert on order_lines
+        begin
+            insert into user_product_totals (user_id, total)
+                select user_id, new.quantity from orders where id = new.order_id
+                on conflict (user_id) do update set total = total + excluded.total;
+        end;
+        create trigger if not exists order_lines_delete_totals after delete on order_lines
+        begin
+            update user_product_totals set total = total - old.quantity
+                where user_id = (select user_id from orders where id = old.order_id);
+        end;
+        insert into user_product_totals (user_id, total)
+            select o.user_id, sum(l.quantity) from orders o
+            join order_lines l on l.order_id = o.id group by o.user_id;
+        """,
+    ),
+    (
+        (0, 4, 0),
+        """
+        create table if not exists import_checkpoints (
+            source text primary key not null,
+            fingerprint text not null,
+            byte_offset integer not null check (byte_offset >= 0),
+            last_order_id integer
+        );
+        """,
+    ),
+    (
+        (0, 5, 0),
+        """
+        create trigger if not exists orders_delete_totals before delete on orders
+        begin
+            update user_product_totals set total = total - (
+                select coalesce(sum(quantity), 0) from order_lines where order_id = old.id
+            ) where user_id = old.user_id;
+        end;
+        """,
+    ),
+]
+"""The schema migrations, the `schema.sql` contains all of them."""
+
+SCHEMA_INDEXES = """
+    create index if not exists orders_created_index on orders (created, id, user_id);
+    create index if not exists orders_user_id_index on orders (user_id);
+    create index if not exists order_lines_order_id_index
+        on order_lines (order_id, product_id, quantity);
+    create index if not exists user_product_totals_total_index
+        on user_product_totals (total desc, user_id);
+"""
+"""The secondary indexes of the latest schema, see :func:`deferred_indexes`."""
+
+
+def schema_version(connection) -> Version:
+    """
+    Return the current schema version.
+    """
+    statement = "select major, minor, patch from version order by major desc, minor desc, patch desc limit 1;"
+    found = connection.execute(statement).fetchone()
+    return (0, 0, 0) if found is None else tuple(found)
+
+
+def migrate_schema(connection) -> Version:
+    """
+    Apply the migrations newer than the current schema version.
+
+    Each migration is applied in its own transaction. Then the missing indexes
+    are created again, e.g. when the process died inside :func:`deferred_indexes`.
+
+    :param connection: A database connection object.
+    :returns: The migrated schema version.
+    """
+    current = schema_version(connection)
+    for version, script in MIGRATIONS:
+        if version > current:
+            try:
+                connection.executescript(
+                    f"begin; {script} insert into version (major, minor, patch) values {version}; commit;"
+                )
+            except Exception:
+                connection.rollback()
+                raise
+            current = version
+    connection.executescript(f"begin; {SCHEMA_INDEXES} commit;")
+    return current
+
+
 def delete_schema(connection) -> None:
     cursor = connection.cursor()
     delete_tables = """
+        drop table if exists import_checkpoints;
+        drop table if exists user_product_totals;
         drop table if exists order_lines;
         drop table if exists products;
         drop table if exists orders;
@@ -45,31 +179,307 @@ def delete_schema(connection) -> None:
     connection.commit()
 
 
+_AGGREGATE_TOTALS = """
+    select o.user_id, sum(l.quantity) from orders o
+    join order_lines l on l.order_id = o.id group by o.user_id"""
+"""The full aggregation of the products purchased by each user."""
+
+
+def rebuild_totals(connection) -> int:
+    """
+    Rebuild the materialized `user_product_totals` from all orders.
+
+    The triggers maintain the totals when the order lines or orders are inserted or
+    deleted, the rebuild is needed only after changes bypassing them (e.g. bulk loads with
+    disabled triggers or the direct updates of quantities).
+
+    :param connection: A database connection object or provider.
+    :returns: The number of users with totals.
+    """
+    connection = connection_of(connection)
+    with transaction(connection):
+        connection.execute("delete from user_product_totals")
+        inserted = connection.execute(
+            f"insert into user_product_totals (user_id, total) {_AGGREGATE_TOTALS}"
+        )
+    return inserted.rowcount
+
+
+def check_totals(connection) -> list[tuple[UserID, int | None, int | None]]:
+    """
+    Compare the materialized `user_product_totals` with the full aggregation.
+
+    :param connection: A database connection object or provider.
+    :returns: The `(user_id, stored, expected)` of inconsistent users, empty when consistent.
+    """
+    connection = connection_of(connection)
+    # The users whose all order lines were deleted have the zero total.
+    statement = f"""
+        with expected (user_id, total) as ({_AGGREGATE_TOTALS})
+        select t.user_id, t.total, e.total from user_product_totals t
+        left join expected e on e.user_id = t.user_id
+        where t.total is not coalesce(e.total, 0)
+        union all
+        select e.user_id, null, e.total from expected e
+        where e.user_id not in (select user_id from user_product_totals)
+        order by 1"""
+    return connection.execute(statement).fetchall()
+
+
+@contextmanager
+def transaction(connection) -> Iterator[Any]:
+    """
+    The simple unit of work: the repositories sharing the connection do not
+    commit inside the block, the whole block is committed on exit or rolled
+    back when an exception is raised.
+
+    :param connection: A database connection object or provider, the connection
+        of the calling thread is used.
+    """
+    connection = connection_of(connection)
+    connection.execute("begin")
+    try:
+        yield connection
+    except BaseException:
+        connection.rollback()
+        raise
+    connection.commit()
+
+
+PRAGMAS: dict[str, Any] = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "busy_timeout": 5000,
+    "cache_size": -64 * 1024,
+    "temp_store": "memory",
+    "mmap_size": 256 * 1024 * 1024,
+}
+"""The default pragmas of pooled connections: the readers don't block the writer
+(and vice versa) in the WAL mode, the waiting for a lock is limited to 5 s, the page
+cache has 64 MiB and the file is read through the memory map of 256 MiB."""
+
+
+@dataclass(frozen=True, slots=True)
+class StorageProfile:
+    """
+    The value object with the settings of connections for a kind of work.
+
+    :param pragmas: The pragmas executed on each new connection.
+    :param defer_indexes: Build the secondary indexes after an import, see :func:`deferred_indexes`.
+    """
+
+    pragmas: dict[str, Any]
+    defer_indexes: bool = False
+
+
+PROFILES: dict[str, StorageProfile] = {
+    "default": StorageProfile(PRAGMAS),
+    # The import can be repeated, so the commits don't wait for the disk at all.
+    # The database may be corrupted by a power loss (not by a crash of the process).
+    "ingest": StorageProfile(
+        {
+            "journal_mode": "wal",
+            "synchronous": "off",
+            "busy_timeout": 5000,
+            "cache_size": -256 * 1024,
+            "temp_store": "memory",
+        },
+        defer_indexes=True,
+    ),
+    # The read-only connections of the queries with the file mapped to memory.
+    "serve": StorageProfile(
+        {
+            "journal_mode": "wal",
+            "busy_timeout": 5000,
+            "cache_size": -64 * 1024,
+            "temp_store": "memory",
+            "mmap_size": 1024 * 1024 * 1024,
+            "query_only": "on",
+        }
+    ),
+}
+"""The named storage profiles of :class:`ConnectionPool`."""
+
+
+class ConnectionPool(ConnectionProvider):
+    """
+    The provider of SQLite connections, one per thread.
+
+    The connection is opened with the pragmas of the profile when a thread asks
+    for it first and it is reused by the thread, so the repositories sharing the
+    pool can be used from many threads concurrently. Each in-memory database is
+    private to its connection, use a file (or a shared cache URI) for more threads.
+
+    :param database: The database file.
+    :param profile: The storage profile or the name of one of :data:`PROFILES`.
+    :param options: The other arguments of :func:`sqlite3.connect`.
+    """
+
+    def __init__(
+        self, database, profile: StorageProfile | str = "default", **options
+    ) -> None:
+        self.database = database
+        self.profile = PROFILES[profile] if isinstance(profile, str) else profile
+        # The connections are used by one thread, but they are closed by any thread.
+        self.options = {"check_same_thread": False, **options}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: list[sqlite3.Connection] = []
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        try:
+            return self._local.connection
+        except AttributeError:
+            pass
+        connection = sqlite3.connect(self.database, **self.options)
+        for name, value in self.profile.pragmas.items():
+            connection.execute(f"pragma {name} = {value}")
+        with self._lock:
+            self._connections.append(connection)
+        self._local.connection = connection
+        return connection
+
+    def __len__(self) -> int:
+        """The number of open connections."""
+        return len(self._connections)
+
+    def close(self) -> None:
+        """
+        Close all connections, the threads open new ones when asked again.
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for connection in connections:
+            connection.close()
+
+    def use(self, profile: StorageProfile | str) -> None:
+        """
+        Close all connections and open the new ones with the profile,
+        e.g. switch from the ingest to the serve profile after an import.
+
+        :param profile: The storage profile or the name of one of :data:`PROFILES`.
+        """
+        self.close()
+        self.profile = PROFILES[profile] if isinstance(profile, str) else profile
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def deferred_indexes(
+    connection, tables: Iterable[str] = ("orders", "order_lines")
+) -> ContextManager[list[str]]:
+    """
+    Drop the secondary indexes of the tables and create them again on exit.
+
+    Building an index once after a large import is faster than updating it for
+    each inserted row. The indexes are created again even when the block fails.
+    Inside an enclosing transaction (as in :meth:`StagingLoader.load`) the statements
+    are rolled back with it. Otherwise each statement is committed at once, so
+    when the process dies inside the block, the indexes stay dropped until
+    :func:`migrate_schema` creates them again.
+
+    :param connection: A database connection object or provider.
+    :param tables: The tables whose indexes are deferred.
+    :returns: The context manager of the names of the deferred indexes.
+    """
+    return _deferred(connection_of(connection), "index", tables)
+
+
+@contextmanager
+def _deferred(connection, kind: str, tables: Iterable[str]) -> Iterator[list[str]]:
+    """
+    Drop the schema objects (indexes or triggers) of the tables and create them again on exit.
+    """
+    statement = """
+        select name, sql from sqlite_master
+        where type = ? and sql is not null
+        and tbl_name in (select value from json_each(?))"""
+    objects = connection.execute(statement, (kind, json.dumps(list(tables)))).fetchall()
+    for name, _ in objects:
+        connection.execute(f"drop {kind} {name}")
+    try:
+        yield [name for name, _ in objects]
+    finally:
+        # Another connection may have created them again, see `migrate_schema`.
+        found = connection.execute(
+            "select name from sqlite_master where type = ?", (kind,)
+        )
+        existing = {row[0] for row in found}
+        for name, sql in objects:
+            if name not in existing:
+                connection.execute(sql)
+
+
 class ConflictError(Exception):
     """Raised when the entity is already present."""
 
 
+def _id_list(aggregate_ids: Iterable[int]) -> str:
+    """
+    Pack identifiers into a single JSON array parameter.
+
+    Used with `json_each(?)` the statement text stays the same for any number
+    of identifiers, so SQLite can reuse the prepared statement and we never
+    hit the host parameter limit.
+    """
+    return json.dumps(list(aggregate_ids))
+
+
 class UserRepository(AbstractRepository[User, UserID]):
     """
     The repository for users.
     """
 
-    def __init__(self, connection) -> None:
-        self.connection = connection
-
     def save(self, aggregate: User) -> None:
         statement = "insert into users (id, name, city) values (?, ?, ?);"
-        with self.connection as cursor:
+        with self._transaction() as cursor:
             cursor.execute(
                 statement, (aggregate.identifier, aggregate.name, aggregate.city)
             )
 
+    def save_missing(self, aggregates: Iterable[User]) -> int:
+        statement = "insert into users (id, name, city) values (?, ?, ?) on conflict (id) do nothing;"
+        with self._transaction() as cursor:
+            saved = cursor.executemany(
+                statement, ((_.identifier, _.name, _.city) for _ in aggregates)
+            )
+        return saved.rowcount
+
+    def merge(self, aggregates: Iterable[User]) -> int:
+        # The unchanged rows are not written.
+        statement = """
+            insert into users (id, name, city) values (?, ?, ?)
+            on conflict (id) do update set name = excluded.name, city = excluded.city
+            where name is not excluded.name or city is not excluded.city;"""
+        with self._transaction() as cursor:
+            merged = cursor.executemany(
+                statement, ((_.identifier, _.name, _.city) for _ in aggregates)
+            )
+        return merged.rowcount
+
     def find(self, aggregate_id: UserID) -> User | None:
-        return NotImplemented
+        statement = "select id, name, city from users where users.id = ?;"
+        with self._transaction() as cursor:
+            found = cursor.execute(statement, (aggregate_id,)).fetchone()
+        return None if found is None else User(*found)
+
+    def find_many(self, aggregate_ids: Iterable[UserID]) -> list[User]:
+        statement = """
+            select id, name, city from users
+            where id in (select value from json_each(?)) order by id;"""
+        with self._transaction() as cursor:
+            found = cursor.execute(statement, (_id_list(aggregate_ids),))
+            return [User(*row) for row in found]
 
     def exists(self, aggregate_id: UserID) -> bool:
         statement = "select id from users where users.id = ?;"
-        with self.connection as cursor:
+        with self._transaction() as cursor:
             result = cursor.execute(statement, (aggregate_id,))
         return result.fetchone() is not None
 
@@ -79,22 +489,50 @@ class ProductRepository(AbstractRepository[Product, ProductID]):
     The repository fo products.
     """
 
-    def __init__(self, connection) -> None:
-        self.connection = connection
-
     def save(self, aggregate: Product) -> None:
         statement = "insert into products (id, name, price) values (?, ?, ?);"
-        with self.connection as cursor:
+        with self._transaction() as cursor:
             cursor.execute(
                 statement, (aggregate.identifier, aggregate.name, aggregate.price)
             )
 
+    def save_missing(self, aggregates: Iterable[Product]) -> int:
+        statement = "insert into products (id, name, price) values (?, ?, ?) on conflict (id) do nothing;"
+        with self._transaction() as cursor:
+            saved = cursor.executemany(
+                statement, ((_.identifier, _.name, _.price) for _ in aggregates)
+            )
+        return saved.rowcount
+
+    def merge(self, aggregates: Iterable[Product]) -> int:
+        # The unchanged rows are not written.
+        statement = """
+            insert into products (id, name, price) values (?, ?, ?)
+            on conflict (id) do update set name = excluded.name, price = excluded.price
+            where name is not excluded.name or price is not excluded.price;"""
+        with self._transaction() as cursor:
+            merged = cursor.executemany(
+                statement, ((_.identifier, _.name, _.price) for _ in aggregates)
+            )
+        return merged.rowcount
+
     def find(self, aggregate_id: ProductID) -> Product | None:
-        return NotImplemented
+        statement = "select id, name, price from products where products.id = ?;"
+        with self._transaction() as cursor:
+            found = cursor.execute(statement, (aggregate_id,)).fetchone()
+        return None if found is None else Product(*found)
+
+    def find_many(self, aggregate_ids: Iterable[ProductID]) -> list[Product]:
+        statement = """
+            select id, name, price from products
+            where id in (select value from json_each(?)) order by id;"""
+        with self._transaction() as cursor:
+            found = cursor.execute(statement, (_id_list(aggregate_ids),))
+            return [Product(*row) for row in found]
 
     def exists(self, aggregate_id: ProductID) -> bool:
         statement = "select id from products where products.id = ?;"
-        with self.connection as cursor:
+        with self._transaction() as cursor:
             result = cursor.execute(statement, (aggregate_id,))
         return result.fetchone() is not None
 
@@ -104,65 +542,384 @@ class OrderRepository(AbstractRepository[Order, OrderID]):
     The repository for orders.
     """
 
-    def __init__(self, connection) -> None:
-        self.connection = connection
+    arraysize = 1000
+    """The number of rows fetched at once by the searches."""
 
     def save(self, *aggregates: Order) -> None:
-        with self.connection as cursor:
+        with self._transaction() as cursor:
             # Create an order records.
             statement1 = "insert into orders (id, user_id, created) values (?, ?, ?)"
             cursor.executemany(
                 statement1, ((_.identifier, _.user_id, _.created) for _ in aggregates)
             )
-            # Create order line records.
+            # Create order line records, streamed without building a list of all lines.
             statement2 = "insert into order_lines (order_id, product_id, quantity) values (?, ?, ?)"
-            order_lines = [
-                [
-                    (order.identifier, _.product_id, _.quantity)
-                    for _ in order.order_lines
-                ]
+            order_lines = (
+                (order.identifier, _.product_id, _.quantity)
                 for order in aggregates
-            ]
-            cursor.executemany(statement2, flatten(order_lines))
+                for _ in order.order_lines
+            )
+            cursor.executemany(statement2, order_lines)
 
     def find(self, aggregate_id: OrderID) -> Order | None:
-        return NotImplemented
+        statement = """
+            select o.id, o.created, o.user_id, l.product_id, l.quantity
+            from orders o left join order_lines l on o.id = l.order_id
+            where o.id = ?;"""
+        with self._transaction() as cursor:
+            found = cursor.execute(statement, (aggregate_id,))
+            return next(_orders_from_rows(found), None)
+
+    def find_many(self, aggregate_ids: Iterable[OrderID]) -> list[Order]:
+        statement = """
+            select o.id, o.created, o.user_id, l.product_id, l.quantity
+            from orders o left join order_lines l on o.id = l.order_id
+            where o.id in (select value from json_each(?)) order by o.id;"""
+        with self._transaction() as cursor:
+            found = cursor.execute(statement, (_id_list(aggregate_ids),))
+            return list(_orders_from_rows(found))
 
     def exists(self, aggregate_id: UserID) -> bool:
         statement = "select id from orders where orders.id = ?;"
-        with self.connection as cursor:
+        with self._transaction() as cursor:
             found = cursor.execute(statement, (aggregate_id,))
         result = found.fetchone() is not None
         return result
 
-    def find_between(self, since: Timestamp, till: Timestamp) -> Iterator[Order]:
+    def find_existing(self, aggregate_ids: Iterable[OrderID]) -> set[OrderID]:
+        statement = (
+            "select id from orders where id in (select value from json_each(?));"
+        )
+        with self._transaction() as cursor:
+            found = cursor.execute(statement, (_id_list(aggregate_ids),))
+        return {row[0] for row in found}
+
+    def find_between(
+        self,
+        since: Timestamp,
+        till: Timestamp,
+        after_id: OrderID | None = None,
+        limit: int | None = None,
+    ) -> Iterator[Order]:
+        """
+        Find orders in a specified range ordered by creation time and identifier.
+
+        The rows are fetched from the cursor in batches of :attr:`arraysize` and
+        the orders are yielded as soon as they are complete, so the memory doesn't
+        grow with the size of range.
+
+        :param since: The start of the range (inclusive).
+        :param till:  The end of the range (inclusive).
+        :param after_id: Return only orders after this one (the keyset pagination),
+            none when the order doesn't exist.
+        :param limit: The maximum number of orders to return.
+        :returns: The orders.
+        """
+        # Both tables are searched by their covering indexes (see `schema.sql`), the
+        # orders are sought by the keyset `(created, id)` and returned in its order.
+        if limit is None:
+            statement = """
+                select o.id, o.created, o.user_id, l.product_id, l.quantity
+                from orders o join order_lines l on o.id = l.order_id
+                where (o.created, o.id) > (?, ?) and o.created <= ?
+                order by o.created, o.id"""
+        else:
+            # The page of orders with lines is selected first, so the limit counts
+            # the orders. The rows are grouped by the order, so they are sorted again,
+            # the sort is bounded by the page.
+            statement = """
+                select o.id, o.created, o.user_id, l.product_id, l.quantity
+                from (
+                    select id, created, user_id from orders
+                    where (created, id) > (?, ?) and created <= ?
+                    and exists (select 1 from order_lines where order_id = orders.id)
+                    order by created, id limit ?
+                ) o cross join order_lines l on o.id = l.order_id
+                order by o.created, o.id"""
+        with self._transaction() as connection:
+            # The identifiers are not negative.
+            start = (since, -1)
+            if after_id is not None:
+                found = connection.execute(
+                    "select created from orders where id = ?;", (after_id,)
+                ).fetchone()
+                if found is None:
+                    return
+                start = max(start, (found[0], after_id))
+            parameters = (*start, till) if limit is None else (*start, till, limit)
+            cursor = connection.execute(statement, parameters)
+            cursor.arraysize = self.arraysize
+            try:
+                yield from _orders_from_rows(_fetch_batches(cursor))
+            finally:
+                cursor.close()
+
+    def find_ids_between(self, since: Timestamp, till: Timestamp) -> list[OrderID]:
+        statement = """
+            select id from orders where created between ? and ?
+            and exists (select 1 from order_lines where order_id = orders.id)
+            order by id"""
+        with self._transaction() as cursor:
+            found = cursor.execute(statement, (since, till))
+            return [row[0] for row in found]
+
+    def count_between(self, since: Timestamp, till: Timestamp) -> int:
+        statement = """
+            select count(*) from orders where created between ? and ?
+            and exists (select 1 from order_lines where order_id = orders.id)"""
+        with self._transaction() as cursor:
+            return cursor.execute(statement, (since, till)).fetchone()[0]
+
+
+def _fetch_batches(cursor) -> Iterator[tuple]:
+    """
+    Iterate over the cursor's rows fetched in batches of `cursor.arraysize`.
+    """
+    while rows := cursor.fetchmany():
+        yield from rows
+
+
+def _orders_from_rows(rows: Iterable[tuple]) -> Iterator[Order]:
+    """
+    Rebuild the orders from the joined rows in one pass.
+
+    The rows `(order_id, created, user_id, product_id, quantity)` must be grouped
+    by the order, the order without lines has a single row with `null` product.
+    """
+    # Group values by a key e.g. `{(15, 1542373774, 0): [(11, 1), (9, 1)]`.
+    #                                     order            order_lines
+    for key, group in groupby(rows, key=lambda x: (x[0], x[1], x[2])):
+        yield Order(
+            identifier=key[0],
+            user_id=key[2],
+            created=key[1],
+            order_lines=[
+                OrderLine(product_id=item[-2], quantity=item[-1])
+                for item in group
+                if item[-2] is not None
+            ],
+        )
+
+
+class CheckpointRepository(ConnectionMixin):
+    """
+    The repository for checkpoints of incremental imports, identified by the source file.
+
+    The checkpoint saved in the unit of work of imported entities is committed
+    (or rolled back) together with them. The checkpoints are value objects, not
+    entities, so it only mirrors the :class:`AbstractRepository` methods.
+
+    :param connection: A database connection object or provider.
+    """
+
+    def save(self, aggregate: Checkpoint) -> None:
+        statement = """
+            insert into import_checkpoints (source, fingerprint, byte_offset, last_order_id)
+            values (?, ?, ?, ?)
+            on conflict (source) do update set
+                fingerprint = excluded.fingerprint,
+                byte_offset = excluded.byte_offset,
+                last_order_id = excluded.last_order_id;"""
+        with self._transaction() as cursor:
+            cursor.execute(
+                statement,
+                (
+                    aggregate.source,
+                    aggregate.fingerprint,
+                    aggregate.offset,
+                    aggregate.last_order_id,
+                ),
+            )
+
+    def find(self, aggregate_id: str) -> Checkpoint | None:
+        statement = """
+            select source, fingerprint, byte_offset, last_order_id
+            from import_checkpoints where source = ?;"""
+        with self._transaction() as cursor:
+            found = cursor.execute(statement, (aggregate_id,)).fetchone()
+        return None if found is None else Checkpoint(*found)
+
+    def find_many(self, aggregate_ids: Iterable[str]) -> list[Checkpoint]:
+        statement = """
+            select source, fingerprint, byte_offset, last_order_id from import_checkpoints
+            where source in (select value from json_each(?)) order by source;"""
+        with self._transaction() as cursor:
+            found = cursor.execute(statement, (json.dumps(list(aggregate_ids)),))
+            return [Checkpoint(*row) for row in found]
+
+    def exists(self, aggregate_id: str) -> bool:
+        statement = "select source from import_checkpoints where source = ?;"
+        with self._transaction() as cursor:
+            found = cursor.execute(statement, (aggregate_id,))
+        return found.fetchone() is not None
+
+
+_STAGING_TABLES = """
+    create temp table if not exists staging_users (
+        id INTEGER PRIMARY KEY NOT NULL, name TEXT NOT NULL, city TEXT NOT NULL);
+    create temp table if not exists staging_products (
+        id INTEGER PRIMARY KEY NOT NULL, name TEXT NOT NULL, price INTEGER NOT NULL);
+    create temp table if not exists staging_orders (
+        id INTEGER PRIMARY KEY NOT NULL, user_id INTEGER NOT NULL, created TIMESTAMP(10) NOT NULL);
+    create temp table if not exists staging_order_lines (
+        order_id INTEGER NOT NULL, product_id INTEGER NOT NULL, quantity INTEGER NOT NULL);
+"""
+"""The staging tables keyed by the rowid only, so they have no indexes to maintain."""
+
+
+class StagingLoader:
+    """
+    The bulk load of large histories through the staging tables.
+
+    The entities are staged into the temporary tables of the connection, which
+    are not visible to other connections and have no secondary indexes. Then
+    :meth:`load` moves them into the stored tables in one transaction: the new
+    users and products are inserted, the foreign keys of the staged orders are
+    validated, the orders and lines are appended in the order of their keys with
+    the indexes and triggers of orders dropped, and finally the indexes are built,
+    the users' purchase totals are added in one pass and the triggers are created
+    again. When anything fails, the transaction is rolled back, so the stored tables
+    stay as they were.
+
+    The staging tables are kept in memory with the `temp_store = memory` pragma
+    (as in :data:`PROFILES`), use `temp_store = file` for histories larger than memory.
+    Rebuilding the indexes reads the whole tables, so the loader pays off for
+    the initial loads rather than for small increments.
+
+    :param connection: A database connection object or provider, the connection
+        of the calling thread is used.
+    :param defer_indexes: Build the indexes of orders at the end of the load.
+    """
+
+    def __init__(self, connection, defer_indexes: bool = True) -> None:
+        self.connection = connection_of(connection)
+        self.defer_indexes = defer_indexes
+
+    def __enter__(self) -> Self:
+        self.connection.executescript(_STAGING_TABLES)
+        return self
+
+    def __exit__(self, *args) -> None:
+        if self.connection.in_transaction:
+            self.connection.rollback()
+        self.connection.executescript(
+            """
+            drop table if exists temp.staging_users;
+            drop table if exists temp.staging_products;
+            drop table if exists temp.staging_orders;
+            drop table if exists temp.staging_order_lines;
+            """
+        )
+
+    def stage(
+        self,
+        users: Iterable[User],
+        products: Iterable[Product],
+        orders: Iterable[Order],
+    ) -> None:
         """
-        Find orders in a specified range.
+        Stage the entities, the first staged version of a user or product wins.
 
-        :param since: ...
-        :param till:  ...
-        :returns: ...
+        :raises:
+            :class:`ConflictError`: when an order is already staged.
         """
+        connection = self.connection
+        orders = list(orders)
         statement = """
-            select o.id,  o.created, o.user_id, l.product_id, l.quantity 
-            from orders o join order_lines l on o.id = l.order_id 
-            and o.created between ? and ? order by o.id"""
-        with self.connection as cursor:
-            found = cursor.execute(statement, (since, till)).fetchall()
-            from itertools import groupby
-            # This can be slow compared to better scheme e.g. denormalized view and query.
-            # But point of this exercise is not to make fastest code possible.
-
-            # Group values by a key e.g. `{(15, 1542373774, 0): [(11, 1), (9, 1)]`.
-            #                                     order            order_lines
-            for key, group in groupby(found, key=lambda x: (x[0], x[1], x[2])):
-                order = Order(
-                    identifier=key[0],
-                    user_id=key[2],
-                    created=key[1],
-                    order_lines=[
-                        OrderLine(product_id=item[-2], quantity=item[-1])
-                        for item in group
-                    ],
+            select min(id) from temp.staging_orders
+            where id in (select value from json_each(?))"""
+        ids = _id_list(_.identifier for _ in orders)
+        (duplicated,) = connection.execute(statement, (ids,)).fetchone()
+        if duplicated is not None:
+            raise ConflictError(f"Order {duplicated} is duplicated")
+        statement1 = """
+            insert into temp.staging_users (id, name, city) values (?, ?, ?)
+            on conflict (id) do nothing"""
+        connection.executemany(
+            statement1, ((_.identifier, _.name, _.city) for _ in users)
+        )
+        statement2 = """
+            insert into temp.staging_products (id, name, price) values (?, ?, ?)
+            on conflict (id) do nothing"""
+        connection.executemany(
+            statement2, ((_.identifier, _.name, _.price) for _ in products)
+        )
+        statement3 = (
+            "insert into temp.staging_orders (id, user_id, created) values (?, ?, ?)"
+        )
+        connection.executemany(
+            statement3, ((_.identifier, _.user_id, _.created) for _ in orders)
+        )
+        statement4 = """
+            insert into temp.staging_order_lines (order_id, product_id, quantity)
+            values (?, ?, ?)"""
+        order_lines = (
+            (order.identifier, _.product_id, _.quantity)
+            for order in orders
+            for _ in order.order_lines
+        )
+        connection.executemany(statement4, order_lines)
+        # Only the temporary tables are written, the commit doesn't sync the database file.
+        connection.commit()
+
+    def load(self) -> tuple[int, int, int, int]:
+        """
+        Move the staged entities into the stored tables in one transaction.
+
+        :returns: The numbers of inserted users, products, orders and order lines.
+        :raises:
+            :class:`ConflictError`: when a staged order already exists in database.
+            :class:`sqlite3.IntegrityError`: when a staged order references a missing user or product.
+        """
+        connection = self.connection
+        with transaction(connection):
+            conflicts = "select min(id) from temp.staging_orders where id in (select id from orders)"
+            (conflict,) = connection.execute(conflicts).fetchone()
+            if conflict is not None:
+                raise ConflictError(f"Order {conflict} already exists")
+            with (
+                _deferred(connection, "trigger", ["order_lines"]),
+                deferred_indexes(connection) if self.defer_indexes else nullcontext(),
+            ):
+                users = connection.execute(
+                    "insert into users (id, name, city) "
+                    "select id, name, city from temp.staging_users where true on conflict (id) do nothing"
+                ).rowcount
+                products = connection.execute(
+                    "insert into products (id, name, price) "
+                    "select id, name, price from temp.staging_products where true on conflict (id) do nothing"
+                ).rowcount
+                self._check_foreign_keys()
+                # The rows are appended in the order of the primary keys.
+                orders = connection.execute(
+                    "insert into orders (id, user_id, created) "
+                    "select id, user_id, created from temp.staging_orders order by id"
+                ).rowcount
+                order_lines = connection.execute(
+                    "insert into order_lines (order_id, product_id, quantity) "
+                    "select order_id, product_id, quantity from temp.staging_order_lines "
+                    "order by order_id, product_id"
+                ).rowcount
+                connection.execute(
+                    """
+                    insert into user_product_totals (user_id, total)
+                    select o.user_id, sum(l.quantity) from temp.staging_order_lines l
+                    join temp.staging_orders o on o.id = l.order_id group by o.user_id
+                    on conflict (user_id) do update set total = total + excluded.total"""
                 )
-                yield order
+        return users, products, orders, order_lines
+
+    def _check_foreign_keys(self) -> None:
+        """
+        Validate the references of the staged orders and lines in one pass over them.
+        """
+        statement = """
+            select 'order ' || id || ' references missing user ' || user_id
+            from temp.staging_orders where user_id not in (select id from users)
+            union all
+            select 'order ' || order_id || ' references missing product ' || product_id
+            from temp.staging_order_lines where product_id not in (select id from products)
+            limit 1"""
+        found = self.connection.execute(statement).fetchone()
+        if found is not None:
+            raise sqlite3.IntegrityError(f"FOREIGN KEY constraint failed: {found[0]}")
@@ -18,7 +18,7 @@ CREATE TABLE IF NOT EXISTS version (
     )
 );
 
-INSERT INTO VERSION (major, minor, patch) VALUES (0, 1, 0);
+INSERT INTO VERSION (major, minor, patch) VALUES (0, 5, 0);
 
 -- The users of our application placing the orders. 
 CREATE TABLE IF NOT EXISTS users (
@@ -51,3 +51,51 @@ CREATE TABLE IF NOT EXISTS order_lines (
     CONSTRAINT fk_products FOREIGN KEY(product_id) REFERENCES products(id) ON DELETE CASCADE,
     CONSTRAINT pk_order_lines PRIMARY KEY (order_id, product_id)
 );
+
+-- The covering index for the date range searches ordered by the creation time and `id`.
+CREATE INDEX IF NOT EXISTS orders_created_index ON orders (created, id, user_id);
+
+-- The index for searches of user's orders.
+CREATE INDEX IF NOT EXISTS orders_user_id_index ON orders (user_id);
+
+-- The covering index for loading order lines of orders.
+CREATE INDEX IF NOT EXISTS order_lines_order_id_index ON order_lines (order_id, product_id, quantity);
+
+-- The number of products purchased by each user, maintained by the triggers below.
+CREATE TABLE IF NOT EXISTS user_product_totals (
+    user_id INTEGER PRIMARY KEY NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0
+);
+
+-- The index for the top users searches, ties are ordered by the user.
+CREATE INDEX IF NOT EXISTS user_product_totals_total_index ON user_product_totals (total DESC, user_id);
+
+CREATE TRIGGER IF NOT EXISTS order_lines_insert_totals AFTER INSERT ON order_lines
+BEGIN
+    INSERT INTO user_product_totals (user_id, total)
+        SELECT user_id, NEW.quantity FROM orders WHERE id = NEW.order_id
+        ON CONFLICT (user_id) DO UPDATE SET total = total + excluded.total;
+END;
+
+CREATE TRIGGER IF NOT EXISTS order_lines_delete_totals AFTER DELETE ON order_lines
+BEGIN
+    UPDATE user_product_totals SET total = total - OLD.quantity
+        WHERE user_id = (SELECT user_id FROM orders WHERE id = OLD.order_id);
+END;
+
+-- The deleted order's lines are subtracted before they are deleted by the cascade,
+-- then the order is gone and the trigger above doesn't find their user.
+CREATE TRIGGER IF NOT EXISTS orders_delete_totals BEFORE DELETE ON orders
+BEGIN
+    UPDATE user_product_totals SET total = total - (
+        SELECT coalesce(sum(quantity), 0) FROM order_lines WHERE order_id = OLD.id
+    ) WHERE user_id = OLD.user_id;
+END;
+
+-- The positions of the incremental imports of growing files, see `Checkpoint`.
+CREATE TABLE IF NOT EXISTS import_checkpoints (
+    source TEXT PRIMARY KEY NOT NULL,
+    fingerprint TEXT NOT NULL,
+    byte_offset INTEGER NOT NULL CHECK(byte_offset >= 0),
+    last_order_id INTEGER
+);
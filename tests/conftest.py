@@ -0,0 +1,67 @@
+import json
+import sqlite3 as db
+from pathlib import Path
+
+import pytest
+
+from company.orders import create_schema
+
+SCHEMA_PATH = (
+    Path(__file__).resolve().parents[1] / "src" / "company" / "orders" / "schema.sql"
+)
+
+RECORDS = [
+    {
+        "id": 1,
+        "created": 1542328144,
+        "products": [
+            {"id": 0, "name": "Product A", "price": 160},
+            {"id": 8, "name": "Product I", "price": 80},
+            {"id": 0, "name": "Product A", "price": 160},
+        ],
+        "user": {"id": 3, "name": "User D", "city": "Sydney"},
+    },
+    {
+        "id": 2,
+        "created": 1544115833,
+        "products": [{"id": 3, "name": "Product D", "price": 130}],
+        "user": {"id": 0, "name": "User A", "city": "Prague"},
+    },
+    {
+        "id": 3,
+        "created": 1540143218,
+        "products": [
+            {"id": 8, "name": "Product I", "price": 80},
+            {"id": 3, "name": "Product D", "price": 130},
+        ],
+        "user": {"id": 3, "name": "User D", "city": "Sydney"},
+    },
+]
+
+
+@pytest.fixture
+def connect():
+    """Return a factory of new in-memory databases with the schema."""
+    connections = []
+
+    def factory():
+        connection = db.connect(":memory:")
+        create_schema(connection, SCHEMA_PATH.read_text(encoding="utf8"))
+        connections.append(connection)
+        return connection
+
+    yield factory
+    for connection in connections:
+        connection.close()
+
+
+@pytest.fixture
+def connection(connect):
+    return connect()
+
+
+@pytest.fixture
+def orders_file(tmp_path):
+    path = tmp_path / "orders.jsonl"
+    path.write_text("\n".join(json.dumps(_) for _ in RECORDS), encoding="utf8")
+    return path
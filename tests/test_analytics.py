@@ -0,0 +1,89 @@
+import datetime
+
+import pytest
+
+from company.orders import (
+    ColumnarAnalytics,
+    OrderRepository,
+    OrderService,
+    ProductRepository,
+    SQLAnalytics,
+    UserRepository,
+)
+from company.orders._analytics import HAS_NUMPY
+
+BACKENDS = ["sql", "columnar", "numpy"]
+
+
+@pytest.fixture
+def imported(connection, orders_file):
+    OrderService(
+        user_repository=UserRepository(connection),
+        product_repository=ProductRepository(connection),
+        order_repository=OrderRepository(connection),
+    ).bulk_insert_orders(orders_file)
+    return connection
+
+
+def analytics(connection, backend):
+    if backend == "sql":
+        return SQLAnalytics(connection)
+    if backend == "numpy" and not HAS_NUMPY:
+        pytest.skip("The numpy is not installed")
+    return ColumnarAnalytics.from_connection(connection, use_numpy=backend == "numpy")
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_queries_without_window(imported, backend):
+    queries = analytics(imported, backend)
+    assert queries.top_users(3) == [(3, 5), (0, 1)]
+    assert queries.top_users(1) == [(3, 5)]
+    assert queries.revenue_by_city() == [("Sydney", 610), ("Prague", 130)]
+    assert queries.product_popularity(10) == [(0, 2), (3, 2), (8, 2)]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_queries_in_window(imported, backend):
+    queries = analytics(imported, backend)
+    assert queries.top_users(3, 1540143218, 1542328144) == [(3, 5)]
+    assert queries.revenue_by_city(since=1540143218, till=1542328144) == [
+        ("Sydney", 610)
+    ]
+    assert queries.product_popularity(10, till=1542328144) == [(0, 2), (8, 2), (3, 1)]
+    assert queries.product_popularity(10, since=1542328145) == [(3, 1)]
+    assert queries.top_users(3, till=0) == []
+    assert queries.revenue_by_city(since=1544115834) == []
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_columnar_analytics_ignores_unknown_references(use_numpy):
+    if use_numpy and not HAS_NUMPY:
+        pytest.skip("The numpy is not installed")
+    queries = ColumnarAnalytics(
+        users=[(1, "User A", "Prague")],
+        products=[(1, "Product A", 10)],
+        orders=[(5, 1, 100), (6, 2, 50)],
+        order_lines=[(5, 1, 2), (6, 9, 3), (7, 1, 1)],
+        use_numpy=use_numpy,
+    )
+    assert len(queries) == 2
+    assert queries.top_users(3) == [(2, 3), (1, 2)]
+    assert queries.revenue_by_city() == [("Prague", 20)]
+    assert queries.product_popularity(3) == [(9, 3), (1, 2)]
+
+
+@pytest.mark.service
+def test_order_service_queries_analytics(imported):
+    service = OrderService(
+        user_repository=UserRepository(imported),
+        product_repository=ProductRepository(imported),
+        order_repository=OrderRepository(imported),
+        analytics=SQLAnalytics(imported),
+    )
+    since = datetime.datetime(2018, 10, 1)
+    till = datetime.datetime(2018, 11, 30)
+    assert service.top_users(limit=3, since=since, till=till) == [(3, 5)]
+    assert service.revenue_by_city(till=till) == [("Sydney", 610)]
+    assert service.product_popularity(limit=1) == [(0, 2)]
+    with pytest.raises(RuntimeError):
+        OrderService(None, None, None).top_users()
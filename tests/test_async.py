@@ -0,0 +1,152 @@
+import asyncio
+import datetime
+import time
+from functools import partial
+
+import pytest
+
+from company.orders import (
+    AsyncOrderService,
+    AsyncRepository,
+    AsyncRunner,
+    ConnectionPool,
+    OrderRepository,
+    OrderService,
+    ProductRepository,
+    UserRepository,
+    create_schema,
+    transaction,
+)
+
+from conftest import SCHEMA_PATH
+
+
+@pytest.fixture
+def connections(tmp_path):
+    with ConnectionPool(tmp_path / "orders.sqlite") as connections:
+        create_schema(connections.connection, SCHEMA_PATH.read_text(encoding="utf8"))
+        yield connections
+
+
+@pytest.fixture
+def service(connections, orders_file):
+    service = OrderService(
+        user_repository=UserRepository(connections),
+        product_repository=ProductRepository(connections),
+        order_repository=OrderRepository(connections),
+        unit_of_work=partial(transaction, connections),
+    )
+    service.batch_insert_orders(orders_file)
+    return service
+
+
+@pytest.mark.service
+def test_async_order_service_matches_service(service, connections):
+    since, till = datetime.datetime(2018, 1, 1), datetime.datetime(2019, 1, 1)
+
+    async def run():
+        with AsyncRunner(
+            max_workers=2, connections=connections, batch_size=2
+        ) as runner:
+            facade = AsyncOrderService(service, runner)
+            orders = [_ async for _ in facade.search_orders_by_date(since, till)]
+            users = [
+                _
+                async for _ in facade.search_users_with_most_products(
+                    connections, limit=2
+                )
+            ]
+            count = await facade.count_orders_by_date(since, till)
+            return orders, users, count
+
+    orders, users, count = asyncio.run(run())
+    assert orders == list(service.search_orders_by_date(since, till))
+    assert users == list(service.search_users_with_most_products(connections, limit=2))
+    assert count == len(orders) == 3
+
+
+@pytest.mark.service
+def test_async_results_fetch_each_batch_by_keyset(service, connections):
+    since, till = datetime.datetime(2018, 1, 1), datetime.datetime(2019, 1, 1)
+    expected = [_.identifier for _ in service.search_orders_by_date(since, till)]
+    calls = []
+
+    def search(*args, **kwargs):
+        calls.append((kwargs["after_id"], kwargs["limit"]))
+        return service.search_orders_by_date(*args, **kwargs)
+
+    async def run(**kwargs):
+        with AsyncRunner(
+            max_workers=2, connections=connections, batch_size=2
+        ) as runner:
+            return [
+                _.identifier
+                async for _ in runner.iterate(search, since, till, **kwargs)
+            ]
+
+    assert asyncio.run(run()) == expected
+    assert calls == [(None, 2), (expected[1], 2)]
+    calls.clear()
+    assert asyncio.run(run(after_id=expected[0], limit=1)) == expected[1:2]
+    assert calls == [(expected[0], 1)]
+
+
+@pytest.mark.service
+def test_async_repository_closes_abandoned_iteration(service, connections):
+    async def run():
+        with AsyncRunner(connections=connections, batch_size=1) as runner:
+            orders = AsyncRepository(OrderRepository(connections), runner)
+            found = await orders.find(1)
+            results = orders.find_between(0, 2**40)
+            first = await anext(results)
+            await results.aclose()
+            return found, first, [_ async for _ in results]
+
+    found, first, rest = asyncio.run(run())
+    assert (found.identifier, first.identifier, rest) == (1, 3, [])  # The oldest first.
+
+
+@pytest.mark.service
+def test_async_runner_interrupts_timed_out_call(connections):
+    # The statement would run for minutes when not interrupted.
+    statement = """
+        with recursive numbers (n) as (select 1 union all select n + 1 from numbers)
+        select count(*) from numbers"""
+
+    def count() -> int:
+        return connections.connection.execute(statement).fetchone()[0]
+
+    async def run():
+        with AsyncRunner(max_workers=1, connections=connections) as runner:
+            with pytest.raises(TimeoutError):
+                await runner.call(count, timeout=0.1)
+            # The only thread is released for the next call.
+            return await runner.call(
+                lambda: connections.connection.execute("select 1").fetchone()
+            )
+
+    start = time.perf_counter()
+    assert asyncio.run(run()) == (1,)
+    assert time.perf_counter() - start < 5
+
+
+@pytest.mark.service
+def test_async_runner_cancels_iteration(connections):
+    statement = """
+        with recursive numbers (n) as (select 1 union all select n + 1 from numbers)
+        select n from numbers where n < 0"""
+
+    def search(after_id=None, limit=None):
+        yield from connections.connection.execute(statement)
+
+    async def run():
+        with AsyncRunner(max_workers=1, connections=connections) as runner:
+            task = asyncio.ensure_future(anext(runner.iterate(search)))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    assert time.perf_counter() - start < 5
@@ -0,0 +1,225 @@
+import pytest
+
+import datetime
+import json
+from functools import partial
+
+from company.orders import (
+    CachedRepository,
+    CheckpointRepository,
+    LRUCache,
+    Order,
+    OrderRepository,
+    OrderService,
+    ProductRepository,
+    QueryCache,
+    User,
+    UserRepository,
+    transaction,
+)
+from company.orders._domain import OrderLine
+
+from conftest import RECORDS
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put(1, "a")
+    cache.put(2, "b")
+    assert cache.get(1) == "a"
+    cache.put(3, "c")
+    assert 2 not in cache
+    assert cache.get(2) is None
+    assert (cache.stats().hits, cache.stats().misses) == (1, 1)
+
+
+def test_lru_cache_invalidation():
+    cache = LRUCache()
+    cache.put(1, "a")
+    cache.put(2, "b")
+    cache.invalidate(1)
+    assert len(cache) == 1
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_lru_cache_size_must_be_positive():
+    with pytest.raises(ValueError):
+        LRUCache(maxsize=0)
+
+
+class CountingRepository(UserRepository):
+    def __init__(self, connection) -> None:
+        super().__init__(connection)
+        self.calls = 0
+
+    def exists(self, aggregate_id) -> bool:
+        self.calls += 1
+        return super().exists(aggregate_id)
+
+
+def test_cached_repository_exists_hits_storage_once(connection):
+    repository = CountingRepository(connection)
+    cached = CachedRepository(repository)
+    repository.save(User(1, "User A", "Prague"))
+    assert all(cached.exists(1) for _ in range(5))
+    assert repository.calls == 1
+    assert (cached.stats().hits, cached.stats().misses) == (4, 1)
+
+
+def test_cached_repository_does_not_cache_missing_entity(connection):
+    repository = CountingRepository(connection)
+    cached = CachedRepository(repository)
+    assert not cached.exists(1)
+    repository.save(User(1, "User A", "Prague"))
+    assert cached.exists(1)
+
+
+def test_cached_repository_remembers_saved_entities(connection):
+    repository = CountingRepository(connection)
+    cached = CachedRepository(repository)
+    cached.save(User(1, "User A", "Prague"))
+    cached.save_missing([User(1, "User A", "Prague"), User(2, "User B", "Sydney")])
+    assert cached.exists(1) and cached.exists(2)
+    assert repository.calls == 0
+    cached.invalidate(2)
+    assert cached.exists(2)
+    assert repository.calls == 1
+
+
+def test_cached_repository_find_many_fetches_missing_entities(connection):
+    repository = UserRepository(connection)
+    repository.save_missing([User(_, f"User {_}", "Prague") for _ in range(1, 4)])
+    cached = CachedRepository(repository)
+    assert cached.find(2).name == "User 2"
+    found = cached.find_many([3, 2, 1, 4])
+    assert [_.identifier for _ in found] == [1, 2, 3]
+    assert (cached.stats().hits, cached.stats().misses) == (1, 4)
+    assert cached.find(1) is found[0]
+
+
+def test_query_cache_expires_results():
+    now = [0.0]
+    cache = QueryCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.put(("top", 3), ("a",))
+    assert cache.get(("top", 3)) == ("a",)
+    now[0] = 10
+    assert cache.get(("top", 3)) is None
+    assert len(cache) == 0
+    assert cache.stats("top").hit_rate == 0.5
+
+
+def test_query_cache_invalidates_overlapping_ranges():
+    cache = QueryCache(ttl=None)
+    cache.put(("search", 1), "a", 100, 200)
+    cache.put(("search", 2), "b", 300, 400)
+    cache.put(("top", 3), "c")
+    assert cache.invalidate_orders([250, 401]) == 1  # The results without a range.
+    assert cache.invalidate_orders([150]) == 1
+    assert [cache.get(("search", 1)), cache.get(("search", 2))] == [None, "b"]
+    assert cache.invalidations == 2
+
+
+def test_query_cache_invalidates_unranged_results():
+    cache = QueryCache(ttl=None)
+    cache.put(("search", 1), "a", 100, 200)
+    cache.put(("top", 3), "c")
+    assert cache.invalidate_unranged() == 1
+    assert [cache.get(("search", 1)), cache.get(("top", 3))] == ["a", None]
+
+
+def test_query_cache_drops_results_read_before_invalidation():
+    cache = QueryCache(ttl=None)
+    generation = cache.generation
+    cache.invalidate_orders([150])  # Saved while the result was being read.
+    assert not cache.put(("search", 1), "a", 100, 200, generation)
+    assert cache.get(("search", 1)) is None
+    assert cache.put(("search", 1), "a", 100, 200, cache.generation)
+
+
+def test_service_query_cache_is_invalidated_by_saved_orders(connection, orders_file):
+    cache = QueryCache()
+    service = OrderService(
+        user_repository=UserRepository(connection),
+        product_repository=ProductRepository(connection),
+        order_repository=OrderRepository(connection),
+        unit_of_work=partial(transaction, connection),
+        query_cache=cache,
+    )
+    service.batch_insert_orders(orders_file)
+    november = (datetime.datetime(2018, 11, 1), datetime.datetime(2018, 11, 30))
+    december = (datetime.datetime(2018, 12, 1), datetime.datetime(2018, 12, 31))
+    searches = [
+        lambda **_: [
+            o.identifier for o in service.search_orders_by_date(*november, **_)
+        ],
+        lambda **_: service.count_orders_by_date(*december, **_),
+        lambda **_: [
+            u.identifier
+            for u in service.search_users_with_most_products(connection, 1, **_)
+        ],
+    ]
+    assert [search() for search in searches] == [[1], 1, [3]]
+    assert [search() for search in searches] == [[1], 1, [3]]
+    assert (cache.stats().hits, cache.stats().misses) == (3, 3)
+    assert cache.stats("count_orders_by_date").hit_rate == 0.5
+
+    with transaction(connection):
+        # The order in November invalidates the November search and the top users only.
+        service._order_repository.save(Order(9, 0, [OrderLine(3, 5)], 1542328144))
+    assert len(cache) == 1
+    assert [search(cache=False) for search in searches] == [[1, 9], 1, [0]]
+    assert [search() for search in searches] == [[1, 9], 1, [0]]
+    assert cache.stats().hits == 4
+
+
+def test_service_query_cache_is_invalidated_after_commit(connection, orders_file):
+    cache = QueryCache()
+    service = OrderService(
+        user_repository=UserRepository(connection),
+        product_repository=ProductRepository(connection),
+        order_repository=OrderRepository(connection),
+        unit_of_work=partial(transaction, connection),
+        query_cache=cache,
+    )
+    service.batch_insert_orders(orders_file)
+    assert [
+        u.identifier for u in service.search_users_with_most_products(connection, 1)
+    ] == [3]
+
+    with service._unit_of_work():
+        service._order_repository.save(Order(9, 0, [OrderLine(3, 5)], 1542328144))
+        # The results are invalidated when the order is committed.
+        assert len(cache) == 1
+    assert len(cache) == 0
+
+    assert len(list(service.search_users_with_most_products(connection, 1))) == 1
+    with pytest.raises(RuntimeError, match="rolled back"), service._unit_of_work():
+        service._order_repository.save(Order(10, 0, [OrderLine(3, 5)], 1542328144))
+        raise RuntimeError("rolled back")
+    assert len(cache) == 0
+
+
+def test_service_query_cache_is_invalidated_by_merged_users(connection, orders_file):
+    cache = QueryCache()
+    service = OrderService(
+        user_repository=UserRepository(connection),
+        product_repository=ProductRepository(connection),
+        order_repository=OrderRepository(connection),
+        unit_of_work=partial(transaction, connection),
+        query_cache=cache,
+        checkpoint_repository=CheckpointRepository(connection),
+    )
+    service.incremental_insert_orders(orders_file)
+    assert [u.city for u in service.search_users_with_most_products(connection, 1)] == [
+        "Sydney"
+    ]
+
+    # The stored orders are imported again with the changed user only.
+    moved = {"id": 3, "name": "User D", "city": "Perth"}
+    records = [{**_, "user": moved} if _["user"]["id"] == 3 else _ for _ in RECORDS]
+    orders_file.write_text("\n".join(json.dumps(_) for _ in records), encoding="utf8")
+    service.incremental_insert_orders(orders_file, merge=True)
+    assert [u.city for u in service.search_users_with_most_products(connection, 1)] == [
+        "Perth"
+    ]
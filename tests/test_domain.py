@@ -121,6 +121,69 @@ def test_order_factory_method_returns_success():
     assert isinstance(result, Order)
 
 
+@pytest.mark.domain
+def test_order_lines_are_tuple_without_duplicates():
+    lines = [OrderLine(2, 1), OrderLine(1, 1), OrderLine(2, 1)]
+    order = Order(1, user_id=1, created=5, order_lines=iter(lines))
+    assert order.order_lines == (OrderLine(2, 1), OrderLine(1, 1))
+    assert order.order_lines is order.order_lines
+
+
+@pytest.mark.domain
+def test_order_caches_sorted_products_once():
+    order = Order(1, user_id=1, created=5, order_lines=[OrderLine(3), OrderLine(1)])
+    same = Order(2, user_id=1, created=5, order_lines=[OrderLine(1), OrderLine(3)])
+    other = Order(3, user_id=1, created=5, order_lines=[OrderLine(1)])
+    assert order._product_ids is None
+    assert order.has_product(3) and not order.has_product(2)
+    products = order._product_ids
+    assert products == [1, 3]
+    assert order.has_same_products(same) and not order.has_same_products(other)
+    assert order._product_ids is products
+
+
+# ######################################################################### #
+#                                  Entity                                   #
+# ######################################################################### #
+
+
+ENTITIES = [
+    User(1, "User A", "Prague"),
+    Product(1, "Product A", 10),
+    Order(1, user_id=1, created=5, order_lines=[OrderLine(1, 2)]),
+]
+
+
+@pytest.mark.domain
+@pytest.mark.parametrize("entity", ENTITIES)
+def test_entities_have_no_instance_dictionary(entity):
+    assert not hasattr(entity, "__dict__")
+    with pytest.raises(AttributeError):
+        entity.note = "not declared in the slots"
+
+
+@pytest.mark.domain
+def test_entities_equal_by_type_and_identifier():
+    user, product, order = ENTITIES
+    assert len({user, product, order}) == 3
+    assert user != product
+    assert User(1, "User B", "Sydney") in {user}
+    assert hash(order) == hash(Order(1, user_id=2, created=6, order_lines=[]))
+
+
+@pytest.mark.domain
+def test_entities_format_public_fields():
+    assert (
+        str(User(1, "User A", "Prague")) == "User(city=Prague,identifier=1,name=User A)"
+    )
+    assert (
+        repr(Product(2, "Product A", 10))
+        == "Product(identifier=2,name=Product A,price=10)"
+    )
+    order = Order(3, user_id=1, created=5, order_lines=[OrderLine(1, 2)])
+    assert str(order).startswith("Order(created=5,identifier=3,order_lines=(OrderLine(")
+
+
 # FIXME
 # @pytest.mark.domain
 # def test_order_factory_method_returns_failure():
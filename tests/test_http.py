@@ -0,0 +1,132 @@
+import http.client
+import json
+import threading
+from functools import partial
+
+import pytest
+
+from company.orders import (
+    ConnectionPool,
+    OrderRepository,
+    OrderServer,
+    OrderService,
+    ProductRepository,
+    UserRepository,
+    create_schema,
+    transaction,
+)
+
+from conftest import RECORDS, SCHEMA_PATH
+
+
+@pytest.fixture
+def client(tmp_path):
+    with ConnectionPool(tmp_path / "orders.sqlite") as connections:
+        create_schema(connections.connection, SCHEMA_PATH.read_text(encoding="utf8"))
+        service = OrderService(
+            user_repository=UserRepository(connections),
+            product_repository=ProductRepository(connections),
+            order_repository=OrderRepository(connections),
+            unit_of_work=partial(transaction, connections),
+        )
+        server = OrderServer(("127.0.0.1", 0), service, connections, workers=2)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        # One kept-alive connection for all requests.
+        client = http.client.HTTPConnection(*server.server_address[:2], timeout=5)
+        yield client
+        client.close()
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def request(client, method: str, url: str, body: str | None = None) -> tuple[int, str]:
+    client.request(method, url, body=body)
+    response = client.getresponse()
+    return response.status, response.read().decode("utf8")
+
+
+@pytest.mark.service
+def test_server_imports_and_searches_orders(client):
+    body = "\n".join(json.dumps(_) for _ in RECORDS)
+    status, imported = request(client, "POST", "/orders?chunk_size=2", body)
+    assert status == 201
+    assert json.loads(imported) == {
+        "orders": 3,
+        "order_lines": 5,
+        "users": 2,
+        "products": 3,
+        "chunks": 2,
+    }
+
+    status, found = request(
+        client, "GET", "/orders?since=2018-11-01T00:00&till=2018-12-31T00:00"
+    )
+    orders = [json.loads(_) for _ in found.splitlines()]
+    assert status == 200
+    assert [_["id"] for _ in orders] == [1, 2]
+    assert orders[0] == {
+        "id": 1,
+        "created": 1542328144,
+        "user_id": 3,
+        "order_lines": [
+            {"product_id": 0, "quantity": 2},
+            {"product_id": 8, "quantity": 1},
+        ],
+    }
+
+    status, top = request(client, "GET", "/users/top?limit=1")
+    assert (status, json.loads(top)) == (
+        200,
+        [{"id": 3, "name": "User D", "city": "Sydney"}],
+    )
+
+    status, metrics = request(client, "GET", "/metrics")
+    latencies = json.loads(metrics)["latencies"]
+    assert [
+        latencies[_]["count"] for _ in ("POST /orders", "GET /orders", "GET /users/top")
+    ] == [1, 1, 1]
+
+
+@pytest.mark.service
+@pytest.mark.parametrize(
+    "method, url, body, expected",
+    [
+        ("GET", "/orders?till=2018-11-01T00:00", None, 400),
+        ("GET", "/orders?since=2018&till=2018-11-01T00:00", None, 400),
+        ("POST", "/orders", '{"id": 1}', 400),
+        ("POST", "/orders", "\n".join(json.dumps(_) for _ in RECORDS * 2), 409),
+        ("GET", "/unknown", None, 404),
+        ("GET", "/orders?since=2018-11-01&till=2018-12-01&limit=-1", None, 400),
+        ("GET", "/users/top?limit=0", None, 400),
+        ("POST", "/orders?chunk_size=0", '{"id": 1}', 400),
+    ],
+)
+def test_server_reports_errors(client, method, url, body, expected):
+    status, error = request(client, method, url, body)
+    assert status == expected
+    assert set(json.loads(error)) == {"error", "message"}
+    # The connection is kept alive after the error.
+    assert request(client, "GET", "/users/top")[0] == 200
+
+
+@pytest.mark.service
+@pytest.mark.parametrize(
+    "header, value, expected",
+    [
+        ("Content-Length", "-1", 400),
+        ("Content-Length", "1e3", 400),
+        ("Transfer-Encoding", "chunked", 411),
+    ],
+)
+def test_server_rejects_body_of_invalid_length(client, header, value, expected):
+    client.putrequest("POST", "/orders")
+    client.putheader(header, value)
+    client.endheaders()
+    response = client.getresponse()
+    assert response.status == expected
+    assert set(json.loads(response.read())) == {"error", "message"}
+    # The unread body is skipped by closing the connection, the client opens a new one.
+    assert response.getheader("Connection") == "close"
+    assert request(client, "GET", "/users/top")[0] == 200
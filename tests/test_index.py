@@ -0,0 +1,89 @@
+import datetime
+
+import pytest
+
+from company.orders import (
+    IndexedOrderRepository,
+    Order,
+    OrderRepository,
+    OrderService,
+    ProductRepository,
+    TimestampIndex,
+    UserRepository,
+)
+from company.orders._domain import OrderLine
+from company.orders._index import MERGE_THRESHOLD
+
+
+def test_index_finds_and_counts_orders_in_range():
+    index = TimestampIndex([(30, 3), (10, 1), (20, 2), (20, 7)])
+    assert index.find_between(10, 20) == [1, 2, 7]
+    assert index.find_between(11, 30) == [2, 3, 7]
+    assert index.count_between(20, 20) == 2
+    assert index.count_between(31, 40) == 0
+    assert index.count_between(30, 10) == 0
+
+
+@pytest.mark.parametrize("count", [1, MERGE_THRESHOLD + 1])
+def test_index_keeps_sorted_when_adding_older_orders(count):
+    index = TimestampIndex([(100, 1000), (200, 2000)])
+    index.add([(300, 3000)])  # Appended.
+    index.add((150 - _, _) for _ in range(count))
+    assert list(index.created) == sorted(index.created)
+    assert len(index) == 3 + count
+    assert index.find_between(150, 300) == [0, 2000, 3000]
+
+
+@pytest.fixture
+def indexed(connection):
+    connection.execute("insert into users values (1, 'User A', 'Prague')")
+    connection.execute("insert into products values (1, 'Product A', 10)")
+    OrderRepository(connection).save(
+        Order(5, user_id=1, created=1542328144, order_lines=[OrderLine(1, 2)])
+    )
+    return IndexedOrderRepository(
+        OrderRepository(connection), TimestampIndex.from_connection(connection)
+    )
+
+
+def test_indexed_repository_answers_from_index(indexed, connection):
+    indexed.save(Order(7, user_id=1, created=1542328145, order_lines=[OrderLine(1, 1)]))
+    indexed.save(Order(9, user_id=1, created=1542328145, order_lines=[]))
+    statements = []
+    connection.set_trace_callback(statements.append)
+    assert indexed.find_ids_between(1542328144, 1542328145) == [5, 7]
+    assert indexed.count_between(1542328145, 1542328146) == 1
+    assert statements == []
+    connection.set_trace_callback(None)
+    stored = OrderRepository(connection)
+    assert indexed.find_ids_between(0, 2**40) == stored.find_ids_between(0, 2**40)
+    assert indexed.count_between(0, 2**40) == stored.count_between(0, 2**40)
+    # The order without lines is not found like by the search of orders.
+    found = [_.identifier for _ in stored.find_between(0, 2**40)]
+    assert indexed.find_ids_between(0, 2**40) == sorted(found) == [5, 7]
+    assert list(TimestampIndex.from_connection(connection).order_ids) == [5, 7]
+    assert indexed.exists(7)  # Delegated.
+
+
+def test_index_loads_pairs_in_covering_index_order(indexed, connection):
+    statements = []
+    connection.set_trace_callback(statements.append)
+    TimestampIndex.from_connection(connection)
+    connection.set_trace_callback(None)
+    (statement,) = statements
+    plan = [row[-1] for row in connection.execute(f"explain query plan {statement}")]
+    assert plan[0] == "SCAN orders USING COVERING INDEX orders_created_index"
+    assert not any("TEMP B-TREE" in _ for _ in plan)
+
+
+@pytest.mark.service
+def test_order_service_searches_ids_and_counts(indexed, connection):
+    service = OrderService(
+        user_repository=UserRepository(connection),
+        product_repository=ProductRepository(connection),
+        order_repository=indexed,
+    )
+    since = datetime.datetime(2018, 11, 16)
+    till = datetime.datetime(2018, 11, 17)
+    assert service.search_order_ids_by_date(since, till) == [5]
+    assert service.count_orders_by_date(since, till) == 1
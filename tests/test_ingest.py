@@ -0,0 +1,47 @@
+import json
+from itertools import pairwise
+
+import pytest
+
+from company.orders import JSONError, SchemaError
+from company.orders._ingest import MappedFile, parse_parallel, split_ranges, to_row
+
+from conftest import RECORDS
+
+
+def test_split_ranges_are_aligned_to_newlines(orders_file):
+    content = orders_file.read_bytes()
+    ranges = list(split_ranges(orders_file, size=10))
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(content)
+    assert all(lhs[1] == rhs[0] for lhs, rhs in pairwise(ranges))
+    assert all(content[end - 1 : end] == b"\n" for _, end in ranges[:-1])
+
+
+@pytest.mark.parametrize("range_size", [1, 100, 1_000_000])
+def test_parse_parallel_keeps_order_of_file(orders_file, range_size):
+    rows = list(parse_parallel(orders_file, workers=2, range_size=range_size))
+    assert rows == [to_row(_) for _ in RECORDS]
+
+
+def test_parse_parallel_reports_line_of_invalid_json(tmp_path):
+    path = tmp_path / "orders.jsonl"
+    path.write_text(json.dumps(RECORDS[0]) + "\n{]\n" + json.dumps(RECORDS[1]))
+    rows = parse_parallel(path, workers=2, range_size=1)
+    assert next(rows) == to_row(RECORDS[0])
+    with pytest.raises(JSONError, match="^1: {]"):
+        next(rows)
+
+
+def test_parse_parallel_reports_line_of_invalid_record(tmp_path):
+    path = tmp_path / "orders.jsonl"
+    path.write_text(json.dumps(RECORDS[0]) + "\n" + json.dumps(RECORDS[1]) + "\n{}")
+    with pytest.raises(SchemaError, match="^2: "):
+        list(parse_parallel(path, workers=2, range_size=1))
+
+
+@pytest.mark.parametrize("content", ["", "a", "a\n", "a\n\nbc\r\nd", "a\nb\n"])
+def test_mapped_file_lines_match_text_lines(tmp_path, content):
+    path = tmp_path / "lines.txt"
+    path.write_bytes(content.encode())
+    with MappedFile(path) as file, open(path, "rb") as text:
+        assert list(file.lines()) == [_.rstrip(b"\n") for _ in text]
@@ -0,0 +1,44 @@
+import logging
+
+import pytest
+
+from company.orders import IngestMetrics
+from company.orders._metrics import PHASES
+
+
+def test_metrics_time_phases_and_iterators():
+    metrics = IngestMetrics()
+    with metrics.phase("write"):
+        pass
+    assert list(metrics.timed(iter([1, 2]), "parse")) == [1, 2]
+    assert set(metrics.timings) == set(PHASES)
+    assert metrics.timings["write"] > 0
+    assert metrics.timings["parse"] > 0
+    assert metrics.timings["commit"] == 0
+
+
+def test_metrics_phase_is_measured_on_error():
+    metrics = IngestMetrics()
+    with pytest.raises(ValueError), metrics.phase("validate"):
+        raise ValueError
+    assert metrics.timings["validate"] > 0
+
+
+def test_metrics_progress_respects_interval(caplog):
+    logger = logging.getLogger("test_metrics")
+    metrics = IngestMetrics(logger=logger, progress_interval=3600)
+    metrics.records = 3
+    with caplog.at_level(logging.INFO, logger="test_metrics"):
+        metrics.progress()
+        assert caplog.records == []
+        metrics.progress(final=True)
+    assert caplog.records[0].getMessage().startswith("Imported 3 records")
+    assert caplog.records[0].ingest["records"] == 3
+    assert caplog.records[1].getMessage().startswith("Import phases: parse")
+
+
+def test_metrics_progress_is_not_formatted_when_disabled(monkeypatch):
+    metrics = IngestMetrics(logger=logging.getLogger("test_metrics_disabled"))
+    metrics.logger.setLevel(logging.WARNING)
+    monkeypatch.setattr(IngestMetrics, "as_dict", lambda self: pytest.fail("formatted"))
+    metrics.progress(final=True)
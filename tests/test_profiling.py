@@ -0,0 +1,37 @@
+import json
+
+import pytest
+
+from company.orders import OrderRepository, Profiler, UserRepository, User
+from company.orders._profiling import LatencyHistogram
+
+
+def test_histogram_percentiles_are_bucket_bounds():
+    histogram = LatencyHistogram()
+    for seconds in [1e-6, 3e-6, 3e-6, 100e-6]:
+        histogram.add(seconds)
+    assert histogram.count == 4
+    assert histogram.percentile(50) == pytest.approx(4e-6)
+    assert histogram.percentile(100) == pytest.approx(100e-6)
+    assert histogram.as_dict()["min"] == 1e-6
+
+
+def test_profiler_records_spans_methods_and_statements(connection):
+    profiler = Profiler()
+    profiler.trace(connection)
+    users = profiler.wrap(UserRepository(connection))
+    orders = profiler.wrap(OrderRepository(connection), "orders")
+    with profiler.span("use case"):
+        users.save(User(1, "User A", "Prague"))
+        assert users.exists(1) and not users.exists(2)
+        assert list(orders.find_between(0, 10)) == []
+    with pytest.raises(AttributeError):
+        users.missing()
+    report = profiler.report()
+    assert report["use case"]["count"] == 1
+    assert report["UserRepository.exists"]["count"] == 2
+    assert report["orders.find_between"]["count"] == 1
+    # The literals are replaced, so the statements are grouped.
+    assert report["sql: select id from users where users.id = ?;"]["count"] == 2
+    assert json.loads(json.dumps(report)) == report
+    assert profiler.summary().splitlines()[1].startswith("use case")
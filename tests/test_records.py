@@ -0,0 +1,63 @@
+import copy
+import json
+
+import pytest
+
+from company.orders import SchemaError
+from company.orders._records import BACKENDS, record_decoder
+
+from conftest import RECORDS
+
+
+def decoder(backend):
+    try:
+        return record_decoder(backend)
+    except ValueError:
+        pytest.skip(f"JSON backend '{backend}' is not installed")
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_decoder_returns_record(backend):
+    decode = decoder(backend)
+    assert decode(json.dumps(RECORDS[0])) == RECORDS[0]
+    assert decode(json.dumps(RECORDS[0]).encode()) == RECORDS[0]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize(
+    "path, value",
+    [
+        (("user",), None),
+        (("user", "city"), None),
+        (("products", 1, "id"), None),
+        (("products", 1, "price"), "80"),
+        (("id",), True),
+        (("created",), "2018-11-16"),
+        (("products",), {}),
+    ],
+)
+def test_decoder_rejects_invalid_record(backend, path, value):
+    decode = decoder(backend)
+    record = copy.deepcopy(RECORDS[0])
+    parent = record
+    for key in path[:-1]:
+        parent = parent[key]
+    if value is None:
+        del parent[path[-1]]
+    else:
+        parent[path[-1]] = value
+    with pytest.raises(SchemaError):
+        decode(json.dumps(record))
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_decoder_rejects_invalid_json(backend):
+    decode = decoder(backend)
+    with pytest.raises(ValueError) as error:
+        decode('{"id": ]')
+    assert not isinstance(error.value, SchemaError)
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        record_decoder("yaml")
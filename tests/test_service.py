@@ -1,10 +1,31 @@
+import json
+import logging
+
 import pytest
 
+from functools import partial
 from typing import Generic, TypeVar
 
-from company.orders import User, Product, Order, OrderService
+from company.orders import (
+    User,
+    Product,
+    Order,
+    OrderService,
+    UserRepository,
+    ProductRepository,
+    OrderRepository,
+    transaction,
+    JSONError,
+    SchemaError,
+    IngestMetrics,
+    StagingLoader,
+    CheckpointRepository,
+)
+from company.orders._ingest import FINGERPRINT_SIZE
 from company.orders._storage import ConflictError
 
+from conftest import RECORDS
+
 # Create fake repositories to be injected to initializer of service.
 
 T = TypeVar("T")
@@ -62,3 +83,349 @@ def test_order_service_method1(order_service):
 @pytest.mark.skip
 def test_order_service_method2(order_service):
     return NotImplemented
+
+
+# Integration tests with SQLite repositories.
+
+
+@pytest.fixture
+def sqlite_service(connection):
+    return OrderService(
+        user_repository=UserRepository(connection),
+        product_repository=ProductRepository(connection),
+        order_repository=OrderRepository(connection),
+        unit_of_work=partial(transaction, connection),
+        staging_loader=partial(StagingLoader, connection),
+        checkpoint_repository=CheckpointRepository(connection),
+    )
+
+
+def dump(connection) -> dict[str, list[tuple]]:
+    tables = ("users", "products", "orders", "order_lines", "user_product_totals")
+    return {
+        table: connection.execute(f"select * from {table} order by 1, 2").fetchall()
+        for table in tables
+    }
+
+
+@pytest.mark.service
+def test_bulk_insert_orders_matches_batch_insert_orders(orders_file, connect):
+    dumps = []
+    for method in ["batch_insert_orders", "bulk_insert_orders"]:
+        connection = connect()
+        service = OrderService(
+            user_repository=UserRepository(connection),
+            product_repository=ProductRepository(connection),
+            order_repository=OrderRepository(connection),
+        )
+        getattr(service, method)(orders_file)
+        dumps.append(dump(connection))
+    assert dumps[0] == dumps[1]
+    assert len(dumps[0]["orders"]) == 3
+
+
+@pytest.mark.service
+def test_bulk_insert_orders_raises_conflict_for_stored_order(
+    sqlite_service, orders_file
+):
+    sqlite_service.bulk_insert_orders(orders_file, chunk_size=2)
+    with pytest.raises(ConflictError):
+        sqlite_service.bulk_insert_orders(orders_file, chunk_size=2)
+
+
+@pytest.mark.service
+def test_bulk_insert_orders_commits_each_chunk(sqlite_service, connection, orders_file):
+    with open(orders_file, "a", encoding="utf8") as file:
+        file.write("\n{}")  # The last chunk fails on missing key.
+    with pytest.raises(SchemaError, match="^3: "):
+        sqlite_service.bulk_insert_orders(orders_file, chunk_size=2)
+    assert connection.execute("select id from orders order by id").fetchall() == [
+        (1,),
+        (2,),
+    ]
+
+
+@pytest.mark.service
+def test_bulk_insert_orders_chunk_is_atomic_by_default(connection, orders_file):
+    class FailingOrderRepository(OrderRepository):
+        def save(self, *aggregates: Order) -> None:
+            super().save(*aggregates)
+            raise RuntimeError("The disk is full")
+
+    # The unit of work is not given, the transaction of the connection is used.
+    service = OrderService(
+        user_repository=UserRepository(connection),
+        product_repository=ProductRepository(connection),
+        order_repository=FailingOrderRepository(connection),
+    )
+    with pytest.raises(RuntimeError):
+        service.bulk_insert_orders(orders_file)
+    assert all(rows == [] for rows in dump(connection).values())
+
+
+@pytest.mark.service
+def test_bulk_insert_orders_reports_chunks(sqlite_service, orders_file):
+    reports = sqlite_service.bulk_insert_orders(orders_file, chunk_size=2)
+    assert [_.orders for _ in reports] == [2, 1]
+    assert [_.users for _ in reports] == [2, 0]
+    assert sum(_.products for _ in reports) == 3
+    assert reports[0].rows == 2 + 3 + 2 + 3
+
+
+@pytest.mark.service
+@pytest.mark.parametrize(
+    "method", ["batch_insert_orders", "bulk_insert_orders", "bulk_load_orders"]
+)
+def test_insert_orders_counts_metrics(sqlite_service, orders_file, method):
+    metrics = IngestMetrics()
+    getattr(sqlite_service, method)(orders_file, metrics=metrics)
+    counters = (metrics.records, metrics.orders, metrics.order_lines)
+    assert counters == (3, 3, 5)
+    assert (metrics.users, metrics.products, metrics.skipped) == (2, 3, 4)
+    assert metrics.rows == 3 + 5 + 2 + 3
+    assert metrics.timings["parse"] > 0
+    assert metrics.timings["write"] > 0
+
+
+@pytest.mark.service
+def test_bulk_load_orders_matches_batch_insert_orders(
+    orders_file, connect, sqlite_service
+):
+    connection = connect()
+    OrderService(
+        user_repository=UserRepository(connection),
+        product_repository=ProductRepository(connection),
+        order_repository=OrderRepository(connection),
+    ).batch_insert_orders(orders_file)
+    indexes = "select name, sql from sqlite_master where type in ('index', 'trigger') order by 1"
+    schema = sqlite_service._order_repository.connection.execute(indexes).fetchall()
+
+    report = sqlite_service.bulk_load_orders(orders_file, chunk_size=2)
+    loaded = sqlite_service._order_repository.connection
+    assert dump(loaded) == dump(connection)
+    assert (report.orders, report.order_lines, report.users, report.products) == (
+        3,
+        5,
+        2,
+        3,
+    )
+    assert loaded.execute(indexes).fetchall() == schema
+    assert loaded.execute("select name from sqlite_temp_master").fetchall() == []
+
+
+@pytest.mark.service
+@pytest.mark.parametrize("stored", [False, True])
+def test_bulk_load_orders_stores_nothing_on_failure(
+    sqlite_service, connection, orders_file, stored
+):
+    if stored:
+        sqlite_service.batch_insert_orders(orders_file)
+        with open(orders_file, "w", encoding="utf8") as file:
+            file.write(
+                json.dumps({**RECORDS[0], "id": 4}) + "\n" + json.dumps(RECORDS[2])
+            )
+        expected = ConflictError
+    else:
+        with open(orders_file, "a", encoding="utf8") as file:
+            file.write("\n{}")  # The last chunk fails on missing key.
+        expected = SchemaError
+    before = dump(connection)
+    with pytest.raises(expected):
+        sqlite_service.bulk_load_orders(orders_file, chunk_size=1)
+    assert dump(connection) == before
+    assert connection.execute("select count(*) from sqlite_master").fetchone()[0] > 5
+    assert not connection.in_transaction
+
+
+@pytest.mark.service
+def test_bulk_load_orders_requires_staging_loader(order_service, orders_file):
+    with pytest.raises(RuntimeError):
+        order_service.bulk_load_orders(orders_file)
+
+
+@pytest.mark.service
+def test_search_users_with_most_products_uses_totals(
+    sqlite_service, connection, orders_file
+):
+    sqlite_service.bulk_insert_orders(orders_file)
+    users = list(sqlite_service.search_users_with_most_products(connection, limit=3))
+    assert [_.identifier for _ in users] == [3, 0]
+    assert (users[0].name, users[0].city) == ("User D", "Sydney")
+
+
+@pytest.mark.service
+@pytest.mark.parametrize("options", [{"workers": 2}, {"memory_map": True}])
+def test_bulk_insert_orders_options_match_sequential(orders_file, connect, options):
+    dumps = []
+    for kwargs in [{}, options]:
+        connection = connect()
+        service = OrderService(
+            user_repository=UserRepository(connection),
+            product_repository=ProductRepository(connection),
+            order_repository=OrderRepository(connection),
+            unit_of_work=partial(transaction, connection),
+        )
+        service.bulk_insert_orders(orders_file, chunk_size=2, **kwargs)
+        dumps.append(dump(connection))
+    assert dumps[0] == dumps[1]
+
+
+@pytest.mark.service
+@pytest.mark.parametrize("memory_map", [False, True])
+def test_parse_records_reports_invalid_line(sqlite_service, tmp_path, memory_map):
+    path = tmp_path / "orders.jsonl"
+    path.write_text("\n".join(json.dumps(_) for _ in RECORDS[:2]) + '\n{"id": ]\n')
+    with pytest.raises(JSONError, match='^2: {"id": ]$'):
+        list(sqlite_service._parse_records(path, memory_map=memory_map))
+
+
+@pytest.mark.service
+@pytest.mark.parametrize("memory_map", [False, True])
+def test_parse_records_reports_invalid_record(sqlite_service, tmp_path, memory_map):
+    path = tmp_path / "orders.jsonl"
+    path.write_text(json.dumps(RECORDS[0]) + '\n{"id": 2, "created": 1}\n')
+    with pytest.raises(SchemaError, match="^1: .*`products`"):
+        list(sqlite_service._parse_records(path, memory_map=memory_map))
+
+
+@pytest.mark.service
+@pytest.mark.parametrize(
+    "level, logged", [(logging.INFO, True), (logging.WARNING, False)]
+)
+def test_batch_insert_orders_formats_entities_only_when_logged(
+    connection, orders_file, monkeypatch, level, logged
+):
+    formatted = []
+    monkeypatch.setattr(User, "__str__", lambda self: formatted.append(self) or "User")
+    logger = logging.getLogger("test_batch_insert_orders")
+    logger.setLevel(level)
+    OrderService(
+        user_repository=UserRepository(connection),
+        product_repository=ProductRepository(connection),
+        order_repository=OrderRepository(connection),
+        logger=logger,
+    ).batch_insert_orders(orders_file)
+    # Each handler formats the record.
+    assert {_.identifier for _ in formatted} == ({0, 3} if logged else set())
+
+
+@pytest.mark.service
+def test_incremental_insert_orders_imports_appended_records(
+    sqlite_service, connection, orders_file
+):
+    lines = [json.dumps(_) + "\n" for _ in RECORDS]
+    # The last line is still being written.
+    orders_file.write_text(lines[0] + lines[1] + lines[2][:20], encoding="utf8")
+    reports = sqlite_service.incremental_insert_orders(orders_file, chunk_size=1)
+    assert [_.orders for _ in reports] == [1, 1]
+
+    with open(orders_file, "a", encoding="utf8") as file:
+        file.write(lines[2][20:])
+    reports = sqlite_service.incremental_insert_orders(orders_file, chunk_size=1)
+    assert [_.orders for _ in reports] == [1]
+    assert sqlite_service.incremental_insert_orders(orders_file) == []
+
+    expected = RECORDS[-1]["id"], orders_file.stat().st_size
+    checkpoint = CheckpointRepository(connection).find(str(orders_file.resolve()))
+    assert (checkpoint.last_order_id, checkpoint.offset) == expected
+    assert dump(connection)["user_product_totals"] == [(0, 1), (3, 5)]
+
+
+@pytest.mark.service
+def test_incremental_insert_orders_resumes_after_failed_chunk(
+    sqlite_service, connection, orders_file
+):
+    lines = [json.dumps(_) + "\n" for _ in RECORDS]
+    orders_file.write_text(lines[0] + lines[1] + "{}\n", encoding="utf8")
+    with pytest.raises(SchemaError, match=f"^{len(lines[0] + lines[1])}: "):
+        sqlite_service.incremental_insert_orders(orders_file, chunk_size=1)
+
+    orders_file.write_text(lines[0] + lines[1] + lines[2], encoding="utf8")
+    metrics = IngestMetrics()
+    reports = sqlite_service.incremental_insert_orders(
+        orders_file, chunk_size=1, metrics=metrics
+    )
+    assert ([_.orders for _ in reports], metrics.records) == ([1], 1)
+    assert connection.execute("select count(*) from orders").fetchone() == (3,)
+
+
+@pytest.mark.service
+def test_incremental_insert_orders_skips_stored_orders_of_replaced_file(
+    sqlite_service, connection, orders_file
+):
+    sqlite_service.incremental_insert_orders(orders_file)
+    records = [*RECORDS[::-1], {**RECORDS[0], "id": 4}]
+    orders_file.write_text("\n".join(json.dumps(_) for _ in records), encoding="utf8")
+    metrics = IngestMetrics()
+    reports = sqlite_service.incremental_insert_orders(orders_file, metrics=metrics)
+    assert ([_.orders for _ in reports], metrics.records) == ([1], 4)
+    assert connection.execute("select count(*) from orders").fetchone() == (4,)
+
+
+@pytest.mark.service
+def test_incremental_insert_orders_detects_file_changed_after_its_head(
+    sqlite_service, connection, orders_file
+):
+    records = [{**RECORDS[0], "id": _} for _ in range(100)]
+    orders_file.write_text("".join(json.dumps(_) + "\n" for _ in records), "utf8")
+    sqlite_service.incremental_insert_orders(orders_file)
+    assert orders_file.stat().st_size > 2 * FINGERPRINT_SIZE
+
+    # The head is the same, a record after it is longer, so the offset is not after a line.
+    records[50] = {**records[50], "user": {**records[50]["user"], "city": "Melbourne"}}
+    records.append({**RECORDS[0], "id": 100})
+    orders_file.write_text("".join(json.dumps(_) + "\n" for _ in records), "utf8")
+    metrics = IngestMetrics()
+    reports = sqlite_service.incremental_insert_orders(orders_file, metrics=metrics)
+    assert ([_.orders for _ in reports], metrics.records) == ([1], 101)
+    assert connection.execute("select count(*) from orders").fetchone() == (101,)
+
+
+@pytest.mark.service
+def test_incremental_insert_orders_requires_checkpoint_repository(
+    order_service, orders_file
+):
+    with pytest.raises(RuntimeError):
+        order_service.incremental_insert_orders(orders_file)
+
+
+@pytest.mark.service
+def test_bulk_insert_orders_merges_changed_users_and_products(
+    sqlite_service, connection, orders_file
+):
+    sqlite_service.bulk_insert_orders(orders_file)
+    changed = {**RECORDS[0], "id": 4, "user": {**RECORDS[0]["user"], "city": "Perth"}}
+    changed["products"] = [{**RECORDS[0]["products"][0], "price": 170}]
+    records = [
+        changed,
+        {**RECORDS[1], "id": 5},
+        {**RECORDS[2], "id": 6, "user": changed["user"]},
+    ]
+    orders_file.write_text("\n".join(json.dumps(_) for _ in records), encoding="utf8")
+
+    metrics = IngestMetrics()
+    reports = sqlite_service.bulk_insert_orders(
+        orders_file, chunk_size=2, merge=True, metrics=metrics
+    )
+    assert [(_.users, _.products, _.changed) for _ in reports] == [(0, 0, 2), (0, 0, 0)]
+    assert (metrics.changed, metrics.skipped) == (2, 5)
+    assert dump(connection)["users"] == [
+        (0, "User A", "Prague"),
+        (3, "User D", "Perth"),
+    ]
+    assert dump(connection)["products"][0] == (0, "Product A", 170)
+
+
+@pytest.mark.service
+@pytest.mark.parametrize("merge, price", [(False, 80), (True, 90)])
+def test_insert_orders_keeps_version_of_product_by_merge(
+    sqlite_service, connection, orders_file, merge, price
+):
+    # The price of the product I changes in the last record.
+    product = {"id": 8, "name": "Product I", "price": 90}
+    records = [*RECORDS[:2], {**RECORDS[2], "products": [product]}]
+    orders_file.write_text("\n".join(json.dumps(_) for _ in records), encoding="utf8")
+    sqlite_service.incremental_insert_orders(orders_file, merge=merge)
+    assert connection.execute("select price from products where id = 8").fetchone() == (
+        price,
+    )
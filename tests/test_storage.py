@@ -0,0 +1,451 @@
+import pytest
+
+from company.orders import (
+    User,
+    Product,
+    Order,
+    UserRepository,
+    ProductRepository,
+    OrderRepository,
+    transaction,
+    migrate_schema,
+    rebuild_totals,
+    check_totals,
+)
+from company.orders._domain import OrderLine
+from company.orders._storage import MIGRATIONS, schema_version
+
+
+def test_users_save_missing_skips_stored_users(connection):
+    repository = UserRepository(connection)
+    repository.save(User(1, "User A", "Prague"))
+    saved = repository.save_missing(
+        [User(1, "User A", "Prague"), User(2, "User B", "Sydney")]
+    )
+    assert saved == 1
+    assert repository.exists(2)
+
+
+def test_products_save_missing_skips_stored_products(connection):
+    repository = ProductRepository(connection)
+    repository.save(Product(1, "Product A", 10))
+    saved = repository.save_missing([Product(1, "Product A", 10), Product(2, "B", 20)])
+    assert saved == 1
+    assert repository.exists(2)
+
+
+def test_merge_updates_only_changed_entities(connection):
+    users = UserRepository(connection)
+    products = ProductRepository(connection)
+    users.save(User(1, "User A", "Prague"))
+    products.save(Product(1, "Product A", 10))
+    merged = users.merge([User(1, "User A", "Brno"), User(2, "User B", "Sydney")])
+    assert (merged, users.find(1).city) == (2, "Brno")
+    assert users.merge([User(1, "User A", "Brno")]) == 0
+    merged = products.merge([Product(1, "Product A", 10), Product(2, "B", 20)])
+    assert (merged, products.find(1).price) == (1, 10)
+    assert products.merge([Product(1, "Product A", 12)]) == 1
+    assert products.find(1).price == 12
+
+
+def test_orders_find_existing(connection):
+    UserRepository(connection).save(User(1, "User A", "Prague"))
+    ProductRepository(connection).save(Product(1, "Product A", 10))
+    repository = OrderRepository(connection)
+    repository.save(
+        Order(5, user_id=1, created=1542328144, order_lines=[OrderLine(1, 2)]),
+        Order(7, user_id=1, created=1542328145, order_lines=[OrderLine(1, 1)]),
+    )
+    assert repository.find_existing([1, 5, 6, 7]) == {5, 7}
+    assert repository.find_existing([]) == set()
+
+
+def test_transaction_rolls_back_all_repositories(connection):
+    users = UserRepository(connection)
+    products = ProductRepository(connection)
+    try:
+        with transaction(connection):
+            users.save(User(1, "User A", "Prague"))
+            products.save(Product(1, "Product A", 10))
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert not users.exists(1)
+    assert not products.exists(1)
+
+
+@pytest.fixture
+def stored(connection):
+    UserRepository(connection).save_missing(
+        [User(1, "User A", "Prague"), User(2, "User B", "Sydney")]
+    )
+    ProductRepository(connection).save_missing(
+        [Product(1, "Product A", 10), Product(2, "Product B", 20)]
+    )
+    OrderRepository(connection).save(
+        Order(5, user_id=1, created=1542328144, order_lines=[OrderLine(1, 2)]),
+        Order(
+            7,
+            user_id=2,
+            created=1542328145,
+            order_lines=[OrderLine(1, 1), OrderLine(2, 3)],
+        ),
+        Order(9, user_id=2, created=1542328146, order_lines=[]),
+    )
+    return connection
+
+
+def test_find_returns_entity_or_none(stored):
+    user = UserRepository(stored).find(2)
+    assert (user.identifier, user.name, user.city) == (2, "User B", "Sydney")
+    product = ProductRepository(stored).find(2)
+    assert (product.identifier, product.name, product.price) == (2, "Product B", 20)
+    order = OrderRepository(stored).find(7)
+    assert (order.identifier, order.user_id, order.created) == (7, 2, 1542328145)
+    assert set(order.order_lines) == {OrderLine(1, 1), OrderLine(2, 3)}
+    assert OrderRepository(stored).find(9).order_lines == ()
+    for repository in [UserRepository, ProductRepository, OrderRepository]:
+        assert repository(stored).find(3) is None
+
+
+@pytest.mark.parametrize(
+    "repository, ids, expected",
+    [
+        (UserRepository, [2, 3, 1], [1, 2]),
+        (ProductRepository, [2], [2]),
+        (OrderRepository, [9, 7, 5, 6], [5, 7, 9]),
+        (OrderRepository, [], []),
+    ],
+)
+def test_find_many_uses_one_query(stored, repository, ids, expected):
+    statements = []
+    stored.set_trace_callback(statements.append)
+    found = repository(stored).find_many(ids)
+    stored.set_trace_callback(None)
+    assert [_.identifier for _ in found] == expected
+    assert len([_ for _ in statements if _.lstrip().startswith("select")]) == 1
+
+
+def test_find_many_rebuilds_order_lines(stored):
+    orders = OrderRepository(stored).find_many([5, 7])
+    assert [set(_.order_lines) for _ in orders] == [
+        {OrderLine(1, 2)},
+        {OrderLine(1, 1), OrderLine(2, 3)},
+    ]
+
+
+def query_plan(connection, search) -> list[str]:
+    """Return the plan of the range search's statement chosen by the planner."""
+    statements = []
+    connection.set_trace_callback(statements.append)
+    search()
+    connection.set_trace_callback(None)
+    statement = statements[-1]
+    return [row[-1] for row in connection.execute(f"explain query plan {statement}")]
+
+
+@pytest.mark.parametrize("limit", [None, 1])
+def test_find_between_uses_covering_indexes(stored, limit):
+    repository = OrderRepository(stored)
+    plan = query_plan(
+        stored, lambda: list(repository.find_between(0, 2**40, after_id=5, limit=limit))
+    )
+    assert any("USING COVERING INDEX orders_created_index" in _ for _ in plan)
+    assert any("USING COVERING INDEX order_lines_order_id_index" in _ for _ in plan)
+    assert not any(_.startswith("SCAN orders") for _ in plan)
+    # Only the page of orders is sorted again.
+    sorts = [_ for _ in plan if "TEMP B-TREE" in _]
+    assert sorts == ([] if limit is None else ["USE TEMP B-TREE FOR ORDER BY"])
+
+
+@pytest.mark.parametrize("search", ["find_ids_between", "count_between"])
+def test_range_searches_use_covering_index(stored, search):
+    find = getattr(OrderRepository(stored), search)
+    plan = query_plan(stored, lambda: find(0, 2**40))
+    assert "USING COVERING INDEX orders_created_index" in plan[0]
+    assert not any(_.startswith("SCAN") for _ in plan)
+
+
+def test_find_between_pages_by_creation_time(connection):
+    UserRepository(connection).save(User(1, "User A", "Prague"))
+    ProductRepository(connection).save(Product(1, "Product A", 10))
+    repository = OrderRepository(connection)
+    repository.save(
+        Order(1, user_id=1, created=20, order_lines=[OrderLine(1, 1)]),
+        Order(2, user_id=1, created=10, order_lines=[OrderLine(1, 1)]),
+        Order(3, user_id=1, created=20, order_lines=[OrderLine(1, 1)]),
+        Order(4, user_id=1, created=15, order_lines=[]),
+    )
+    assert [_.identifier for _ in repository.find_between(0, 30)] == [2, 1, 3]
+    assert [_.identifier for _ in repository.find_between(15, 30)] == [1, 3]
+    assert [_.identifier for _ in repository.find_between(0, 30, limit=1)] == [2]
+    assert [_.identifier for _ in repository.find_between(0, 30, limit=2)] == [2, 1]
+    assert [_.identifier for _ in repository.find_between(0, 30, 4, limit=1)] == [1]
+    assert [_.identifier for _ in repository.find_between(0, 30, after_id=2)] == [1, 3]
+    assert [_.identifier for _ in repository.find_between(0, 30, after_id=1)] == [3]
+    assert [_.identifier for _ in repository.find_between(15, 30, after_id=2)] == [1, 3]
+    assert list(repository.find_between(0, 30, after_id=3)) == []
+    assert list(repository.find_between(0, 30, after_id=5)) == []  # Unknown.
+
+
+def test_find_between_streams_rows_in_batches(stored):
+    repository = OrderRepository(stored)
+    repository.arraysize = 1
+    orders = repository.find_between(1542328144, 1542328146)
+    order = next(orders)
+    assert (order.identifier, order.order_lines) == (5, (OrderLine(1, 2),))
+    order = next(orders)
+    assert set(order.order_lines) == {OrderLine(1, 1), OrderLine(2, 3)}
+    assert next(orders, None) is None
+
+
+def test_migrate_schema_upgrades_old_schema():
+    import sqlite3 as db
+
+    from conftest import SCHEMA_PATH
+
+    connection = db.connect(":memory:")
+    old_schema = SCHEMA_PATH.read_text(encoding="utf8").split("-- The covering index")[
+        0
+    ]
+    old_schema = old_schema.replace("VALUES (0, 5, 0)", "VALUES (0, 1, 0)")
+    connection.executescript(old_schema)
+    assert schema_version(connection) == (0, 1, 0)
+    assert migrate_schema(connection) == MIGRATIONS[-1][0]
+    assert migrate_schema(connection) == MIGRATIONS[-1][0]
+    indexes = {
+        row[0]
+        for row in connection.execute(
+            "select name from sqlite_master where type = 'index'"
+        )
+    }
+    assert {"orders_created_index", "order_lines_order_id_index"} <= indexes
+    assert {"user_product_totals_total_index"} <= indexes
+    assert connection.execute("select count(*) from import_checkpoints").fetchone() == (
+        0,
+    )
+    connection.close()
+
+
+def test_migrate_schema_creates_indexes_of_schema_script(connection):
+    import sqlite3 as db
+
+    from conftest import SCHEMA_PATH
+
+    def indexes(connection) -> dict[str, str]:
+        statement = "select name, sql from sqlite_master where type = 'index' and sql is not null"
+        # The script and the migrations differ in the case of keywords only.
+        return {
+            name: " ".join(sql.lower().split())
+            for name, sql in connection.execute(statement)
+        }
+
+    migrated = db.connect(":memory:")
+    old_schema = SCHEMA_PATH.read_text(encoding="utf8").split("-- The covering index")[
+        0
+    ]
+    migrated.executescript(old_schema.replace("VALUES (0, 5, 0)", "VALUES (0, 1, 0)"))
+    migrate_schema(migrated)
+    assert indexes(migrated) == indexes(connection)
+    migrated.close()
+
+
+def test_migrate_schema_fills_totals(connection):
+    connection.execute("delete from version where minor >= 3")
+    connection.executescript(
+        """
+        drop trigger order_lines_insert_totals;
+        drop trigger order_lines_delete_totals;
+        drop table user_product_totals;
+        insert into users values (1, 'User A', 'Prague');
+        insert into products values (1, 'Product A', 10);
+        insert into orders values (5, 1, 1542328144);
+        insert into order_lines values (5, 1, 2);
+        """
+    )
+    assert migrate_schema(connection) == MIGRATIONS[-1][0]
+    assert connection.execute("select * from user_product_totals").fetchall() == [
+        (1, 2)
+    ]
+
+
+def test_schema_script_is_latest_version(connection):
+    assert schema_version(connection) == MIGRATIONS[-1][0]
+
+
+def totals(connection) -> list[tuple]:
+    return connection.execute("select * from user_product_totals order by 1").fetchall()
+
+
+def test_totals_are_maintained_by_saved_orders(stored):
+    assert totals(stored) == [(1, 2), (2, 4)]
+    OrderRepository(stored).save(
+        Order(11, user_id=1, created=1542328147, order_lines=[OrderLine(2, 5)])
+    )
+    assert totals(stored) == [(1, 7), (2, 4)]
+    stored.execute("delete from order_lines where order_id = 7 and product_id = 2")
+    assert totals(stored) == [(1, 7), (2, 1)]
+    assert check_totals(stored) == []
+
+
+@pytest.mark.parametrize("foreign_keys", ["on", "off"])
+def test_totals_are_maintained_by_deleted_orders(stored, foreign_keys):
+    stored.execute(f"pragma foreign_keys = {foreign_keys}")
+    stored.execute("delete from orders where id = 7")
+    assert totals(stored) == [(1, 2), (2, 0)]
+    # The lines are deleted by the cascade or later as orphans.
+    stored.execute("delete from order_lines where order_id = 7")
+    assert totals(stored) == [(1, 2), (2, 0)]
+    assert check_totals(stored) == []
+
+
+def test_rebuild_totals_fixes_inconsistent_totals(stored):
+    stored.execute("update order_lines set quantity = 10 where order_id = 5")
+    stored.execute("delete from user_product_totals where user_id = 2")
+    stored.commit()
+    assert check_totals(stored) == [(1, 2, 10), (2, None, 4)]
+    assert rebuild_totals(stored) == 2
+    assert totals(stored) == [(1, 10), (2, 4)]
+    assert check_totals(stored) == []
+
+
+def test_totals_are_rebuilt_by_connection_pool(tmp_path):
+    from conftest import SCHEMA_PATH
+    from company.orders import ConnectionPool, create_schema
+
+    with ConnectionPool(tmp_path / "orders.sqlite") as connections:
+        create_schema(connections.connection, SCHEMA_PATH.read_text(encoding="utf8"))
+        with transaction(connections):
+            UserRepository(connections).save(User(1, "User A", "Prague"))
+            OrderRepository(connections).save(
+                Order(5, user_id=1, created=1542328144, order_lines=[OrderLine(1, 2)])
+            )
+            connections.connection.execute("delete from user_product_totals")
+        assert check_totals(connections) == [(1, None, 2)]
+        assert rebuild_totals(connections) == 1
+        assert check_totals(connections) == []
+
+
+def test_connection_pool_opens_connection_per_thread(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from conftest import SCHEMA_PATH
+    from company.orders import ConnectionPool, create_schema
+
+    with ConnectionPool(tmp_path / "orders.sqlite") as connections:
+        create_schema(connections.connection, SCHEMA_PATH.read_text(encoding="utf8"))
+        assert connections.connection.execute("pragma journal_mode").fetchone() == (
+            "wal",
+        )
+        users = UserRepository(connections)
+        with transaction(connections):
+            users.save(User(1, "User A", "Prague"))
+            OrderRepository(connections).save(
+                Order(5, user_id=1, created=1542328144, order_lines=[OrderLine(1, 2)])
+            )
+
+        def search(_):
+            orders = OrderRepository(connections)
+            return id(orders.connection), [
+                o.identifier for o in orders.find_between(0, 2**40)
+            ]
+
+        with ThreadPoolExecutor(4) as executor:
+            found = list(executor.map(search, range(8)))
+        assert {_[1] == [5] for _ in found} == {True}
+        threads = {_[0] for _ in found}
+        assert id(connections.connection) not in threads
+        assert len(connections) == 1 + len(threads)
+    assert len(connections) == 0
+
+
+def test_migrate_schema_restores_indexes_of_interrupted_import(tmp_path):
+    import sqlite3
+    from contextlib import closing
+
+    from conftest import SCHEMA_PATH
+    from company.orders import create_schema, deferred_indexes
+
+    def indexes(connection) -> list[tuple]:
+        statement = (
+            "select name from sqlite_master where type = 'index' and sql is not null"
+        )
+        names = sorted(_[0] for _ in connection.execute(statement))
+        return [
+            (_, connection.execute(f"pragma index_info({_})").fetchall()) for _ in names
+        ]
+
+    path = tmp_path / "orders.sqlite"
+    with closing(sqlite3.connect(path)) as connection:
+        create_schema(connection, SCHEMA_PATH.read_text(encoding="utf8"))
+        created = indexes(connection)
+        deferred = deferred_indexes(connection)
+        deferred.__enter__()
+        # The process dies in the block, the dropped indexes were committed.
+        with closing(sqlite3.connect(path)) as restarted:
+            assert len(indexes(restarted)) < len(created)
+            migrate_schema(restarted)
+            assert indexes(restarted) == created
+        deferred.__exit__(None, None, None)
+        assert indexes(connection) == created
+
+
+def test_connection_pool_switches_storage_profiles(tmp_path):
+    import sqlite3
+
+    from conftest import SCHEMA_PATH
+    from company.orders import ConnectionPool, create_schema, deferred_indexes
+
+    with ConnectionPool(tmp_path / "orders.sqlite", "ingest") as connections:
+        create_schema(connections.connection, SCHEMA_PATH.read_text(encoding="utf8"))
+        assert connections.connection.execute("pragma synchronous").fetchone() == (0,)
+        indexes = (
+            "select name from sqlite_master where type = 'index' and sql is not null"
+        )
+        created = connections.connection.execute(indexes).fetchall()
+        with deferred_indexes(connections) as deferred:
+            assert connections.connection.execute(indexes).fetchall() == [
+                ("user_product_totals_total_index",)
+            ]
+            with transaction(connections):
+                UserRepository(connections).save(User(1, "User A", "Prague"))
+        assert "orders_created_index" in deferred
+        assert sorted(connections.connection.execute(indexes)) == sorted(created)
+
+        connections.use("serve")
+        assert len(connections) == 0
+        assert connections.connection.execute("pragma query_only").fetchone() == (1,)
+        assert UserRepository(connections).find(1) == User(1, "User A", "Prague")
+        with (
+            pytest.raises(sqlite3.OperationalError, match="readonly"),
+            transaction(connections),
+        ):
+            UserRepository(connections).save(User(2, "User B", "Prague"))
+
+
+def test_staging_loader_validates_foreign_keys(connection):
+    import sqlite3
+
+    from company.orders import StagingLoader
+    from company.orders._storage import ConflictError
+
+    indexes = (
+        "select name from sqlite_master where type in ('index', 'trigger') order by 1"
+    )
+    schema = connection.execute(indexes).fetchall()
+    with StagingLoader(connection) as loader:
+        loader.stage(
+            [User(1, "User A", "Prague")],
+            [],
+            [Order(5, user_id=1, created=1542328144, order_lines=[OrderLine(7, 2)])],
+        )
+        with pytest.raises(ConflictError, match="Order 5 is duplicated"):
+            loader.stage(
+                [], [], [Order(5, user_id=1, created=1542328144, order_lines=[])]
+            )
+        with pytest.raises(
+            sqlite3.IntegrityError, match="order 5 references missing product 7"
+        ):
+            loader.load()
+    assert connection.execute("select count(*) from users").fetchone() == (0,)
+    assert connection.execute(indexes).fetchall() == schema